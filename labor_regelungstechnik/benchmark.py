@@ -0,0 +1,226 @@
+import os
+import sys
+import json
+import time
+import timeit
+import functools
+import platform
+import importlib
+import subprocess
+import typing as t
+
+import numpy as np
+
+from labor_regelungstechnik.utils import MEASUREMENTS_PATH, PATH
+
+# This module contains the benchmarks of the hot paths of the simulation and the parameter identification.
+# The results of a run are stored as a json file, such that the results of different commits can be
+# compared with "compare_results" (or the "compare-benchmarks" command) to find performance regressions.
+#
+# Every benchmark is a function which receives the number of repetitions and returns a dict with the keys
+# "value" (the best of the repetitions), "unit" and "higher_is_better".
+
+# The generated system modules whose system functions are benchmarked
+RHS_MODULES = (
+    'labor_regelungstechnik.systems.single_pendulum_nonlinear',
+    'labor_regelungstechnik.systems.single_pendulum_nonlinear_cse',
+    'labor_regelungstechnik.systems.single_pendulum_nonlinear_mass_matrix',
+    'labor_regelungstechnik.systems.single_pendulum_nonlinear_numba',
+)
+# The same time horizon and step inputs as in the "simulate_system" experiment
+SIMULATION_DURATION = 10
+SIMULATION_NUM_POINTS = 1000
+# The measurements and their preparation for the objective function, which are the same as in the
+# "parameter_optimization" experiment
+MEASUREMENTS_FILE_PATH = os.path.join(MEASUREMENTS_PATH, 'measurements_001.json')
+PREPARE_KWARGS = {
+    'input_keys': ('x_const_mess', 'y_const_mess'),
+    'input_delays': (0.3, 0.1),
+    'state_keys': (None, None, 'y_out_mess', None, 'phi_out_mess', 'x_out_mess'),
+    'output_keys': ('x_out_mess', 'y_out_mess', 'phi_out_mess'),
+    'output_weights': (0.2, 0.2, 1),
+}
+OBJECTIVE_METHOD = 'LSODA'
+# The MF4 recordings which are bundled with the package
+RECORDING_PATHS = (
+    os.path.join(MEASUREMENTS_PATH, 'messungen_17_11_22.mf4'),
+    os.path.join(MEASUREMENTS_PATH, 'messungen_18_11_22.mf4'),
+)
+
+# By default, a benchmark result is flagged as a regression if it is more than 10% worse than the baseline
+DEFAULT_THRESHOLD = 0.1
+DEFAULT_REPEAT = 3
+
+
+def _best_time(function: t.Callable[[], t.Any], repeat: int) -> float:
+    # The fastest of the repetitions is the one which is least disturbed by other processes
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+
+    return min(times)
+
+
+def benchmark_rhs(module_name: str, repeat: int = DEFAULT_REPEAT) -> dict:
+    """
+    Measures the number of evaluations of the system function of the given module per second.
+    """
+    module = importlib.import_module(module_name)
+    states = np.array([0.1, 0.2, 0.5, 0.1, 0.2, 1.0])
+    inputs = np.array([0.5, -0.2])
+
+    timer = timeit.Timer(lambda: module.system(0, states, inputs, {}))
+    number, _ = timer.autorange()
+    seconds = min(timer.repeat(repeat=repeat, number=number))
+    return {'value': number / seconds, 'unit': 'calls/s', 'higher_is_better': True}
+
+
+def benchmark_simulation(repeat: int = DEFAULT_REPEAT) -> dict:
+    """
+    Measures the wall time of a single "ct.input_output_response" of the plain system module over the same
+    horizon and with the same step inputs as in the "simulate_system" experiment.
+    """
+    import control as ct
+    import labor_regelungstechnik.systems.single_pendulum_nonlinear as single_pendulum_nonlinear
+
+    timestamps = np.linspace(0, SIMULATION_DURATION, SIMULATION_NUM_POINTS)
+    inputs = np.stack([np.where(timestamps < 1, 0, 0.1), np.where(timestamps < 1, 0, -0.1)])
+    initial_states = [0, 0, 1.2, 0, 0, 0]
+
+    def simulate():
+        ct.input_output_response(single_pendulum_nonlinear.io_system, timestamps, inputs, initial_states,
+                                 params={'c_varphi': 0.2, 'k_x': 200})
+
+    return {'value': _best_time(simulate, repeat), 'unit': 's', 'higher_is_better': False}
+
+
+def benchmark_objective(repeat: int = DEFAULT_REPEAT) -> dict:
+    """
+    Measures the wall time of a single evaluation of the objective function of the "parameter_optimization"
+    experiment with the default parameters, which simulates all the measurements of MEASUREMENTS_FILE_PATH.
+    """
+    import labor_regelungstechnik.systems.single_pendulum_nonlinear_cse as single_pendulum_nonlinear_cse
+    from labor_regelungstechnik.data import load_measurements, prepare_measurements
+    from labor_regelungstechnik.optimization import evaluate_measurements
+
+    measurements = prepare_measurements(load_measurements(MEASUREMENTS_FILE_PATH), **PREPARE_KWARGS)
+
+    def evaluate():
+        evaluate_measurements(single_pendulum_nonlinear_cse.io_system, measurements, {},
+                              method=OBJECTIVE_METHOD, jacobian=single_pendulum_nonlinear_cse.jacobian_states)
+
+    return {'value': _best_time(evaluate, repeat), 'unit': 's', 'higher_is_better': False}
+
+
+def benchmark_extraction(repeat: int = DEFAULT_REPEAT) -> dict:
+    """
+    Measures the throughput of the streaming extraction of the measurements from the bundled MF4 recordings
+    in MB of recording per second.
+    """
+    from labor_regelungstechnik.extraction import stream_measurements
+
+    def extract():
+        for path in RECORDING_PATHS:
+            for _ in stream_measurements(path):
+                pass
+
+    num_bytes = sum(os.path.getsize(path) for path in RECORDING_PATHS)
+    return {'value': num_bytes / 2 ** 20 / _best_time(extract, repeat), 'unit': 'MB/s',
+            'higher_is_better': True}
+
+
+BENCHMARKS: t.Dict[str, t.Callable[[int], dict]] = {
+    **{f'rhs/{module_name.split(".")[-1]}': functools.partial(benchmark_rhs, module_name)
+       for module_name in RHS_MODULES},
+    'simulation': benchmark_simulation,
+    'objective': benchmark_objective,
+    'extraction': benchmark_extraction,
+}
+
+
+def _git_commit() -> t.Optional[str]:
+    try:
+        proc = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=PATH, stdout=subprocess.PIPE,
+                              stderr=subprocess.PIPE, check=True)
+        return proc.stdout.decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmarks(names: t.Optional[t.Sequence[str]] = None,
+                   repeat: int = DEFAULT_REPEAT,
+                   logger: t.Optional[t.Callable[[str], None]] = None,
+                   ) -> dict:
+    """
+    Runs the given benchmarks.
+
+    :param names: The names of the BENCHMARKS to run. Defaults to all of them.
+    :param repeat: The number of repetitions of every benchmark, of which only the best one is used
+    :param logger: An optional function which is called with the result of every benchmark
+    :returns: A json serializable dict with the keys "commit", "timestamp", "python", "platform" and
+        "results", where results maps the benchmark names to their result dicts.
+    """
+    logger = logger or (lambda message: None)
+    names = list(BENCHMARKS.keys()) if names is None else names
+    unknown = [name for name in names if name not in BENCHMARKS]
+    if unknown:
+        raise ValueError(f'Unknown benchmarks: {", ".join(unknown)}! Please use some of the following: '
+                         f'{", ".join(BENCHMARKS.keys())}')
+
+    results = {}
+    for name in names:
+        results[name] = BENCHMARKS[name](repeat)
+        logger(f'{name}: {results[name]["value"]:.4g} {results[name]["unit"]}')
+
+    return {
+        'commit': _git_commit(),
+        'timestamp': time.time(),
+        'python': sys.version.split()[0],
+        'platform': platform.platform(),
+        'results': results,
+    }
+
+
+def save_results(path: str, results: dict) -> None:
+    with open(path, mode='w') as file:
+        json.dump(results, file, indent=4)
+
+
+def load_results(path: str) -> dict:
+    with open(path, mode='r') as file:
+        return json.load(file)
+
+
+def compare_results(baseline: dict,
+                    current: dict,
+                    threshold: float = DEFAULT_THRESHOLD,
+                    ) -> t.List[dict]:
+    """
+    Compares the results of two benchmark runs as returned by "run_benchmarks". Only the benchmarks which
+    are part of both runs are compared.
+
+    :param threshold: The relative change by which a result has to be worse than the baseline to be flagged
+        as a regression
+    :returns: A list with one dict per benchmark with the keys "name", "baseline", "current", "unit",
+        "change" (the relative change of the value) and "regression" (a bool)
+    """
+    comparisons = []
+    for name, result in current['results'].items():
+        if name not in baseline['results']:
+            continue
+
+        baseline_value = baseline['results'][name]['value']
+        change = result['value'] / baseline_value - 1
+        worse = -change if result['higher_is_better'] else change
+        comparisons.append({
+            'name': name,
+            'baseline': baseline_value,
+            'current': result['value'],
+            'unit': result['unit'],
+            'change': change,
+            'regression': worse > threshold,
+        })
+
+    return comparisons
@@ -0,0 +1,247 @@
+import os
+import sys
+import pickle
+import hashlib
+import inspect
+import typing as t
+from collections import OrderedDict
+
+import numpy as np
+
+from labor_regelungstechnik.data import PreparedMeasurement
+
+# The default memory budget of the in-memory tier of the caches in bytes
+DEFAULT_MAX_BYTES = 256 * 2 ** 20
+
+
+# == HASHING ==
+# All the cache keys are sha256 digests over the canonical byte representation of their parts. Numbers
+# are always hashed as floats, such that the parameter 250 results in the same key as 250.0, and the
+# items of dicts are hashed in the order of their sorted keys.
+
+def _update_hasher(hasher: t.Any, value: t.Any) -> None:
+    if isinstance(value, np.ndarray):
+        hasher.update(f'ndarray:{value.dtype.str}:{value.shape}:'.encode())
+        hasher.update(np.ascontiguousarray(value).tobytes())
+    elif isinstance(value, dict):
+        hasher.update(f'dict:{len(value)}:'.encode())
+        for key in sorted(value.keys()):
+            _update_hasher(hasher, key)
+            _update_hasher(hasher, value[key])
+    elif isinstance(value, (list, tuple)):
+        hasher.update(f'sequence:{len(value)}:'.encode())
+        for element in value:
+            _update_hasher(hasher, element)
+    elif isinstance(value, (bool, np.bool_)) or value is None:
+        hasher.update(f'{value!r}:'.encode())
+    elif isinstance(value, (int, float, np.integer, np.floating)):
+        hasher.update(f'float:{float(value)!r}:'.encode())
+    elif isinstance(value, (str, bytes)):
+        data = value.encode() if isinstance(value, str) else value
+        hasher.update(f'{type(value).__name__}:{len(data)}:'.encode())
+        hasher.update(data)
+    else:
+        raise TypeError(f'Values of the type "{type(value).__name__}" cannot be used for cache keys')
+
+
+def hash_parts(*parts: t.Any) -> str:
+    """
+    Returns the hex sha256 digest of the given parts, which may be (nested) dicts, lists and tuples of
+    numpy arrays, numbers, strings, bytes and None.
+    """
+    hasher = hashlib.sha256()
+    for part in parts:
+        _update_hasher(hasher, part)
+
+    return hasher.hexdigest()
+
+
+def hash_measurement(measurement: PreparedMeasurement) -> str:
+    """
+    Returns the hash of the content of the given prepared measurement, which is used as its id.
+    """
+    return hash_parts(*(getattr(measurement, name) for name in PreparedMeasurement.__slots__))
+
+
+def model_version(*functions: t.Callable) -> str:
+    """
+    Returns the hash of the source code of the modules which define the given functions (such as the
+    system and the output function of a generated system). This changes whenever the system is generated
+    again with different equations. If the source code is not available, the bytecode is used instead.
+    """
+    sources = []
+    for function in functions:
+        module = sys.modules.get(getattr(function, '__module__', None) or '')
+        try:
+            sources.append(inspect.getsource(module if module is not None else function))
+        except (OSError, TypeError):
+            sources.append(function.__code__.co_code)
+
+    return hash_parts(*sources)
+
+
+# == SIMULATION CACHE ==
+
+class SimulationCache:
+    """
+    A least recently used cache for the simulation results of individual measurements, which is used by
+    "optimization.evaluate_measurements". The in-memory tier is bounded by the given memory budget. If a
+    path is given, all the entries are additionally written to the files of that directory, which form an
+    unbounded second tier that persists between the runs of an experiment.
+
+    The keys are created with "hash_parts" and should contain everything which has an influence on the
+    result: the model version, the parameters, the measurement id and the solver settings.
+
+    :param max_bytes: The memory budget of the in-memory tier
+    :param path: The optional directory of the disk tier, which is created if it does not exist
+    """
+    def __init__(self,
+                 max_bytes: int = DEFAULT_MAX_BYTES,
+                 path: t.Optional[str] = None):
+        self.max_bytes = max_bytes
+        self.path = path
+        if path is not None:
+            os.makedirs(path, exist_ok=True)
+
+        self.entries: t.OrderedDict[str, t.Tuple[t.Any, int]] = OrderedDict()
+        self.num_bytes = 0
+
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def _entry_path(self, key: str) -> str:
+        return os.path.join(self.path, f'{key}.pkl')
+
+    def get(self, key: str) -> t.Optional[t.Any]:
+        """
+        Returns the value for the given key or None if there is none in either of the tiers. Values which
+        are loaded from the disk tier are moved into the memory tier.
+        """
+        if key in self.entries:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return self.entries[key][0]
+
+        if self.path is not None and os.path.exists(self._entry_path(key)):
+            with open(self._entry_path(key), mode='rb') as file:
+                value = pickle.load(file)
+
+            self._insert(key, value)
+            self.hits += 1
+            self.disk_hits += 1
+            return value
+
+        self.misses += 1
+        return None
+
+    def put(self, key: str, value: t.Any) -> None:
+        self._insert(key, value)
+
+        if self.path is not None:
+            _write_pickle(self._entry_path(key), value)
+
+    def _insert(self, key: str, value: t.Any) -> None:
+        if key in self.entries:
+            self.num_bytes -= self.entries.pop(key)[1]
+
+        size = _estimate_size(value)
+        self.entries[key] = (value, size)
+        self.num_bytes += size
+
+        # The least recently used entries are evicted until the budget is met again. The entry which was
+        # just inserted is always kept, even if it exceeds the budget on its own.
+        while self.num_bytes > self.max_bytes and len(self.entries) > 1:
+            _, (_, evicted_size) = self.entries.popitem(last=False)
+            self.num_bytes -= evicted_size
+
+    def clear(self) -> None:
+        """
+        Clears the in-memory tier. The files of the disk tier are kept.
+        """
+        self.entries.clear()
+        self.num_bytes = 0
+
+
+def _write_pickle(path: str, value: t.Any) -> None:
+    # Just like the extraction cache, the file is first written to a temporary file, such that an
+    # interrupted run can never leave an incomplete cache file behind.
+    temp_path = f'{path}.{os.getpid()}.tmp'
+    with open(temp_path, mode='wb') as file:
+        pickle.dump(value, file, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(temp_path, path)
+
+
+def _estimate_size(value: t.Any) -> int:
+    # A rough estimate of the memory which is used by the given value. Only the arrays really matter here,
+    # everything else is accounted with a constant overhead.
+    if isinstance(value, np.ndarray):
+        return value.nbytes + 100
+    elif isinstance(value, dict):
+        return 100 + sum(_estimate_size(element) for element in value.values())
+    elif isinstance(value, (list, tuple)):
+        return 100 + sum(_estimate_size(element) for element in value)
+    else:
+        return 100
+
+
+# == ARTIFACT CACHE ==
+
+class ArtifactCache:
+    """
+    A content addressed disk cache for the expensive intermediate results of a multi stage computation, such
+    as the symbolic derivation and the code generation of the "variational_modelling" experiment. Every
+    stage is identified by the hash of its name and all of its inputs. To make sure that a stage is
+    recomputed whenever any of the previous stages changes, the key of a previous stage should be passed
+    as one of the inputs of the next stage instead of its (possibly unhashable) result:
+
+    .. code-block:: python
+
+        cache = ArtifactCache(path)
+        equations_key, equations = cache.compute('equations', [sp.srepr(energy)], derive_equations)
+        solved_key, solved = cache.compute('solved', [equations_key], lambda: solve(equations))
+
+    :param path: The directory of the cache files, which is created if it does not exist. If it is None,
+        nothing is cached and all the stages are always computed.
+    """
+    def __init__(self, path: t.Optional[str]):
+        self.path = path
+        if path is not None:
+            os.makedirs(path, exist_ok=True)
+
+        # The names of the stages which were loaded from the cache and which had to be computed
+        self.loaded: t.List[str] = []
+        self.computed: t.List[str] = []
+
+    def compute(self,
+                stage: str,
+                parts: t.Sequence[t.Any],
+                function: t.Callable[[], t.Any],
+                ) -> t.Tuple[str, t.Any]:
+        """
+        Returns the result of the given stage, which is either loaded from the cache or computed by calling
+        the given function and then stored in the cache.
+
+        :param stage: The name of the stage
+        :param parts: All the inputs of the stage which may be passed to "hash_parts"
+        :param function: The function without arguments which computes the result of the stage
+        :returns: A tuple (key, value) of the key of the stage and its result
+        """
+        key = hash_parts(stage, *parts)
+        entry_path = None if self.path is None else os.path.join(self.path, f'{stage}_{key}.pkl')
+        if entry_path is not None and os.path.exists(entry_path):
+            with open(entry_path, mode='rb') as file:
+                value = pickle.load(file)
+
+            self.loaded.append(stage)
+            return key, value
+
+        value = function()
+        self.computed.append(stage)
+        if entry_path is not None:
+            _write_pickle(entry_path, value)
+
+        return key, value
@@ -0,0 +1,75 @@
+import os
+import sys
+
+import click
+
+from labor_regelungstechnik.data import convert_json_to_store
+from labor_regelungstechnik.data import MeasurementStore
+
+
+@click.group()
+def cli():
+    pass
+
+
+@cli.command('convert-measurements', short_help='converts a measurements json file into a binary store')
+@click.argument('json_path', type=click.Path(exists=True, dir_okay=False))
+@click.option('-o', '--output', 'store_path', type=click.Path(dir_okay=False), default=None,
+              help='path of the store file. Defaults to the json path with the ".mstore" extension')
+def convert_measurements(json_path: str, store_path: str):
+    """
+    Converts the measurements JSON_PATH file as it is created by the "extract_measurements" experiment
+    into a binary measurement store file which can be loaded a lot faster.
+    """
+    store_path = convert_json_to_store(os.path.abspath(json_path), store_path)
+    store = MeasurementStore(store_path)
+    click.secho(f'saved {len(store)} measurements with {len(store.columns)} columns to "{store_path}"')
+
+
+@cli.command('run-benchmarks', short_help='runs the benchmarks of the simulation hot paths')
+@click.option('-o', '--output', 'output_path', type=click.Path(dir_okay=False), default=None,
+              help='path of the json file in which the results are saved')
+@click.option('-b', '--benchmark', 'names', multiple=True,
+              help='name of a benchmark to run. May be given multiple times. Defaults to all benchmarks')
+@click.option('-r', '--repeat', type=int, default=3, help='number of repetitions of every benchmark')
+def run_benchmarks(output_path: str, names: tuple, repeat: int):
+    """
+    Runs the benchmarks and optionally saves the results into a json file, which can later be compared
+    to the results of another commit with the "compare-benchmarks" command.
+    """
+    from labor_regelungstechnik.benchmark import run_benchmarks, save_results
+
+    results = run_benchmarks(names or None, repeat=repeat, logger=click.secho)
+    if output_path is not None:
+        save_results(output_path, results)
+        click.secho(f'saved the results to "{output_path}"')
+
+
+@cli.command('compare-benchmarks', short_help='compares the results of two benchmark runs')
+@click.argument('baseline_path', type=click.Path(exists=True, dir_okay=False))
+@click.argument('current_path', type=click.Path(exists=True, dir_okay=False))
+@click.option('-t', '--threshold', type=float, default=0.1,
+              help='relative change by which a result has to be worse to be flagged as a regression')
+def compare_benchmarks(baseline_path: str, current_path: str, threshold: float):
+    """
+    Compares the benchmark results of CURRENT_PATH with the ones of BASELINE_PATH. Exits with the status 1
+    if any of the benchmarks regressed by more than the threshold.
+    """
+    from labor_regelungstechnik.benchmark import load_results, compare_results
+
+    baseline, current = load_results(baseline_path), load_results(current_path)
+    comparisons = compare_results(baseline, current, threshold=threshold)
+    for comparison in comparisons:
+        click.secho(
+            f'{comparison["name"]:<45} {comparison["baseline"]:>12.4g} -> {comparison["current"]:>12.4g} '
+            f'{comparison["unit"]:<8} {comparison["change"]:+.1%}'
+            f'{"  REGRESSION" if comparison["regression"] else ""}',
+            fg='red' if comparison['regression'] else None,
+        )
+
+    if any(comparison['regression'] for comparison in comparisons):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    cli()
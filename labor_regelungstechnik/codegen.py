@@ -0,0 +1,626 @@
+import os
+import sys
+import json
+import types
+import linecache
+import typing as t
+
+import numpy as np
+import sympy as sp
+
+from labor_regelungstechnik.utils import get_template_env
+from labor_regelungstechnik.cache import hash_parts
+
+# These are the code generation modes which are supported by "render_system_code". "plain" emits every
+# state equation as one big expression (which is how the code was originally generated) while "cse" first
+# simplifies the expressions and then hoists all the common subexpressions into temporary variables.
+CODEGEN_MODES = ('plain', 'cse')
+
+
+def simplify_trigonometric(expression: sp.Expr) -> sp.Expr:
+    """
+    Cheap replacement for ``sp.trigsimp`` which is good enough for the kind of expressions that come out of
+    the lagrange formalism: Every ``cos(a)**2`` is replaced by ``1 - sin(a)**2`` which makes all the
+    ``sin(a)**2 + cos(a)**2`` terms cancel, afterwards the expression is brought onto a common denominator.
+
+    :param expression: The sympy expression to be simplified
+    :returns: The simplified expression
+    """
+    arguments = {atom.args[0] for atom in expression.atoms(sp.cos)}
+    for argument in arguments:
+        expression = expression.subs(sp.cos(argument) ** 2, 1 - sp.sin(argument) ** 2)
+
+    expression = sp.cancel(sp.together(expression))
+    # After the cancellation the numerator is one long polynomial. The horner scheme reduces the number of
+    # multiplications in there and factoring the denominator usually produces something like
+    # "m_y*(l + l_0)*(m_x + m_y)" instead of the expanded 8 term version.
+    numerator, denominator = sp.fraction(expression)
+    try:
+        numerator = sp.horner(numerator)
+    except sp.PolynomialError:
+        # This happens if the numerator contains a symbol as well as a function of that very symbol such
+        # as "x * sin(x)" in which case it cannot be interpreted as a polynomial.
+        pass
+
+    return sp.factor_terms(numerator) / sp.factor(denominator)
+
+
+def reduce_equations(solved_dict: t.Dict[sp.Symbol, sp.Expr],
+                     simplify: bool = True,
+                     symbol_prefix: str = 'tmp',
+                     ) -> t.Tuple[t.List[t.Tuple[sp.Symbol, sp.Expr]], t.Dict[sp.Symbol, sp.Expr]]:
+    """
+    Applies common subexpression elimination to all the equations of the given ``solved_dict`` at once,
+    such that subexpressions which are shared between the different state equations are only computed
+    once.
+
+    :param solved_dict: A dict whose keys are the derivative symbols and the values the corresponding
+        expressions of the state equations.
+    :param simplify: Whether to apply "simplify_trigonometric" to each expression before the CSE
+    :param symbol_prefix: The string prefix for the names of the temporary variables
+    :returns: A tuple (temporaries, reduced_dict) where temporaries is a list of (symbol, expression) tuples
+        in the order in which they have to be evaluated and reduced_dict has the same keys as solved_dict
+        but expressions which are now in terms of the temporaries.
+    """
+    expressions = list(solved_dict.values())
+    if simplify:
+        expressions = [simplify_trigonometric(expression) for expression in expressions]
+
+    # We need to make sure that the names of the temporary variables do not shadow any of the symbols
+    # which are already used within the equations
+    names = {str(symbol) for expression in expressions for symbol in expression.free_symbols}
+    names.update(str(symbol) for symbol in solved_dict.keys())
+    symbols = (symbol for symbol in sp.numbered_symbols(symbol_prefix) if str(symbol) not in names)
+
+    temporaries, reduced = sp.cse(expressions, symbols=symbols, order='none')
+    reduced_dict = dict(zip(solved_dict.keys(), reduced))
+    return temporaries, reduced_dict
+
+
+# The numpy functions which may be used within the string expressions of the inputs and the outputs, such as
+# "k_phi * np.degrees(varphi)", and their sympy equivalents. These are needed to parse these expressions
+# for the derivation of the jacobians.
+NUMPY_NAMESPACE = types.SimpleNamespace(
+    degrees=lambda value: value * 180 / sp.pi,
+    radians=lambda value: value * sp.pi / 180,
+    sin=sp.sin,
+    cos=sp.cos,
+    tan=sp.tan,
+    sqrt=sp.sqrt,
+)
+
+
+def _to_code(expression: sp.Expr) -> str:
+    return sp.pycode(expression, fully_qualified_modules=False)
+
+
+def parse_expression(expression: str) -> sp.Expr:
+    """
+    Parses one of the string expressions for the inputs or the outputs of a system module into a sympy
+    expression. The raw inputs "inputs[i]" are represented by an indexed sympy object.
+    """
+    return sp.sympify(expression, locals={'inputs': sp.IndexedBase('inputs'), 'np': NUMPY_NAMESPACE})
+
+
+def derive_jacobians(solved_dict: t.Dict[sp.Symbol, sp.Expr],
+                     input_names: t.Sequence[str],
+                     param_names: t.Sequence[str] = (),
+                     simplify: bool = True,
+                     ) -> t.Tuple[sp.Matrix, sp.Matrix, sp.Matrix]:
+    """
+    Derives the jacobian matrices of the given system of state equations with respect to the states, the
+    inputs and the parameters. The state symbols are derived from the keys of the ``solved_dict`` by
+    removing the "d_" prefix of the derivative symbols.
+
+    :param solved_dict: A dict whose keys are the derivative symbols and the values the corresponding
+        expressions of the state equations.
+    :param input_names: The names of the input symbols as they appear in the equations
+    :param param_names: The names of the parameter symbols
+    :param simplify: Whether to apply "simplify_trigonometric" to the expressions before the derivation
+    :returns: A tuple (jacobian_states, jacobian_inputs, jacobian_params) of sympy matrices with the shapes
+        (num_states, num_states), (num_states, num_inputs) and (num_states, num_params)
+    """
+    state_symbols = [sp.Symbol(str(symbol).replace('d_', '', 1)) for symbol in solved_dict.keys()]
+    input_symbols = [sp.Symbol(name) for name in input_names]
+    param_symbols = [sp.Symbol(name) for name in param_names]
+
+    expressions = list(solved_dict.values())
+    if simplify:
+        expressions = [simplify_trigonometric(expression) for expression in expressions]
+
+    vector = sp.Matrix(expressions)
+    return (
+        vector.jacobian(state_symbols),
+        vector.jacobian(input_symbols),
+        vector.jacobian(param_symbols) if param_symbols else sp.zeros(len(expressions), 0),
+    )
+
+
+def derive_input_jacobian(input_expression_map: t.Dict[str, str],
+                          variables: t.Sequence[sp.Basic],
+                          ) -> t.Dict[t.Tuple[int, int], sp.Expr]:
+    """
+    Derives the (non-zero) derivatives of the input expressions, such as "k_vx * inputs[0]", with respect to
+    the given variables. These may either be the raw system inputs ``sp.IndexedBase('inputs')[i]`` or the
+    symbols of the parameters.
+
+    :returns: A dict which maps the (row, column) index tuples to the derivative expressions, where the row
+        is the index of the input expression and the column the index of the variable.
+    """
+    derivative_map = {}
+    for row, expression in enumerate(input_expression_map.values()):
+        expression = parse_expression(expression)
+        for column, variable in enumerate(variables):
+            derivative = sp.diff(expression, variable)
+            if derivative != 0:
+                derivative_map[(row, column)] = derivative
+
+    return derivative_map
+
+
+def derive_output_jacobians(output_expressions: t.Sequence[str],
+                            state_names: t.Sequence[str],
+                            param_names: t.Sequence[str],
+                            ) -> t.Tuple[sp.Matrix, sp.Matrix]:
+    """
+    Derives the jacobian matrices of the output expressions with respect to the states and the parameters.
+
+    :returns: A tuple (output_jacobian_states, output_jacobian_params) of sympy matrices with the shapes
+        (num_outputs, num_states) and (num_outputs, num_params)
+    """
+    vector = sp.Matrix([parse_expression(expression) for expression in output_expressions])
+    return (
+        vector.jacobian([sp.Symbol(name) for name in state_names]),
+        vector.jacobian([sp.Symbol(name) for name in param_names]),
+    )
+
+
+def _matrix_function_context(name: str,
+                             description: str,
+                             matrix: sp.Matrix,
+                             mode: str,
+                             chain_matrix: t.Optional[sp.Matrix] = None,
+                             input_derivative_map: t.Optional[t.Dict[t.Tuple[int, int], sp.Expr]] = None,
+                             unpack_inputs: bool = True,
+                             ) -> dict:
+    # This creates the template context for one of the generated jacobian functions. The result of such a
+    # function is "matrix + chain_matrix @ input_derivatives" where the optional chain part accounts for the
+    # dependency on the intermediate inputs such as "v_x = k_vx * inputs[0]". That part has to be evaluated
+    # at runtime because the rail limits may switch off the inputs.
+    # Only the non-zero entries of the matrices have to be generated. Most of the entries are in fact zero
+    # because of the trivial "d_x = X" kind of equations.
+    entry_map = {}
+    for key, value in (('matrix', matrix), ('chain', chain_matrix)):
+        if value is not None:
+            entry_map.update({(key, *index): expression
+                              for index, expression in np.ndenumerate(np.array(value, dtype=object))
+                              if expression != 0})
+
+    temporaries = []
+    if mode == 'cse' and entry_map:
+        temporaries, entry_map = reduce_equations(entry_map, simplify=False, symbol_prefix='jtmp')
+
+    return {
+        'name': name,
+        'description': description,
+        'shape': matrix.shape,
+        'unpack_inputs': unpack_inputs,
+        'temporaries_map': {_to_code(symbol): _to_code(expression) for symbol, expression in temporaries},
+        'entries_map': {(row, column): _to_code(expression)
+                        for (key, row, column), expression in entry_map.items() if key == 'matrix'},
+        'chain_shape': None if chain_matrix is None else chain_matrix.shape,
+        'chain_entries_map': {(row, column): _to_code(expression)
+                              for (key, row, column), expression in entry_map.items() if key == 'chain'},
+        'input_derivative_map': {index: _to_code(expression)
+                                 for index, expression in (input_derivative_map or {}).items()},
+    }
+
+
+def render_system_code(solved_dict: t.Dict[sp.Symbol, sp.Expr],
+                       params_default_map: t.Dict[str, float],
+                       mode: str = 'plain',
+                       template_name: str = 'system.py.j2',
+                       jacobian: bool = False,
+                       simplify: bool = True,
+                       **kwargs) -> str:
+    """
+    Renders the python module code which implements the given system of state equations.
+
+    :param solved_dict: A dict whose keys are the derivative symbols and the values the corresponding
+        expressions of the state equations.
+    :param params_default_map: The default values for all the system parameters
+    :param mode: One of the CODEGEN_MODES.
+    :param template_name: The name of the template to be rendered
+    :param jacobian: Whether to additionally generate the functions which compute the analytical jacobians
+        of the state equations with respect to the states, the inputs and the parameters
+        ("jacobian_states", "jacobian_inputs", "jacobian_params") as well as the jacobians of the outputs
+        ("output_jacobian_states", "output_jacobian_params"). This requires the "input_names",
+        "input_expression_map" and "output_expressions" to be given as kwargs.
+    :param simplify: Whether to apply "simplify_trigonometric" to the expressions in the "cse" mode. This
+        can be disabled if the expressions have already been simplified.
+    :param kwargs: Any additional arguments are passed to the template as they are. This is for example
+        used to pass the "input_expression_map", "state_limit_map" or "output_expressions". With the
+        additional flag "hybrid", the functions do not check the state limits at all, which is needed for
+        the hybrid simulation (see "simulation.simulate_hybrid"). The numba template additionally accepts
+        the flag "numba_cache", which can disable the disk cache of the compiled functions.
+    :returns: The python code string
+    """
+    if mode not in CODEGEN_MODES:
+        raise ValueError(f'The code generation mode "{mode}" is not supported! Please use one of the '
+                         f'following modes: {", ".join(CODEGEN_MODES)}')
+
+    jacobian_functions = []
+    if jacobian:
+        input_names = kwargs['input_names']
+        input_expression_map = kwargs['input_expression_map']
+        state_names = [str(symbol).replace('d_', '', 1) for symbol in solved_dict.keys()]
+        param_names = list(params_default_map.keys())
+
+        jacobian_states, jacobian_inputs, jacobian_params = derive_jacobians(
+            solved_dict,
+            input_names=input_names,
+            param_names=param_names,
+            simplify=(mode == 'cse' and simplify),
+        )
+        output_jacobian_states, output_jacobian_params = derive_output_jacobians(
+            kwargs['output_expressions'],
+            state_names=state_names,
+            param_names=param_names,
+        )
+        raw_inputs = sp.IndexedBase('inputs')
+        param_symbols = [sp.Symbol(name) for name in param_names]
+
+        jacobian_functions = [
+            _matrix_function_context(
+                'jacobian_states',
+                'The analytical jacobian of the state equations with respect to the states.',
+                jacobian_states, mode,
+            ),
+            _matrix_function_context(
+                'jacobian_inputs',
+                'The analytical jacobian of the state equations with respect to the (raw) inputs.',
+                sp.zeros(len(state_names), len(input_names)), mode,
+                chain_matrix=jacobian_inputs,
+                input_derivative_map=derive_input_jacobian(input_expression_map,
+                                                           [raw_inputs[i] for i in range(len(input_names))]),
+            ),
+            _matrix_function_context(
+                'jacobian_params',
+                'The analytical jacobian of the state equations with respect to the parameters in the\n'
+                '    order of "param_names".',
+                jacobian_params, mode,
+                chain_matrix=jacobian_inputs,
+                input_derivative_map=derive_input_jacobian(input_expression_map, param_symbols),
+            ),
+            _matrix_function_context(
+                'output_jacobian_states',
+                'The analytical jacobian of the outputs with respect to the states.',
+                output_jacobian_states, mode,
+                unpack_inputs=False,
+            ),
+            _matrix_function_context(
+                'output_jacobian_params',
+                'The analytical jacobian of the outputs with respect to the parameters in the order of\n'
+                '    "param_names".',
+                output_jacobian_params, mode,
+                unpack_inputs=False,
+            ),
+        ]
+
+    temporaries = []
+    if mode == 'cse':
+        temporaries, solved_dict = reduce_equations(solved_dict, simplify=simplify)
+
+    equations_map = {sp.pycode(symbol): _to_code(expression)
+                     for symbol, expression in solved_dict.items()}
+    temporaries_map = {sp.pycode(symbol): _to_code(expression)
+                       for symbol, expression in temporaries}
+
+    template = get_template_env().get_template(template_name)
+    return template.render({
+        'equations_map': equations_map,
+        'temporaries_map': temporaries_map,
+        'params_default_map': params_default_map,
+        'jacobian_functions': jacobian_functions,
+        **kwargs
+    })
+
+
+def _ldl_solve(mass_symbols: sp.Matrix,
+               forcing_symbols: t.List[sp.Symbol],
+               ) -> t.List[sp.Expr]:
+    # This creates the expressions for the solution of the linear system with the symmetric matrix of the
+    # given placeholder symbols through the LDL^T decomposition. Since the mass matrix is positive definite,
+    # the decomposition does not need any pivoting and because the zero entries of the mass matrix are kept
+    # as zeros in the placeholder matrix, all the operations involving those are dropped right away.
+    lower, diagonal = mass_symbols.LDLdecomposition(hermitian=False)
+    forward = lower.lower_triangular_solve(sp.Matrix(forcing_symbols))
+    scaled = sp.Matrix([forward[i] / diagonal[i, i] for i in range(len(forcing_symbols))])
+    return list(lower.T.upper_triangular_solve(scaled))
+
+
+def render_mass_matrix_code(acceleration_symbols: t.List[sp.Symbol],
+                            mass_matrix: sp.Matrix,
+                            forcing_vector: sp.Matrix,
+                            kinematic_dict: t.Dict[sp.Symbol, sp.Expr],
+                            params_default_map: t.Dict[str, float],
+                            mode: str = 'cse',
+                            template_name: str = 'system_mass_matrix.py.j2',
+                            **kwargs) -> str:
+    """
+    Renders the python module code which implements the system in the mass matrix form as returned by
+    "modelling.derive_mass_matrix_form". Instead of the explicit expressions of the accelerations, the
+    module contains the function "mass_matrix_form" which computes the numeric mass matrix and forcing
+    vector and the system function solves the corresponding linear system at runtime. For a symmetric mass
+    matrix the solution is an unrolled LDL^T decomposition, otherwise "np.linalg.solve" is used. The
+    generated module does not contain the jacobian functions.
+
+    :param acceleration_symbols: The derivative symbols of the velocities in the order of the rows and
+        columns of the mass matrix
+    :param mass_matrix: The square mass matrix
+    :param forcing_vector: The forcing vector with one row per acceleration
+    :param kinematic_dict: Maps the derivative symbols of the remaining states to their expressions
+    :param params_default_map: The default values for all the system parameters
+    :param mode: One of the CODEGEN_MODES. For "cse" the common subexpressions of the mass matrix and the
+        forcing vector as well as those of the solution of the linear system are hoisted into temporary
+        variables.
+    :param template_name: The name of the template to be rendered
+    :param kwargs: Any additional arguments are passed to the template as they are, just like for
+        "render_system_code"
+    :returns: The python code string
+    """
+    if mode not in CODEGEN_MODES:
+        raise ValueError(f'The code generation mode "{mode}" is not supported! Please use one of the '
+                         f'following modes: {", ".join(CODEGEN_MODES)}')
+
+    # The states are ordered by the names of their derivative symbols, exactly like the keys of a
+    # solved_dict, such that the module is a drop-in replacement for the ones of "render_system_code"
+    derivative_symbols = sorted([*kinematic_dict.keys(), *acceleration_symbols], key=str)
+
+    # Every (non-zero) entry of the mass matrix and the forcing vector is computed into a variable of its
+    # own. For a symmetric matrix, only the entries of the lower triangle have to be computed.
+    size = len(acceleration_symbols)
+    symmetric = sp.simplify(mass_matrix - mass_matrix.T).is_zero_matrix
+    mass_symbols = sp.zeros(size, size)
+    entry_map = {}
+    for (row, column), expression in np.ndenumerate(np.array(mass_matrix, dtype=object)):
+        if expression != 0:
+            if symmetric and column > row:
+                row, column = column, row
+            symbol = sp.Symbol(f'mass_{row}_{column}')
+            mass_symbols[row, column] = symbol
+            if symmetric:
+                mass_symbols[column, row] = symbol
+            entry_map[symbol] = mass_matrix[row, column]
+
+    forcing_symbols = [sp.Symbol(f'forcing_{row}') for row in range(size)]
+    entry_map.update(zip(forcing_symbols, forcing_vector))
+
+    temporaries = []
+    if mode == 'cse':
+        temporaries, entry_map = reduce_equations(entry_map, simplify=False)
+
+    solve_temporaries = []
+    solve_map = {}
+    if symmetric:
+        solve_map = dict(zip(acceleration_symbols, _ldl_solve(mass_symbols, forcing_symbols)))
+        if mode == 'cse':
+            solve_temporaries, solve_map = reduce_equations(solve_map, simplify=False, symbol_prefix='stmp')
+
+    template = get_template_env().get_template(template_name)
+    return template.render({
+        'state_names': [str(symbol).replace('d_', '', 1) for symbol in derivative_symbols],
+        'derivative_names': [sp.pycode(symbol) for symbol in derivative_symbols],
+        'kinematics_map': {sp.pycode(symbol): _to_code(expression)
+                           for symbol, expression in kinematic_dict.items()},
+        'accelerations': [sp.pycode(symbol) for symbol in acceleration_symbols],
+        'temporaries_map': {sp.pycode(symbol): _to_code(expression) for symbol, expression in temporaries},
+        'entries_map': {sp.pycode(symbol): _to_code(expression) for symbol, expression in entry_map.items()},
+        'mass_rows': [[_to_code(mass_symbols[row, column]) for column in range(size)] for row in range(size)],
+        'forcing_names': [sp.pycode(symbol) for symbol in forcing_symbols],
+        'solve_temporaries_map': {sp.pycode(symbol): _to_code(expression)
+                                  for symbol, expression in solve_temporaries},
+        'solve_map': {sp.pycode(symbol): _to_code(expression) for symbol, expression in solve_map.items()},
+        'params_default_map': params_default_map,
+        **kwargs
+    })
+
+
+# == PARTIAL EVALUATION ==
+# During a parameter identification usually only a few of the parameters are actually varied, while all the
+# other ones are constants. These can be baked into a specialized version of the system, which then only
+# has the free parameters as arguments. Besides the dict lookups this saves all the arithmetic between the
+# constants, which sympy folds into single numbers.
+
+def save_system_equations(path: str,
+                          solved_dict: t.Dict[sp.Symbol, sp.Expr],
+                          params_default_map: t.Dict[str, float],
+                          **kwargs) -> None:
+    """
+    Saves the symbolic state equations of a system together with the default values of its parameters and
+    the additional kwargs of "render_system_code" (such as the "input_expression_map") into a json file,
+    from which a specialized system can be generated at runtime with "specialize_system".
+    """
+    symbols = {symbol for expression in solved_dict.values() for symbol in expression.free_symbols}
+    with open(path, mode='w') as file:
+        json.dump({
+            'equations': {str(symbol): str(expression) for symbol, expression in solved_dict.items()},
+            'symbols': sorted(str(symbol) for symbol in symbols),
+            'params_default_map': params_default_map,
+            'kwargs': kwargs,
+        }, file, indent=4)
+
+
+def load_system_equations(path: str,
+                          ) -> t.Tuple[t.Dict[sp.Symbol, sp.Expr], t.Dict[str, float], dict]:
+    """
+    Loads the json file which was created by "save_system_equations".
+
+    :returns: A tuple (solved_dict, params_default_map, kwargs)
+    """
+    with open(path, mode='r') as file:
+        data = json.load(file)
+
+    # All the names are explicitly declared as symbols, because otherwise a parameter such as "beta" would
+    # be parsed as the sympy function of the same name
+    symbols = {name: sp.Symbol(name) for name in data['symbols']}
+    solved_dict = {sp.Symbol(name): sp.sympify(expression, locals=symbols)
+                   for name, expression in data['equations'].items()}
+    # The tuples of the kwargs (such as the rail limits) come back from json as lists
+    kwargs = {key: tuple(value) if isinstance(value, list) else value
+              for key, value in data['kwargs'].items()}
+    return solved_dict, data['params_default_map'], kwargs
+
+
+def freeze_params(solved_dict: t.Dict[sp.Symbol, sp.Expr],
+                  frozen_params: t.Dict[str, float],
+                  simplify: bool = True,
+                  ) -> t.Dict[sp.Symbol, sp.Expr]:
+    """
+    Substitutes the given numeric values for the frozen parameters into all the state equations.
+
+    The expressions are simplified *before* the substitution, because "simplify_trigonometric" works a lot
+    better with the symbols than with the floating point constants. The result should therefore be passed
+    to "render_system_code" with ``simplify=False``.
+
+    :param solved_dict: A dict whose keys are the derivative symbols and the values the corresponding
+        expressions of the state equations.
+    :param frozen_params: Maps the names of the frozen parameters to their values
+    :param simplify: Whether to apply "simplify_trigonometric" to each expression before the substitution
+    :returns: A dict with the same keys as solved_dict
+    """
+    substitutes = {sp.Symbol(name): sp.sympify(value) for name, value in frozen_params.items()}
+    return {symbol: (simplify_trigonometric(expression) if simplify else expression).xreplace(substitutes)
+            for symbol, expression in solved_dict.items()}
+
+
+def _freeze_expression(expression: str, substitutes: t.Dict[sp.Symbol, sp.Expr]) -> str:
+    # The string expressions of the inputs and the outputs are only changed if they actually contain any of
+    # the frozen parameters, because the parsing replaces functions such as "np.degrees".
+    parsed = parse_expression(expression)
+    if parsed.free_symbols.isdisjoint(substitutes.keys()):
+        return expression
+
+    return _to_code(parsed.xreplace(substitutes))
+
+
+def render_specialized_code(solved_dict: t.Dict[sp.Symbol, sp.Expr],
+                            params_default_map: t.Dict[str, float],
+                            frozen_params: t.Dict[str, float],
+                            mode: str = 'cse',
+                            template_name: str = 'system.py.j2',
+                            jacobian: bool = False,
+                            **kwargs) -> str:
+    """
+    Renders the python module code of the given system, in which the frozen parameters are replaced by
+    their values. The "param_names" of the resulting module as well as the columns of its
+    "jacobian_params" function only contain the remaining free parameters.
+
+    :param frozen_params: Maps the names of the frozen parameters to their values. These also replace the
+        parameters within the "input_expression_map" and the "output_expressions".
+    :param kwargs: The same arguments as for "render_system_code"
+    :returns: The python code string
+    """
+    unknown = [name for name in frozen_params if name not in params_default_map]
+    if unknown:
+        raise ValueError(f'The frozen parameters {", ".join(unknown)} are not parameters of the system!')
+
+    substitutes = {sp.Symbol(name): sp.sympify(value) for name, value in frozen_params.items()}
+    if 'input_expression_map' in kwargs:
+        kwargs['input_expression_map'] = {name: _freeze_expression(expression, substitutes)
+                                          for name, expression in kwargs['input_expression_map'].items()}
+    if 'output_expressions' in kwargs:
+        kwargs['output_expressions'] = [_freeze_expression(expression, substitutes)
+                                        for expression in kwargs['output_expressions']]
+
+    return render_system_code(
+        freeze_params(solved_dict, frozen_params, simplify=(mode == 'cse')),
+        {name: value for name, value in params_default_map.items() if name not in frozen_params},
+        mode=mode,
+        template_name=template_name,
+        jacobian=jacobian,
+        simplify=False,
+        **kwargs,
+    )
+
+
+# The specialized system modules which have already been created in this process by their keys
+_specialized_modules: t.Dict[str, types.ModuleType] = {}
+
+
+def _load_module(name: str, code: str, path: t.Optional[str] = None) -> types.ModuleType:
+    # The source code is registered with linecache, such that "inspect.getsource" works for the module
+    # even if it does not exist as a file. This is needed by "cache.model_version".
+    file_name = path or f'<{name}>'
+    linecache.cache[file_name] = (len(code), None, code.splitlines(keepends=True), file_name)
+
+    module = types.ModuleType(name)
+    module.__file__ = file_name
+    exec(compile(code, file_name, 'exec'), module.__dict__)
+    # The module has to be registered such that its functions can be pickled by reference, which means
+    # that they can be sent to the worker processes of a pool which is forked afterwards.
+    sys.modules[name] = module
+    return module
+
+
+def specialize_system(solved_dict: t.Dict[sp.Symbol, sp.Expr],
+                      params_default_map: t.Dict[str, float],
+                      frozen_params: t.Dict[str, float],
+                      mode: str = 'cse',
+                      template_name: str = 'system.py.j2',
+                      jacobian: bool = True,
+                      cache_path: t.Optional[str] = None,
+                      **kwargs) -> types.ModuleType:
+    """
+    Creates the specialized system module for the given frozen parameters (see "render_specialized_code")
+    and imports it. The modules are cached per frozen parameter set: Within the same process the same
+    module object is returned and if a ``cache_path`` is given, the generated code is additionally stored
+    in that directory such that it does not have to be generated again by other runs.
+
+    .. code-block:: python
+
+        solved_dict, params_default_map, kwargs = load_system_equations(path)
+        system_module = specialize_system(solved_dict, params_default_map, {'g': 9.81, 'l_0': 0.23},
+                                          **kwargs)
+        system_module.system(0, states, inputs, {'m_x': 40})
+
+    :param template_name: The template of the module. With "system_numba.py.j2" the specialized system is
+        JIT compiled, in which case the jacobian should be disabled since that template does not use it.
+        Without a ``cache_path`` the compiled functions are not cached by numba, because the module only
+        exists in memory.
+    :param jacobian: Whether the module contains the jacobian functions
+    :param cache_path: Optionally the directory in which the generated code is cached
+    :returns: The module, which has the same interface as the generated system modules
+    """
+    key = hash_parts(
+        {str(symbol): str(expression) for symbol, expression in solved_dict.items()},
+        params_default_map, frozen_params, mode, jacobian, kwargs,
+        get_template_env().loader.get_source(get_template_env(), template_name)[0],
+    )
+    if key in _specialized_modules:
+        return _specialized_modules[key]
+
+    path = None
+    code = None
+    if cache_path is not None:
+        os.makedirs(cache_path, exist_ok=True)
+        path = os.path.join(cache_path, f'specialized_{key}.py')
+        if os.path.exists(path):
+            with open(path, mode='r') as file:
+                code = file.read()
+
+    if code is None:
+        # numba can only cache the compiled functions of a module which exists as a file, for a module which
+        # only exists in memory "njit(cache=True)" raises an error.
+        code = render_specialized_code(solved_dict, params_default_map, frozen_params, mode=mode,
+                                       template_name=template_name, jacobian=jacobian,
+                                       numba_cache=path is not None, **kwargs)
+        if path is not None:
+            temp_path = f'{path}.{os.getpid()}.tmp'
+            with open(temp_path, mode='w') as file:
+                file.write(code)
+            os.replace(temp_path, path)
+
+    module = _load_module(f'labor_regelungstechnik.systems.specialized_{key[:16]}', code, path)
+    _specialized_modules[key] = module
+    return module
@@ -0,0 +1,281 @@
+import os
+import json
+import typing as t
+
+import numpy as np
+
+# These are the default keys which define how a recorded measurement maps to the inputs, the initial states
+# and the outputs of the pendulum system.
+DEFAULT_INPUT_KEYS = ('x_const_mess', 'y_const_mess')
+DEFAULT_INPUT_DELAYS = (0.3, 0.1)
+DEFAULT_STATE_KEYS = (None, None, 'y_out_mess', None, 'phi_out_mess', 'x_out_mess')
+DEFAULT_OUTPUT_KEYS = ('x_out_mess', 'y_out_mess', 'phi_out_mess')
+DEFAULT_OUTPUT_WEIGHTS = (0.2, 0.2, 1)
+# The angle is recorded in degrees but the corresponding state of the system is in radians
+DEFAULT_DEGREE_KEYS = ('phi_out_mess', )
+# The index of the sample from which the initial conditions are taken. The very first samples of a
+# measurement are sometimes still a bit off, which is why this is not zero.
+DEFAULT_INITIAL_INDEX = 3
+
+
+class PreparedMeasurement:
+    """
+    Container for all the parts of a single measurement which are needed to simulate and evaluate the
+    system, already converted into contiguous float64 arrays.
+
+    :ivar timestamps: Array of the shape (T, )
+    :ivar inputs: The (already delayed) input signals as an array of the shape (num_inputs, T)
+    :ivar initial_states: The initial conditions as an array of the shape (num_states, )
+    :ivar targets: The measured outputs as an array of the shape (num_outputs, T)
+    :ivar weights: The weight of every output for the error as an array of the shape (num_outputs, )
+    """
+    __slots__ = ('timestamps', 'inputs', 'initial_states', 'targets', 'weights')
+
+    def __init__(self,
+                 timestamps: np.ndarray,
+                 inputs: np.ndarray,
+                 initial_states: np.ndarray,
+                 targets: np.ndarray,
+                 weights: np.ndarray):
+        self.timestamps = timestamps
+        self.inputs = inputs
+        self.initial_states = initial_states
+        self.targets = targets
+        self.weights = weights
+
+    def __len__(self) -> int:
+        return len(self.timestamps)
+
+    def error(self, outputs: np.ndarray) -> float:
+        """
+        Computes the weighted mean absolute error between the given simulated outputs of the shape
+        (num_outputs, T) and the measured targets.
+        """
+        return float(np.dot(self.weights, np.mean(np.abs(self.targets - outputs), axis=-1)))
+
+
+def prepare_measurement(measurement: t.Dict[str, t.Sequence[float]],
+                        input_keys: t.Sequence[str] = DEFAULT_INPUT_KEYS,
+                        input_delays: t.Sequence[float] = DEFAULT_INPUT_DELAYS,
+                        state_keys: t.Sequence[t.Optional[str]] = DEFAULT_STATE_KEYS,
+                        output_keys: t.Sequence[str] = DEFAULT_OUTPUT_KEYS,
+                        output_weights: t.Sequence[float] = DEFAULT_OUTPUT_WEIGHTS,
+                        degree_keys: t.Sequence[str] = DEFAULT_DEGREE_KEYS,
+                        initial_index: int = DEFAULT_INITIAL_INDEX,
+                        ) -> PreparedMeasurement:
+    """
+    Converts a single measurement dict (as it is saved by the "extract_measurements" experiment) into a
+    PreparedMeasurement. None of this depends on the system parameters, so it has to be done only once
+    before the optimization.
+
+    :param measurement: The dict which maps the signal names to the lists of values
+    :param input_keys: The signal names which are used as the system inputs
+    :param input_delays: For each input the delay in seconds. The input is zero before that time.
+    :param state_keys: For each state of the system the signal name from which the initial condition is
+        taken or None if the initial condition is zero.
+    :param output_keys: The signal names which correspond to the outputs of the system
+    :param output_weights: For each output the weight in the error
+    :param degree_keys: The signal names which are given in degrees and have to be converted to radians
+        for the initial conditions.
+    :param initial_index: The index of the sample from which the initial conditions are taken
+    """
+    timestamps = np.ascontiguousarray(measurement['timestamps'], dtype=np.float64)
+
+    inputs = np.empty(shape=(len(input_keys), len(timestamps)), dtype=np.float64)
+    for i, (key, delay) in enumerate(zip(input_keys, input_delays)):
+        inputs[i] = np.where(timestamps < delay, 0.0, measurement[key])
+
+    initial_states = np.zeros(shape=(len(state_keys), ), dtype=np.float64)
+    for i, key in enumerate(state_keys):
+        if key is not None:
+            value = measurement[key][initial_index]
+            initial_states[i] = np.radians(value) if key in degree_keys else value
+
+    targets = np.array([measurement[key] for key in output_keys], dtype=np.float64)
+    weights = np.array(output_weights, dtype=np.float64)
+
+    return PreparedMeasurement(
+        timestamps=timestamps,
+        inputs=inputs,
+        initial_states=initial_states,
+        targets=targets,
+        weights=weights,
+    )
+
+
+def prepare_measurements(measurements: t.List[dict], **kwargs) -> t.List[PreparedMeasurement]:
+    return [prepare_measurement(measurement, **kwargs) for measurement in measurements]
+
+
+def measured_states(measurement: PreparedMeasurement,
+                    index: int,
+                    state_keys: t.Sequence[t.Optional[str]] = DEFAULT_STATE_KEYS,
+                    output_keys: t.Sequence[str] = DEFAULT_OUTPUT_KEYS,
+                    degree_keys: t.Sequence[str] = DEFAULT_DEGREE_KEYS,
+                    ) -> np.ndarray:
+    """
+    Reconstructs the states of the system at the given sample index of a prepared measurement from its
+    measured outputs, in the same way in which "prepare_measurement" determines the initial conditions.
+    The keys have to be the same ones which were used to prepare the measurement.
+
+    :returns: An array of the shape (num_states, ) where all the states which are not measured are NaN
+    """
+    states = np.full(shape=(len(state_keys), ), fill_value=np.nan)
+    for i, key in enumerate(state_keys):
+        if key is not None and key in output_keys:
+            value = measurement.targets[list(output_keys).index(key), index]
+            states[i] = np.radians(value) if key in degree_keys else value
+
+    return states
+
+
+# == MEASUREMENT STORE ==
+# The measurement store is a binary, columnar file format for the measurements which replaces the json
+# files. The json files have to be fully parsed before any of the values can be used, while the store can
+# be memory mapped and thus opened in no time - also by multiple processes which then share the pages.
+#
+# The layout of the file is the following:
+# - 8 bytes magic string
+# - 8 bytes little endian unsigned integer: the size of the json header in bytes
+# - the json header, padded with spaces such that the data block starts at a multiple of STORE_ALIGNMENT
+# - the data block: A C-ordered float64 array of the shape (num_columns, num_samples) which contains the
+#   samples of all the segments one after another. The json header defines the column names and the
+#   index ranges of the individual segments (measurements) within the data block.
+
+STORE_MAGIC = b'LRTSTORE'
+STORE_VERSION = 1
+STORE_ALIGNMENT = 64
+STORE_EXTENSION = '.mstore'
+
+
+class MeasurementStore(t.Sequence[t.Dict[str, np.ndarray]]):
+    """
+    Read access to a measurement store file. The store behaves like a list of measurement dicts, where
+    every dict maps the column names to (memory mapped) float64 arrays.
+
+    :param path: The absolute path to the store file
+    :param mmap: Whether the data should be memory mapped (default) or read into memory entirely.
+    """
+    def __init__(self, path: str, mmap: bool = True):
+        self.path = path
+
+        with open(path, mode='rb') as file:
+            magic = file.read(len(STORE_MAGIC))
+            if magic != STORE_MAGIC:
+                raise ValueError(f'The file "{path}" is not a valid measurement store!')
+
+            header_size = int.from_bytes(file.read(8), byteorder='little')
+            self.header = json.loads(file.read(header_size).decode())
+
+        # The layout of the data block may change with the version, which is why a store of a different
+        # version is never read as if it were the current one
+        version = self.header.get('version')
+        if version != STORE_VERSION:
+            raise ValueError(f'The measurement store "{path}" has the version {version}, but only the '
+                             f'version {STORE_VERSION} is supported! Please extract the measurements again.')
+
+        self.columns: t.List[str] = self.header['columns']
+        self.segments: t.List[t.Tuple[int, int]] = [tuple(segment) for segment in self.header['segments']]
+        self.column_index_map = {name: index for index, name in enumerate(self.columns)}
+
+        offset = len(STORE_MAGIC) + 8 + header_size
+        shape = (len(self.columns), self.header['num_samples'])
+        if shape[0] * shape[1] == 0:
+            # An empty region cannot be memory mapped
+            self.data = np.empty(shape=shape, dtype='<f8')
+        elif mmap:
+            self.data = np.memmap(path, dtype='<f8', mode='r', offset=offset, shape=shape)
+        else:
+            with open(path, mode='rb') as file:
+                file.seek(offset)
+                self.data = np.fromfile(file, dtype='<f8', count=shape[0] * shape[1]).reshape(shape)
+
+    def __len__(self) -> int:
+        return len(self.segments)
+
+    def __getitem__(self, index: int) -> t.Dict[str, np.ndarray]:
+        start, stop = self.segments[index]
+        return {name: self.data[i, start:stop] for i, name in enumerate(self.columns)}
+
+    def column(self, name: str) -> np.ndarray:
+        """
+        Returns the values of the given column for all the segments concatenated.
+        """
+        return self.data[self.column_index_map[name]]
+
+
+def save_measurement_store(path: str,
+                           measurements: t.List[t.Dict[str, t.Sequence[float]]],
+                           metadata: t.Optional[dict] = None,
+                           ) -> None:
+    """
+    Saves the given list of measurement dicts as a measurement store file to the given path. All the
+    measurements need to have the same keys.
+
+    :param metadata: An optional json serializable dict which is saved into the header of the store and
+        which is available as the "metadata" entry of the MeasurementStore.header
+    """
+    columns = list(measurements[0].keys()) if measurements else []
+    for measurement in measurements:
+        if set(measurement.keys()) != set(columns):
+            raise ValueError(f'All the measurements need to have the same keys to be saved into a '
+                             f'measurement store, but the keys {list(measurement.keys())} do not match '
+                             f'the keys {columns}')
+
+    segments = []
+    num_samples = 0
+    for measurement in measurements:
+        length = len(measurement[columns[0]])
+        segments.append((num_samples, num_samples + length))
+        num_samples += length
+
+    data = np.empty(shape=(len(columns), num_samples), dtype='<f8')
+    for (start, stop), measurement in zip(segments, measurements):
+        for i, name in enumerate(columns):
+            data[i, start:stop] = measurement[name]
+
+    header = json.dumps({
+        'version': STORE_VERSION,
+        'columns': columns,
+        'segments': segments,
+        'num_samples': num_samples,
+        'metadata': metadata or {},
+    }).encode()
+    # The header is padded such that the data block is properly aligned for the memory mapping
+    prefix_size = len(STORE_MAGIC) + 8 + len(header)
+    header += b' ' * (-prefix_size % STORE_ALIGNMENT)
+
+    with open(path, mode='wb') as file:
+        file.write(STORE_MAGIC)
+        file.write(len(header).to_bytes(8, byteorder='little'))
+        file.write(header)
+        file.write(data.tobytes(order='C'))
+
+
+def convert_json_to_store(json_path: str, store_path: t.Optional[str] = None) -> str:
+    """
+    Converts a measurements json file (as created by the "extract_measurements" experiment) into a
+    measurement store. If no store path is given, the store is saved next to the json file.
+
+    :returns: The path of the store file
+    """
+    if store_path is None:
+        store_path = os.path.splitext(json_path)[0] + STORE_EXTENSION
+
+    with open(json_path, mode='r') as file:
+        measurements = json.loads(file.read())
+
+    save_measurement_store(store_path, measurements)
+    return store_path
+
+
+def load_measurements(path: str) -> t.List[t.Dict[str, t.Sequence[float]]]:
+    """
+    Loads the list of measurement dicts from either a json file or a measurement store file, depending on
+    the file extension.
+    """
+    if path.endswith('.json'):
+        with open(path, mode='r') as file:
+            return json.loads(file.read())
+
+    return list(MeasurementStore(path))
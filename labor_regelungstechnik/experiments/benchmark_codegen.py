@@ -0,0 +1,61 @@
+import os
+import timeit
+import importlib
+
+import numpy as np
+from pycomex.experiment import Experiment
+from pycomex.util import Skippable
+
+# == BENCHMARK PARAMETERS ==
+# The python module names of the generated systems which are supposed to be compared. The first one is
+# the reference against which the speedup is computed and against which the results are checked.
+SYSTEM_MODULES = [
+    'labor_regelungstechnik.systems.single_pendulum_nonlinear',
+    'labor_regelungstechnik.systems.single_pendulum_nonlinear_cse',
+    'labor_regelungstechnik.systems.single_pendulum_nonlinear_mass_matrix',
+    'labor_regelungstechnik.systems.single_pendulum_nonlinear_numba',
+]
+# How many times the system function is called for a single timing run and how many of those timing runs
+# are done. In the end only the fastest of the repetitions is used.
+NUM_CALLS = 10_000
+NUM_REPEATS = 5
+# The number of random states for which the generated systems have to produce the same results
+NUM_CHECKS = 100
+
+# == EXPERIMENT PARAMETERS ==
+BASE_PATH = os.getcwd()
+NAMESPACE = 'benchmark_codegen'
+DEBUG = True
+with Skippable(), (e := Experiment(base_path=BASE_PATH, namespace=NAMESPACE, glob=globals())):
+
+    e.info('benchmarking the generated system functions...')
+    modules = [importlib.import_module(name) for name in SYSTEM_MODULES]
+
+    # Generally, the benchmark is meaningless if the different code generation modes produce different
+    # results, so we check that first.
+    e.info('checking that all the systems produce the same derivatives...')
+    states = np.random.uniform(low=[-1, -1, 0.0, -1, -1, 0.0],
+                               high=[1, 1, 1.3, 1, 1, 2.5],
+                               size=(NUM_CHECKS, 6))
+    inputs = np.random.uniform(-1, 1, size=(NUM_CHECKS, 2))
+    reference = np.array([modules[0].system(0, s, u, {}) for s, u in zip(states, inputs)])
+    for name, module in zip(SYSTEM_MODULES[1:], modules[1:]):
+        derivatives = np.array([module.system(0, s, u, {}) for s, u in zip(states, inputs)])
+        error = np.max(np.abs(derivatives - reference))
+        e.info(f' * {name} - max abs deviation: {error:.2e}')
+        e[f'deviation/{name}'] = float(error)
+
+    e.info('timing the system functions...')
+    state = states[0]
+    input = inputs[0]
+    for name, module in zip(SYSTEM_MODULES, modules):
+        times = timeit.repeat(lambda: module.system(0, state, input, {}), number=NUM_CALLS, repeat=NUM_REPEATS)
+        calls_per_second = NUM_CALLS / min(times)
+        e[f'calls_per_second/{name}'] = calls_per_second
+        e.info(f' * {name} - {calls_per_second:.0f} calls/sec')
+
+    reference_calls = e[f'calls_per_second/{SYSTEM_MODULES[0]}']
+    for name in SYSTEM_MODULES[1:]:
+        speedup = e[f'calls_per_second/{name}'] / reference_calls
+        e[f'speedup/{name}'] = speedup
+        e.info(f' * {name} - speedup: {speedup:.1f}x')
@@ -1,18 +1,33 @@
 import os
 import re
-from pprint import pprint, PrettyPrinter
-from collections import defaultdict
+from pprint import PrettyPrinter
 
-import numpy as np
-import matplotlib.pyplot as plt
-from matplotlib.backends.backend_pdf import PdfPages
 from pycomex.experiment import Experiment
 from pycomex.util import Skippable
 from asammdf import MDF
 
 from labor_regelungstechnik.utils import MEASUREMENTS_PATH
+from labor_regelungstechnik.data import save_measurement_store
+from labor_regelungstechnik.extraction import extract_segments, stream_measurements, extract_recordings
+from labor_regelungstechnik.plotting import PlotQueue, make_signal_pages
 
 MEASUREMENTS_FILE_NAME = 'messungen_18_11_22.mf4'
+# Whether the recording should be processed in the streaming mode, in which it is read in chunks of
+# CHUNK_SIZE records. This is useful for long recordings which do not fit into memory.
+STREAMING = False
+CHUNK_SIZE = 100_000
+# If this is not None, the experiment runs in the batch mode, in which all the recordings of this source are
+# extracted instead of only the single MEASUREMENTS_FILE_NAME. The source may either be a directory or a
+# glob pattern. The recordings are processed by NUM_WORKERS parallel worker processes and recordings which
+# did not change since a previous run are loaded from the cache.
+BATCH_SOURCE = None
+NUM_WORKERS = 4
+# Determines how the PDF plots are created: "sync" renders them right away, "background" renders them in
+# NUM_PLOT_WORKERS separate processes while the extraction continues and "disabled" skips them entirely.
+PLOT_MODE = 'background'
+NUM_PLOT_WORKERS = 2
+# Every plotted trace is reduced to at most this many points by min/max decimation
+PLOT_MAX_POINTS = 4000
 
 BASE_PATH = os.getcwd()
 NAMESPACE = 'extract_measurements'
@@ -20,90 +35,89 @@ DEBUG = True
 with Skippable(), (e := Experiment(base_path=BASE_PATH, namespace=NAMESPACE, glob=globals())):
 
     measurements_file_path = os.path.join(MEASUREMENTS_PATH, MEASUREMENTS_FILE_NAME)
-    e.info(f'starting to extract measurements from recorded file "{measurements_file_path}"')
-
-    # - READING FROM FILE AND PLOTTING
-
-    e.info(f'printing information overview...')
-    mdf = MDF(measurements_file_path)
-    mdf_info = mdf.info()
-    e['info'] = mdf_info
-    pretty_printer = PrettyPrinter(indent=4)
-    e.info(pretty_printer.pformat(mdf_info))
-
-    signal_names = []
-    for value in mdf_info['group 0'].values():
-        if isinstance(value, str) and 'name' in value:
-            pattern = re.compile(r'name="(.*)"')
-            m = re.search(pattern, value)
-            if m:
-                name = m.group(1)
-                signal_names.append(name)
-
-    e.info('plotting all the signals...')
-    n_rows = len(signal_names)
-    fig, rows = plt.subplots(ncols=1, nrows=n_rows, squeeze=False, figsize=(16, 4 * n_rows))
-
-    signal_map = {}
-    for i, signal_name in enumerate(signal_names):
-        signal = mdf.get(signal_name)
-
-        ax = rows[i][0]
-        ax.set_title(signal_name)
-        ax.plot(signal.timestamps, signal.samples)
-
-        signal_name_sanitized = signal_name.replace('Model Root/', '').replace('/In1', '')
-        signal_map[signal_name_sanitized] = signal
-
-    e.commit_fig('all.pdf', fig)
-
-    # - EXTRACTING THE DIFFERENT MEASUREMENTS
-
-    e.info('extracting the different measurements from the file by looking for switch == LOW')
-    timestamps = signal.timestamps
-    measurements = []
-    measurement_data = defaultdict(list)
-    start_time = None
-    for i in range(len(timestamps)):
-        t = timestamps[i]
-
-        if start_time is None and signal_map['switch_mess'][i] < 0.1:
-            start_time = t
-
-        if start_time is not None and signal_map['switch_mess'][i] < 0.1:
-            measurement_data['timestamps'].append(t - start_time)
-            for name, signal in signal_map.items():
-                if name == 'y_out_mess':
-                    value = 1.3 - signal.samples[i]
-                else:
-                    value = signal.samples[i]
-
-                measurement_data[name].append(value)
-
-        if start_time is not None and signal_map['switch_mess'][i] > 0.9:
-            measurements.append(dict(measurement_data))
-            measurement_data = defaultdict(list)
-            start_time = None
+    plot_queue = PlotQueue(mode=PLOT_MODE, num_workers=NUM_PLOT_WORKERS, max_points=PLOT_MAX_POINTS)
+
+    if BATCH_SOURCE is not None:
+        # The cache has to persist between the individual runs of the experiment, which is why it is not
+        # located in the record folder of this run but in the namespace folder.
+        cache_path = os.path.join(BASE_PATH, NAMESPACE, 'cache')
+        e.info(f'starting to extract measurements from all the recordings of "{BATCH_SOURCE}"')
+        measurements, recording_paths = extract_recordings(
+            BATCH_SOURCE,
+            cache_path=cache_path,
+            num_workers=NUM_WORKERS,
+            chunk_size=CHUNK_SIZE,
+            logger=e.info,
+        )
+        e['sources'] = [os.path.basename(path) for path in recording_paths]
+
+    elif STREAMING:
+        # In the streaming mode the recording is read in chunks and every measurement is extracted as soon
+        # as it is complete, which means that the file never has to be loaded into memory as a whole. The
+        # downside is that there is no plot of the entire recording in this mode.
+        e.info(f'starting to extract measurements from recorded file "{measurements_file_path}"')
+        e.info(f'extracting the measurements in streaming mode with chunks of {CHUNK_SIZE} records...')
+        measurements = []
+        for measurement in stream_measurements(measurements_file_path, chunk_size=CHUNK_SIZE):
+            measurements.append(measurement)
+            e.info(f' * measurement {len(measurements) - 1} with {len(measurement["timestamps"])} samples')
+
+    else:
+        e.info(f'starting to extract measurements from recorded file "{measurements_file_path}"')
+
+        # - READING FROM FILE AND PLOTTING
+
+        e.info(f'printing information overview...')
+        mdf = MDF(measurements_file_path)
+        mdf_info = mdf.info()
+        e['info'] = mdf_info
+        pretty_printer = PrettyPrinter(indent=4)
+        e.info(pretty_printer.pformat(mdf_info))
+
+        signal_names = []
+        for value in mdf_info['group 0'].values():
+            if isinstance(value, str) and 'name' in value:
+                pattern = re.compile(r'name="(.*)"')
+                m = re.search(pattern, value)
+                if m:
+                    name = m.group(1)
+                    signal_names.append(name)
+
+        signal_map = {}
+        for signal_name in signal_names:
+            signal = mdf.get(signal_name)
+            signal_name_sanitized = signal_name.replace('Model Root/', '').replace('/In1', '')
+            signal_map[signal_name_sanitized] = signal
+
+        # The whole recording contains a lot of samples for every signal which are reduced by the
+        # decimation of the plot queue before they are plotted.
+        e.info('plotting all the signals...')
+        plot_queue.submit(os.path.join(e.path, 'all.pdf'), [{
+            'rows': [{'title': signal_name, 'traces': [{'x': signal.timestamps, 'y': signal.samples}]}
+                     for signal_name, signal in zip(signal_names, signal_map.values())]
+        }])
+
+        # - EXTRACTING THE DIFFERENT MEASUREMENTS
+
+        e.info('extracting the different measurements from the file by looking for switch == LOW')
+        timestamps = signal.timestamps
+        measurements = extract_segments(
+            timestamps,
+            {name: signal.samples for name, signal in signal_map.items()},
+            switch_key='switch_mess',
+        )
 
     e.info(f'extracted a total of {len(measurements)} measurements from the file')
 
     e.info('plotting the different measurements...')
-    pdf_path = os.path.join(e.path, 'measurements.pdf')
-    with PdfPages(pdf_path) as pdf:
+    plot_queue.submit(os.path.join(e.path, 'measurements.pdf'), make_signal_pages(measurements))
 
-        for m, measurement_data in enumerate(measurements):
+    e.commit_json('measurements.json', [{key: values.tolist() for key, values in measurement.items()}
+                                        for measurement in measurements])
+    # Additionally the measurements are saved as a binary measurement store, which can be loaded a lot
+    # faster than the json file
+    save_measurement_store(os.path.join(e.path, 'measurements.mstore'), measurements,
+                           metadata={'sources': e['sources']} if BATCH_SOURCE is not None else None)
 
-            n_rows = len(measurement_data)
-            fig, rows = plt.subplots(ncols=1, nrows=n_rows, squeeze=False, figsize=(16, 4 * n_rows))
-            fig.suptitle(f'measurement {m}')
-
-            signal_map = {}
-            for i, (key, values) in enumerate(measurement_data.items()):
-                ax = rows[i][0]
-                ax.set_title(key)
-                ax.plot(measurement_data['timestamps'], measurement_data[key])
-
-            pdf.savefig(fig)
-            plt.close(fig)
-
-    e.commit_json('measurements.json', measurements)
+    e.info('waiting for the plots to finish...')
+    plot_queue.close()
@@ -1,25 +1,120 @@
 import os
-import sys
 import json
 import typing as t
 
-import control as ct
 import numpy as np
-import matplotlib.pyplot as plt
-from matplotlib.backends.backend_pdf import PdfPages
 from numpy import cos, sin, sqrt, tan
 from pycomex.experiment import Experiment
 from pycomex.util import Skippable
-from scipy.optimize import minimize
+from scipy.optimize import minimize, least_squares
 
-import labor_regelungstechnik.systems.single_pendulum_nonlinear as single_pendulum_nonlinear
-from labor_regelungstechnik.utils import MEASUREMENTS_PATH
+import labor_regelungstechnik.systems.single_pendulum_nonlinear_cse as single_pendulum_nonlinear_cse
+from labor_regelungstechnik.utils import MEASUREMENTS_PATH, PATH
+from labor_regelungstechnik.data import PreparedMeasurement, prepare_measurements, load_measurements
+from labor_regelungstechnik.optimization import create_pool, evaluate_measurements
+from labor_regelungstechnik.cache import SimulationCache
+from labor_regelungstechnik.codegen import load_system_equations, specialize_system
+from labor_regelungstechnik.sensitivity import evaluate_gradient, evaluate_residuals
+from labor_regelungstechnik.sensitivity import create_pool as create_sensitivity_pool
+from labor_regelungstechnik.shooting import MultipleShooting
+from labor_regelungstechnik.plotting import PlotQueue, make_comparison_pages
 
 # == DATA PARAMETERS ==
-MEASUREMENTS_JSON_PATH = os.path.join(MEASUREMENTS_PATH, 'measurements_001.json')
+# The path to the file with the extracted measurements. This may either be a json file or a binary
+# measurement store file (.mstore) which can be created from the json file with the "convert-measurements"
+# command and which loads a lot faster.
+MEASUREMENTS_FILE_PATH = os.path.join(MEASUREMENTS_PATH, 'measurements_001.json')
+# The signal names of the measurements which are used as the inputs of the system and the delays in
+# seconds after which these inputs actually affect the system
+INPUT_KEYS = ('x_const_mess', 'y_const_mess')
+INPUT_DELAYS = (0.3, 0.1)
+# For every state of the system the signal name from which the initial condition is taken
+STATE_KEYS = (None, None, 'y_out_mess', None, 'phi_out_mess', 'x_out_mess')
+# The signal names which correspond to the outputs of the system and their weights for the error
+OUTPUT_KEYS = ('x_out_mess', 'y_out_mess', 'phi_out_mess')
+OUTPUT_WEIGHTS = (0.2, 0.2, 1)
 
 # == SYSTEM PARAMETERS ==
-IO_SYSTEM = single_pendulum_nonlinear.io_system
+# The generated system module. The gradient based identification methods need the jacobian functions of
+# this module, which means that it has to be generated with the "jacobian" option of the codegen.
+SYSTEM_MODULE = single_pendulum_nonlinear_cse
+IO_SYSTEM = SYSTEM_MODULE.io_system
+# The integration method of solve_ivp. For the implicit methods (Radau, BDF, LSODA) the analytical jacobian
+# JACOBIAN of the system with respect to the states is used instead of finite differences. This needs to
+# match the IO_SYSTEM. Set it to None to use the finite differences anyways.
+SOLVER_METHOD = 'LSODA'
+JACOBIAN = SYSTEM_MODULE.jacobian_states
+# Whether all the parameters which are not identified (i.e. which are not part of INITIAL_PARAMS) are baked
+# into a specialized version of the system as constants. This version is generated from the symbolic
+# equations SYSTEM_EQUATIONS_PATH of the SYSTEM_MODULE (as saved by the "variational_modelling" experiment)
+# and then replaces the SYSTEM_MODULE, the IO_SYSTEM and the JACOBIAN. The generated code is cached in the
+# namespace folder of this experiment.
+SPECIALIZE_SYSTEM = True
+SYSTEM_EQUATIONS_PATH = os.path.join(PATH, 'systems', 'single_pendulum_nonlinear.json')
+# Whether the simulations of the objective function handle the rail limits of the system as the events of a
+# hybrid simulation (see "simulate_hybrid"). For this, a version of the system without the limit checks is
+# generated from the SYSTEM_EQUATIONS_PATH. This avoids the step rejections of the solver around the limits,
+# which makes the simulations which run into the end stops several times faster. For the simulations which
+# stay within the limits, the event handling of solve_ivp costs about as much as it saves.
+HYBRID_LIMITS = False
+
+# == IDENTIFICATION PARAMETERS ==
+# The method which is used to identify the parameters. The gradient based methods are optional:
+# - "nelder-mead": The derivative free simplex method, which only needs the simulations of the IO_SYSTEM
+#   but which scales badly with the number of parameters.
+# - "l-bfgs-b": Minimizes the weighted mean absolute error with the exact gradients of the system (see
+#   GRADIENT_MODE).
+# - "least-squares": Minimizes the weighted mean *squared* error with a Gauss-Newton like trust region
+#   method, using the exact jacobian of the residuals from the forward sensitivities.
+# - "multiple-shooting": The same least squares problem, but every measurement is split into NUM_WINDOWS
+#   windows which are simulated from their own initial states. This is a lot more robust for bad initial
+#   parameters and all the windows can be simulated in parallel.
+OPTIMIZATION_METHOD = 'nelder-mead'
+# How the gradients for the "l-bfgs-b" method are computed: "forward" integrates the sensitivities of all
+# the parameters together with the states, "adjoint" needs one backward integration per measurement
+# instead, whose cost does not depend on the number of identified parameters.
+GRADIENT_MODE = 'adjoint'
+# For the adjoint mode only every CHECKPOINT_INTERVAL'th state of the forward simulation is kept in memory,
+# the rest of the trajectory is recomputed during the backward integration.
+CHECKPOINT_INTERVAL = 500
+# For the multiple shooting: The number of windows per measurement and the weight of the continuity
+# defects between the windows relative to the weighted mean squared error.
+NUM_WINDOWS = 8
+CONTINUITY_WEIGHT = 10.0
+# The parameters which are identified and their initial values. The gradient based methods scale a lot
+# better with the number of parameters, e.g. for the drive parameters k_x, k_l, l_0, k_vx, k_vl and k_phi.
+# Note that "c_x" does not appear in the state equations at all, which is why its gradient is always zero
+# and it must not be identified with any of the gradient based methods.
+INITIAL_PARAMS = {
+    'm_x': 35,
+    'm_y': 3.1,
+    'c_varphi': 0.7,
+}
+# The gradient based methods work on the parameters relative to their initial values, which are all
+# restricted to these bounds (e.g. m_x in [3.5, 350])
+RELATIVE_BOUNDS = (0.1, 10)
+MAX_ITERATIONS = 10
+
+# == COMPUTATION PARAMETERS ==
+# The number of worker processes which are used to simulate the different measurements concurrently. For
+# a value of 1 all the measurements are simulated one after another in the main process.
+NUM_WORKERS = 4
+# The simulations of the individual measurements are cached, such that repeated evaluations with the same
+# parameters (e.g. by the nelder-mead method or the final plot of the optimized parameters) are free. This
+# is the memory budget of that cache in MB, where a value of 0 disables the cache.
+SIMULATION_CACHE_MB = 256
+# Whether the cached simulations are also written to the disk, into the namespace folder of this
+# experiment, such that they persist between different runs (e.g. of a parameter sweep).
+SIMULATION_CACHE_DISK = False
+
+# == PLOTTING PARAMETERS ==
+# Determines how the PDF plots are created: "sync" renders them right away, "background" renders them in
+# NUM_PLOT_WORKERS separate processes such that they do not slow down the optimization and "disabled"
+# skips them entirely.
+PLOT_MODE = 'background'
+NUM_PLOT_WORKERS = 2
+# Every plotted trace is reduced to at most this many points by min/max decimation
+PLOT_MAX_POINTS = 4000
 
 # == EXPERIMENT PARAMETERS ==
 BASE_PATH = os.getcwd()
@@ -30,87 +125,96 @@ with Skippable(), (e := Experiment(base_path=BASE_PATH, namespace=NAMESPACE, glo
     e.info('starting parameter identification...')
 
     # -- SETTING UP THE SYSTEM --
+    system_module, io_system, jacobian = SYSTEM_MODULE, IO_SYSTEM, JACOBIAN
+    state_limit_map = None
+    if SPECIALIZE_SYSTEM or HYBRID_LIMITS:
+        solved_dict, params_default_map, system_kwargs = load_system_equations(SYSTEM_EQUATIONS_PATH)
+        frozen_params = {}
+        if SPECIALIZE_SYSTEM:
+            frozen_params = {name: value for name, value in params_default_map.items()
+                             if name not in INITIAL_PARAMS}
+            e.info(f'specializing the system for the constant parameters {", ".join(frozen_params)}...')
+            system_module = specialize_system(
+                solved_dict,
+                params_default_map,
+                frozen_params,
+                cache_path=os.path.join(BASE_PATH, NAMESPACE, 'specialized_systems'),
+                **system_kwargs,
+            )
+            io_system = system_module.io_system
+            jacobian = None if JACOBIAN is None else system_module.jacobian_states
+
+        # The gradient based methods still need the system_module with the limit checks, since the jumps of
+        # the sensitivities at the limits are computed from the system function itself. Only the simulations
+        # of the objective function use the hybrid version.
+        if HYBRID_LIMITS:
+            e.info('generating the hybrid system without the limit checks...')
+            hybrid_module = specialize_system(
+                solved_dict,
+                params_default_map,
+                frozen_params,
+                cache_path=os.path.join(BASE_PATH, NAMESPACE, 'specialized_systems'),
+                hybrid=True,
+                **system_kwargs,
+            )
+            io_system = hybrid_module.io_system
+            jacobian = None if JACOBIAN is None else hybrid_module.jacobian_states
+            state_limit_map = hybrid_module.state_limit_map
 
     # -- LOADING THE MEASUREMENTS --
-    with open(MEASUREMENTS_JSON_PATH, mode='r') as file:
-        content = file.read()
-        measurements: t.List[dict] = json.loads(content)
+    raw_measurements: t.List[dict] = load_measurements(MEASUREMENTS_FILE_PATH)
+
+    # None of the conversions of the raw measurement values into the inputs, initial conditions and
+    # target outputs depend on the parameters, which is why this is only done once here.
+    e.info(f'preparing {len(raw_measurements)} measurements...')
+    measurements: t.List[PreparedMeasurement] = prepare_measurements(
+        raw_measurements,
+        input_keys=INPUT_KEYS,
+        input_delays=INPUT_DELAYS,
+        state_keys=STATE_KEYS,
+        output_keys=OUTPUT_KEYS,
+        output_weights=OUTPUT_WEIGHTS,
+    )
+
+    # -- SETTING UP THE WORKER PROCESSES --
+    # The different measurements are completely independent of each other, so they can be simulated
+    # concurrently. The worker processes receive the system and the measurements only once here.
+    pool = None
+    if NUM_WORKERS > 1:
+        e.info(f'starting {NUM_WORKERS} worker processes...')
+        pool = create_pool(io_system, measurements, NUM_WORKERS)
+
+    simulation_cache = None
+    if SIMULATION_CACHE_MB > 0:
+        # Just like the extraction cache, the disk tier is not located in the record folder of this run but
+        # in the namespace folder.
+        simulation_cache = SimulationCache(
+            max_bytes=SIMULATION_CACHE_MB * 2 ** 20,
+            path=os.path.join(BASE_PATH, NAMESPACE, 'simulation_cache') if SIMULATION_CACHE_DISK else None,
+        )
+
+    plot_queue = PlotQueue(mode=PLOT_MODE, num_workers=NUM_PLOT_WORKERS, max_points=PLOT_MAX_POINTS)
 
     # -- OBJECTIVE FUNCTION BASED ON MEASUREMENTS --
     def objective_function(parameters: t.Sequence[float],
-                           input_keys: t.Sequence[str] = ('x_const_mess', 'y_const_mess'),
-                           input_delays: t.Sequence[float] = (0.3, 0.1),
-                           state_keys: t.Sequence[str] = (None, None, 'y_out_mess', None, 'phi_out_mess',
-                                                          'x_out_mess'),
-                           output_keys: t.Sequence[str] = ('x_out_mess', 'y_out_mess', 'phi_out_mess'),
-                           output_weights: t.Sequence[float] = (0.2, 0.2, 1),
                            return_records: bool = False
                            ):
-        record_dict = {}
-
-        total_error = 0
-        for index, measurement in enumerate(measurements):
-            record_dict[index] = {'measured': [], 'simulated': []}
-
-            # We extract the exact same time frame from the model as we do for the measurements
-            ts = np.array(measurement['timestamps'])
-            record_dict[index]['timestamps'] = ts
-
-            # Then we need to extract the input signals from the measurement
-            inputs = []
-            for key, delay in zip(input_keys, input_delays):
-                values = []
-                for t, value in zip(ts, measurement[key]):
-                    if t < delay:
-                        values.append(0)
-                    else:
-                        values.append(value)
-
-                inputs.append(np.array(values))
-
-            # Then we also need to extract the starting conditions for the states from the measurements
-            initial_conditions = []
-            for key in state_keys:
-                if key is None:
-                    initial_conditions.append(0)
-                else:
-                    value = measurement[key][3]
-                    initial_conditions.append(value)
-
-            initial_conditions[2] = initial_conditions[2]
-            initial_conditions[4] = np.radians(initial_conditions[4])
-
-            # We unpack the parameter array into a dict such that the system can make sense of it
-            if parameters is None:
-                params = {}
-            else:
-                params = {
-                    'm_x': parameters[0],
-                    'm_y': parameters[1],
-                    'c_varphi': parameters[2],
-                }
-            # Then we can simulate the model in this time frame
-            try:
-                _, y = ct.input_output_response(
-                    IO_SYSTEM,
-                    ts,
-                    U=inputs,
-                    X0=initial_conditions,
-                    solve_ivp_kwargs={
-                        #'method': 'LSODA'
-                    },
-                    params=params
-                )
-            except RuntimeError:
-                return 1000
-
-            # Then we can compare the measurements
-            for key, weight, values_simulated in zip(output_keys, output_weights, y):
-                values_measured = np.array(measurement[key])
-                total_error += weight * np.mean(np.abs(values_measured - values_simulated))
+        # We unpack the parameter array into a dict such that the system can make sense of it
+        if parameters is None:
+            params = {}
+        else:
+            params = dict(zip(INITIAL_PARAMS.keys(), parameters))
 
-                record_dict[index]['measured'].append(values_measured)
-                record_dict[index]['simulated'].append(values_simulated)
+        total_error, record_dict = evaluate_measurements(
+            io_system,
+            measurements,
+            params,
+            pool=pool,
+            method=SOLVER_METHOD,
+            jacobian=jacobian,
+            cache=simulation_cache,
+            state_limit_map=state_limit_map,
+        )
 
         if return_records:
             return total_error, record_dict
@@ -122,84 +226,135 @@ with Skippable(), (e := Experiment(base_path=BASE_PATH, namespace=NAMESPACE, glo
     error, records_map = objective_function(None, return_records=True)
     e.info(f'mse with default parameters is: {error:.2f}')
 
-    pdf_path = os.path.join(e.path, 'default_parameters.pdf')
-    with PdfPages(pdf_path) as pdf:
-        for index, records in records_map.items():
-            n_rows = 3
-            fig, rows = plt.subplots(ncols=1, nrows=n_rows, figsize=(16, 6*n_rows), squeeze=False)
-            fig.suptitle(f'measurement {index}\n'
-                         f'error: {error:.2f}')
-
-            for row_index, name, limits, row in zip([0, 1, 2],
-                                                    ['x', 'l', 'phi'],
-                                                    [(-0.1, 3), (-0.1, 1.5), (-15, 15)],
-                                                    rows):
-                ax = row[0]
-                ax.set_title(name)
-
-                ax.set_ylim(limits)
-                ax.plot(
-                    records['timestamps'],
-                    records['measured'][row_index],
-                    color='gray',
-                    label='measured'
-                )
-                ax.plot(
-                    records['timestamps'],
-                    records['simulated'][row_index],
-                    color='blue',
-                    label='simulated'
+    # The pages are only described here and the actual rendering then happens in the background, while the
+    # main process already continues with the optimization.
+    plot_queue.submit(
+        os.path.join(e.path, 'default_parameters.pdf'),
+        make_comparison_pages(records_map, error, limits=[(-0.1, 3), (-0.1, 1.5), (-15, 15)]),
+    )
+
+    # -- PARAMETER OPTIMIZATION --
+    e.info(f'starting parameter optimization with method "{OPTIMIZATION_METHOD}"...')
+    param_names = list(INITIAL_PARAMS.keys())
+    initial_parameters = np.array(list(INITIAL_PARAMS.values()), dtype=float)
+
+    if OPTIMIZATION_METHOD == 'nelder-mead':
+        result = minimize(
+            objective_function,
+            initial_parameters,
+            method='nelder-mead',
+            options={
+                'maxiter': MAX_ITERATIONS,
+                'xatol': 1e-2,
+                'disp': True
+            }
+        )
+        optimized_parameters = result.x
+
+    else:
+        sensitivity_pool = None
+        if NUM_WORKERS > 1:
+            sensitivity_pool = create_sensitivity_pool(system_module, measurements, NUM_WORKERS)
+
+        # The optimization works on the parameters relative to their initial values, because the magnitudes
+        # of the parameters are vastly different (k_l ~ 500 and l_0 ~ 0.2)
+        def to_params(relative_parameters: np.ndarray) -> dict:
+            return dict(zip(param_names, relative_parameters * initial_parameters))
+
+        if OPTIMIZATION_METHOD == 'l-bfgs-b':
+            def gradient_function(relative_parameters: np.ndarray):
+                error, gradient = evaluate_gradient(
+                    system_module,
+                    measurements,
+                    to_params(relative_parameters),
+                    param_names,
+                    pool=sensitivity_pool,
+                    mode=GRADIENT_MODE,
+                    **({'checkpoint_interval': CHECKPOINT_INTERVAL} if GRADIENT_MODE == 'adjoint' else {}),
                 )
-                ax.legend()
+                e.info(f' * error: {error:.3f}')
+                return error, gradient * initial_parameters
 
-            pdf.savefig(fig)
-            plt.close(fig)
+            result = minimize(
+                gradient_function,
+                np.ones_like(initial_parameters),
+                jac=True,
+                method='L-BFGS-B',
+                bounds=[RELATIVE_BOUNDS] * len(param_names),
+                options={'maxiter': MAX_ITERATIONS},
+            )
 
-    sys.exit(0)
-    # -- PARAMETER OPTIMIZATION --
-    e.info('starting parameter optimization...')
-    initial_parameters = [35, 3.1, 0.7]
-    result = minimize(
-        objective_function,
-        initial_parameters,
-        method='nelder-mead',
-        options={
-            'maxiter': 10,
-            'xatol': 1e-2,
-            'disp': True
-        }
-    )
+        elif OPTIMIZATION_METHOD == 'least-squares':
+            # The residuals and their jacobian are computed by the same simulation, which is why the result
+            # is cached for the subsequent call of the jacobian function with the same parameters
+            cache = {}
+
+            def residual_function(relative_parameters: np.ndarray):
+                key = relative_parameters.tobytes()
+                if key not in cache:
+                    cache.clear()
+                    cache[key] = evaluate_residuals(system_module, measurements,
+                                                    to_params(relative_parameters), param_names,
+                                                    pool=sensitivity_pool)
+                return cache[key]
+
+            result = least_squares(
+                lambda parameters: residual_function(parameters)[0],
+                np.ones_like(initial_parameters),
+                jac=lambda parameters: residual_function(parameters)[1] * initial_parameters,
+                bounds=RELATIVE_BOUNDS,
+                max_nfev=MAX_ITERATIONS,
+            )
+
+        elif OPTIMIZATION_METHOD == 'multiple-shooting':
+            shooting = MultipleShooting(system_module, measurements, INITIAL_PARAMS,
+                                        num_windows=NUM_WINDOWS, continuity_weight=CONTINUITY_WEIGHT)
+            e.info(f'multiple shooting with {shooting.num_variables} variables and '
+                   f'{shooting.num_residuals} residuals')
+            cache = {}
+
+            def residual_function(vector: np.ndarray):
+                key = vector.tobytes()
+                if key not in cache:
+                    cache.clear()
+                    cache[key] = shooting.residuals(vector, pool=sensitivity_pool)
+                    e.info(f' * cost: {0.5 * np.sum(cache[key][0] ** 2):.4f}')
+                return cache[key]
+
+            # The vector starts with the relative parameters, which is why the result can be treated just
+            # like the results of the other methods below
+            result = least_squares(
+                lambda vector: residual_function(vector)[0],
+                shooting.initial_vector(pool=sensitivity_pool),
+                jac=lambda vector: residual_function(vector)[1],
+                bounds=shooting.bounds(RELATIVE_BOUNDS),
+                x_scale='jac',
+                max_nfev=MAX_ITERATIONS,
+            )
+
+        else:
+            raise ValueError(f'The optimization method "{OPTIMIZATION_METHOD}" is not supported!')
+
+        optimized_parameters = result.x[:len(param_names)] * initial_parameters
+        if sensitivity_pool is not None:
+            sensitivity_pool.shutdown()
+
+    e['optimized_parameters'] = dict(zip(param_names, optimized_parameters.tolist()))
 
     # -- PLOTTING OPTIMIZED --
-    error, records_map = objective_function(result.x, return_records=True)
+    error, records_map = objective_function(optimized_parameters, return_records=True)
     e.info(f'mse with optimized parameters is: {error:.2f}')
-    e.info(f'optimized parameters: {result.x}')
-
-    pdf_path = os.path.join(e.path, 'optimized_parameters.pdf')
-    with PdfPages(pdf_path) as pdf:
-        for index, records in records_map.items():
-            n_rows = 3
-            fig, rows = plt.subplots(ncols=1, nrows=n_rows, figsize=(16, 6 * n_rows), squeeze=False)
-            fig.suptitle(f'measurement {index}\n'
-                         f'error: {error:.2f}')
-
-            for row_index, name, row in zip([0, 1, 2], ['x', 'l', 'phi'], rows):
-                ax = row[0]
-                ax.set_title(name)
-
-                ax.plot(
-                    records['timestamps'],
-                    records['measured'][row_index],
-                    color='gray',
-                    label='measured'
-                )
-                ax.plot(
-                    records['timestamps'],
-                    records['simulated'][row_index],
-                    color='blue',
-                    label='simulated'
-                )
-                ax.legend()
+    e.info(f'optimized parameters: {e["optimized_parameters"]}')
+
+    plot_queue.submit(
+        os.path.join(e.path, 'optimized_parameters.pdf'),
+        make_comparison_pages(records_map, error),
+    )
+
+    if simulation_cache is not None:
+        e.info(f'simulation cache: {simulation_cache.hits} hits ({simulation_cache.disk_hits} from disk), '
+               f'{simulation_cache.misses} misses')
 
-            pdf.savefig(fig)
-            plt.close(fig)
+    plot_queue.close()
+    if pool is not None:
+        pool.shutdown()
@@ -10,28 +10,19 @@ from math import pi
 from pycomex.experiment import Experiment
 from pycomex.util import Skippable
 
+from labor_regelungstechnik.simulation import InputSignal, simulate_response
+from labor_regelungstechnik.signals import Step, stack
+
+# How the sampled input signals are evaluated between the samples: "linear" interpolates them, just like
+# "ct.input_output_response" does, and "zoh" holds the value of the last sample, which turns the step
+# inputs into actual steps instead of ramps over one sample interval.
+INPUT_MODE = 'linear'
 
 BASE_PATH = os.getcwd()
 NAMESPACE = 'simulate_system'
 DEBUG = True
 
 
-def smooth_step(t: float,
-                initial_value: float = 0,
-                final_value: float = 1,
-                t_start: float = 0,
-                t_stop: float = 1):
-    if t < t_start:
-        return initial_value
-
-    if t_start < t < t_stop:
-        ratio = (t - t_start) / (t_stop - t_start)
-        return initial_value + (final_value - initial_value) * ratio
-
-    if t > t_stop:
-        return final_value
-
-
 with Skippable(), (e := Experiment(base_path=BASE_PATH, namespace=NAMESPACE, glob=globals())):
 
     e.info('Starting to simulate system...')
@@ -409,13 +400,14 @@ with Skippable(), (e := Experiment(base_path=BASE_PATH, namespace=NAMESPACE, glo
     ts = np.linspace(0, 10, 1000)
     X0 = [0, 0, 1.2, 0, 0, 0]
 
-    Xs = [0 if t < 1 else 0.1 for t in ts]
-    Ls = [0 if t < 1 else -0.1 for t in ts]
+    # The steps are evaluated on the whole time grid at once and then sampled into an InputSignal, such
+    # that the INPUT_MODE decides how they are interpolated between the samples.
+    inputs = stack(Step(1, final_value=0.1), Step(1, final_value=-0.1))
 
-    _, y = ct.input_output_response(
+    _, y = simulate_response(
         io_system,
         ts,
-        (Xs, Ls),
+        InputSignal(ts, inputs(ts), mode=INPUT_MODE),
         X0,
         solve_ivp_kwargs={
         #    'method': 'LSODA'
@@ -1,18 +1,75 @@
 import os
 
-import sympy
 import sympy as sp
 import sympy.physics.mechanics as spd
-
-import numpy as np
-import matplotlib.pyplot as plt
 from pycomex.experiment import Experiment
 from pycomex.util import Skippable
 
 from labor_regelungstechnik.utils import TEMPLATE_ENV
-from labor_regelungstechnik.utils import render_latex, latex_math
-
-
+from labor_regelungstechnik.utils import LatexQueue, latex_math
+from labor_regelungstechnik.codegen import render_system_code, reduce_equations, render_mass_matrix_code
+from labor_regelungstechnik.codegen import save_system_equations
+from labor_regelungstechnik.cache import ArtifactCache, hash_parts, model_version
+from labor_regelungstechnik.modelling import derive_lagrange_equations, substitute_derivatives
+from labor_regelungstechnik.modelling import to_numeric_equations, solve_numeric_system
+from labor_regelungstechnik.modelling import derive_mass_matrix_form
+
+# == SYSTEM PARAMETERS ==
+# The default values of the system parameters, which were tuned at the test bench. These are the defaults
+# of the generated system modules in "labor_regelungstechnik/systems" and the tests check that those
+# modules match freshly generated code, so they must only be changed together with those modules.
+PARAMS_DEFAULT_MAP = {
+    'm_x': 40,
+    'm_y': 3,
+    'y_max': 1.2,
+    'g': 9.81,
+    'c_varphi': 0.12,
+    'c_x': 0.5,
+    'k_x': 250,
+    'k_l': 500,
+    'l_0': 0.23,
+    'k_vx': 3.6,
+    'k_vl': -1.65,
+    'k_phi': 0.5,
+}
+
+# == CODEGEN PARAMETERS ==
+# A list of the code generation modes for which a python module of the system will be created. Possible
+# values are "plain" and "cse" (common subexpression elimination)
+CODEGEN_MODES = ['plain', 'cse']
+# The code generation mode which is used for the batched (vectorized) version of the system
+BATCH_CODEGEN_MODE = 'cse'
+# The code generation mode of the MATLAB system class. With "cse" the common subexpressions are computed
+# as local variables of the "stepImpl" method before the state equations.
+MATLAB_CODEGEN_MODE = 'plain'
+# Whether the python modules should additionally contain the "jacobian_states" and "jacobian_inputs"
+# functions, which compute the analytical jacobians of the system. These can be passed to the implicit
+# solvers (Radau, BDF, LSODA) instead of letting them approximate the jacobian with finite differences.
+CODEGEN_JACOBIAN = True
+# Whether to additionally create the "system_numba.py" module, whose system and output functions work with
+# flat float arrays for the states, the inputs and the params and are JIT compiled with numba (if it is
+# installed). It is generated in the "cse" mode and does not contain the jacobian functions.
+CODEGEN_NUMBA = True
+# Whether to additionally create the "system_mass_matrix.py" module from the mass matrix form M @ a = F of
+# the lagrange equations, which solves for the accelerations numerically instead of symbolically. This
+# module does not contain the jacobian functions.
+CODEGEN_MASS_MATRIX = True
+# Whether the intermediate results of the derivation (the lagrange equations, the solved system) and the
+# generated code are cached in the namespace folder of this experiment. Every stage is only computed
+# again if any of its inputs (e.g. the energy expression or the codegen parameters) have changed.
+ARTIFACT_CACHE = True
+
+# == RENDERING PARAMETERS ==
+# Determines how the PDF files of the intermediate expressions and equations are rendered: "sync" renders
+# them one after another, "parallel" runs up to LATEX_WORKERS pdflatex processes concurrently in the
+# background and "batch" puts all of them onto the pages of the single document "equations.pdf".
+LATEX_MODE = 'parallel'
+LATEX_WORKERS = 4
+# Whether the rendered PDF files are cached in the namespace folder of this experiment by the hash of their
+# latex source, such that unchanged expressions do not have to be rendered again.
+LATEX_CACHE = True
+
+# == EXPERIMENT PARAMETERS ==
 BASE_PATH = os.getcwd()
 NAMESPACE = 'variational_modeling'
 DEBUG = True
@@ -21,17 +78,24 @@ with Skippable(), (e := Experiment(base_path=BASE_PATH, namespace=NAMESPACE, glo
     # https://stackoverflow.com/questions/25346132
     spd.init_vprinting()
 
+    latex_queue = LatexQueue(
+        mode=LATEX_MODE,
+        num_workers=LATEX_WORKERS,
+        cache_path=os.path.join(BASE_PATH, NAMESPACE, 'latex_cache') if LATEX_CACHE else None,
+        batch_path=os.path.join(e.path, 'equations.pdf'),
+    )
+
     def save_expression(expression, name: str, template_name='math.tex.j2'):
         latex = spd.mlatex(expression)
         latex = latex_math(latex, template_name=template_name)
         pdf_path = os.path.join(e.path, name)
-        render_latex({'content': latex}, pdf_path)
+        latex_queue.submit({'content': latex}, pdf_path)
 
     def save_equations(equations: list, name: str, template_name='equations.tex.j2'):
         latex_list = [spd.mlatex(eq) for eq in equations]
         latex = latex_math(latex_list, template_name=template_name)
         pdf_path = os.path.join(e.path, name)
-        render_latex({'content': latex}, pdf_path)
+        latex_queue.submit({'content': latex}, pdf_path)
 
     # - DEFINING THE ENERGY FUNCTION
     e.info('starting out with the variational modeling...')
@@ -52,20 +116,7 @@ with Skippable(), (e := Experiment(base_path=BASE_PATH, namespace=NAMESPACE, glo
     k_vl = sp.Symbol('k_vl')
     k_phi = sp.Symbol('k_phi')
 
-    params_default_map = {
-        'm_x': 30,
-        'm_y': 3,
-        'y_max': 1.2,
-        'g': 9.81,
-        'c_varphi': 0.5,
-        'c_x': 0.5,
-        'k_x': 200,
-        'k_l': 200,
-        'l_0': 0.1,
-        'k_vx': 4,
-        'k_vl': 2,
-        'k_phi': 0.4
-    }
+    params_default_map = dict(PARAMS_DEFAULT_MAP)
 
     t = sp.Symbol('t')
     x, l, phi = spd.dynamicsymbols(r'x l \varphi')
@@ -98,88 +149,50 @@ with Skippable(), (e := Experiment(base_path=BASE_PATH, namespace=NAMESPACE, glo
 
     save_expression(energy, '_energy.pdf')
 
-    # - IMPLEMENT LAGRANGE EQUATION
-    equation_map = {}
-    for variable in general_coordinates_map.values():
-        file_name = str(variable).replace('\\', '').replace('(t)', '')
-        energy_derivative = sp.Derivative(energy, variable)
-        save_expression(energy_derivative, f'_energy_derivative_{file_name}.pdf')
-
-        variable_dot = variable.diff(t)
-        energy_dot_derivative = sp.Derivative(energy, variable_dot)
-        save_expression(energy_dot_derivative, f'_energy_dot_derivative_{file_name}.pdf')
+    # - ARTIFACT CACHE
+    # All the stages of the derivation and the code generation are cached by the hash of their inputs. The
+    # key of every stage is part of the inputs of the next stage, which means that changing the energy
+    # invalidates everything while changing only the codegen parameters just generates the code again.
+    # The version of the "modelling" and "codegen" modules is part of all the keys as well, such that changes
+    # to the derivation code itself are never served from a stale cache.
+    artifact_path = os.path.join(BASE_PATH, NAMESPACE, 'artifact_cache')
+    artifacts = ArtifactCache(artifact_path if ARTIFACT_CACHE else None)
+    version = hash_parts(model_version(derive_lagrange_equations, render_system_code), sp.__version__)
 
-        lagrange_term = sp.simplify(sp.Derivative(energy_dot_derivative, t) - energy_derivative)
-        #lagrange_term = sp.Derivative(energy_dot_derivative, t) - energy_derivative
-        rhs_term = coordinate_rhs_map[str(variable)]
-        lagrange_equation = sp.Eq(lagrange_term, rhs_term)
-        equation_map[str(variable)] = lagrange_equation
+    def srepr_map(expression_map: dict) -> dict:
+        return {name: sp.srepr(expression) for name, expression in expression_map.items()}
 
-        save_expression(lagrange_equation, f'_lagrange_equation_{file_name}.pdf')
+    # - IMPLEMENT LAGRANGE EQUATION
+    lagrange_key, equation_map = artifacts.compute(
+        'lagrange',
+        [version, sp.srepr(energy), sp.srepr(t), srepr_map(general_coordinates_map),
+         srepr_map(coordinate_rhs_map)],
+        lambda: derive_lagrange_equations(energy, general_coordinates_map, coordinate_rhs_map, t),
+    )
+
+    for name, variable in general_coordinates_map.items():
+        file_name = name.replace('\\', '').replace('(t)', '')
+        save_expression(sp.Derivative(energy, variable), f'_energy_derivative_{file_name}.pdf')
+        save_expression(sp.Derivative(energy, variable.diff(t)), f'_energy_dot_derivative_{file_name}.pdf')
+        save_expression(equation_map[name], f'_lagrange_equation_{file_name}.pdf')
 
     e.info(f'produced {len(equation_map)} equations for each of the variables: {equation_map.keys()}')
 
     # - CONVERTING TO ODE SYSTEM
 
     # Doing all the substitutions so that there are no derivatives of the second order anymore
-    substituted_equation_map = {}
-    final_equations = []
-    for name, equation in equation_map.items():
-        substituted_equation = equation.copy()
-
-        for variable_name in general_coordinates_map.keys():
-            variable = general_coordinates_map[variable_name]
-            variable_d = variable.diff(t)  # first derivative w.r.t time
-            variable_dd = variable.diff(t).diff(t)  # second derivative w.r.t. time
-
-            # ~ Substituting all higher derivatives of the base coordinates with explicit variables
-            substitute = coordinate_derivatives_map[variable_name]
-            substitute_d = substitute.diff(t)
-
-            substituted_equation = substituted_equation.subs(variable_d, substitute)
-            # substituted_equation = substituted_equation.subs(variable_dd, substitute_d)
-
-        substituted_equation = sp.simplify(substituted_equation)
-        substituted_equation_map[name] = substituted_equation
-
-        final_equations.append(substituted_equation)
-
-        variable = general_coordinates_map[name]
-        variable_d = variable.diff(t)
-        substitute = coordinate_derivatives_map[name]
-        substitution_equation = sp.Eq(variable_d, substitute)
-        final_equations.append(substitution_equation)
+    substitution_key, (substituted_equation_map, final_equations) = artifacts.compute(
+        'substitution',
+        [version, lagrange_key, srepr_map(coordinate_derivatives_map)],
+        lambda: substitute_derivatives(equation_map, general_coordinates_map, coordinate_derivatives_map, t),
+    )
 
+    for name, substituted_equation in substituted_equation_map.items():
         file_name = name.replace('\\', '').replace('(t)', '')
         save_expression(substituted_equation, f'substituted_equation_{file_name}.pdf')
 
     save_equations(final_equations, 'final_equations.pdf')
 
-    # '# Now we have to solve these equations for the derivative term
-    # final_equations = []
-    # for name, equation in substituted_equation_map.items():
-    #     variable = general_coordinates_map[name]
-    #     variable_d = variable.diff(t)
-    #
-    #     substitute = coordinate_derivatives_map[name]
-    #     substitute_d = substitute.diff(t)
-    #
-    #     # Obviously we can only solve for the term if the term is actually contained in the expression,
-    #     # which depending on the system structure is not always the case for all of the variables...
-    #     contains_derivative = substitute_d in equation.lhs.atoms(sp.Expr)
-    #     if contains_derivative:
-    #         solved = sp.solve(equation, substitute_d)
-    #         solved = sp.simplify(solved[0])
-    #         solved_equation = sp.Eq(substitute_d, solved)
-    #         substitution_equation = sp.Eq(variable_d, substitute)
-    #         final_equations.append(substitution_equation)
-    #         final_equations.append(solved_equation)
-    #
-    #         file_name = name.replace('\\', '').replace('(t)', '')
-    #         save_expression(solved, f'solved_{file_name}.pdf')
-    #
-    # save_equations(final_equations, f'system.pdf')'
-
     # - CLEANING UP FOR CODE GENERATION
     # So now that we essentially have created our system of ordinary differential equations we would like
     # to simulate this numerically. For that to happen we would need this system of equations not in
@@ -187,75 +200,154 @@ with Skippable(), (e := Experiment(base_path=BASE_PATH, namespace=NAMESPACE, glo
     # Sympy supports automatic code generation which we can use to achieve just that, but to make this
     # work out, we first have to get rid of all the symbolic "derivative" terms by replacing them with
     # just plain old symbols.
-
-    # First of all we create symbols which replace the time functions
-    variable_symbol_map = {}
-    plain_symbols = []
-    derivative_symbols = []
-    index = 0
-    for variable in [*coordinate_derivatives_map.values(), *general_coordinates_map.values()]:
-        variable_d = variable.diff(t)
-        variable_string = str(variable).replace('\\', '').replace('(t)', '')
-
-        symbol_d = sp.Symbol(f'd_{variable_string}')
-        variable_symbol_map[variable_d] = symbol_d
-        derivative_symbols.append(symbol_d)
-
-        symbol = sp.Symbol(variable_string)
-        variable_symbol_map[variable] = symbol
-        plain_symbols.append(symbol)
-
-    numeric_equations = []
-    for equation in final_equations:
-        if equation != True:
-            numeric_equation = equation.copy()
-
-            for variable, symbol in variable_symbol_map.items():
-                numeric_equation = sp.Eq(
-                    numeric_equation.lhs.subs(variable, symbol),
-                    numeric_equation.rhs.subs(variable, symbol)
-                )
-
-            numeric_equations.append(numeric_equation)
-
+    numeric_equations, derivative_symbols = to_numeric_equations(
+        final_equations,
+        general_coordinates_map,
+        coordinate_derivatives_map,
+        t
+    )
     save_equations(numeric_equations, 'numeric_system.pdf')
 
-    solved = sp.solve(numeric_equations, derivative_symbols, dict=True)
-    solved_dict = {symbol: expression
-                   for symbol, expression in sorted(solved[0].items(), key=lambda v: str(v[0]))}
-    solved_equations = [sp.Eq(symbol, sp.simplify(expression))
-                        for symbol, expression in solved_dict.items()]
+    def solve():
+        solved_dict = solve_numeric_system(numeric_equations, derivative_symbols)
+        solved_equations = [sp.Eq(symbol, sp.simplify(expression))
+                            for symbol, expression in solved_dict.items()]
+        return solved_dict, solved_equations
+
+    solve_key, (solved_dict, solved_equations) = artifacts.compute(
+        'solve',
+        [version, substitution_key],
+        solve,
+    )
 
     try:
         save_equations(solved_equations, 'solved_numeric_system.pdf')
     except ChildProcessError:
         e.info('could not render the final solved system!')
 
-    equations_map = {sp.pycode(symbol): sp.pycode(expression, fully_qualified_modules=False)
-                     for symbol, expression in solved_dict.items()}
-
-    code_template = TEMPLATE_ENV.get_template('system.py.j2')
-    code_string = code_template.render({
-        'equations_map': equations_map,
-        'params_default_map': params_default_map
-    })
-    code_path = os.path.join(e.path, 'system.py')
-    with open(code_path, mode='w') as file:
-        file.write(code_string)
-
-    # == MATLAB CODE GENERATION
-    matlab_expression_map = {sp.octave_code(symbol).replace('d_', ''): sp.octave_code(expression)
-                             for symbol, expression in solved_dict.items()}
-
-    matlab_system_template = TEMPLATE_ENV.get_template('system.m.j2')
-    matlab_code = matlab_system_template.render({
-        'class_name': 'System',
-        'property_value_map': params_default_map,
-        'state_expression_map': matlab_expression_map,
-        'input_names': ['v_x', 'v_l'],
-        'output_names': ['x_out', 'l_out', 'phi_out']
-    })
-    matlab_code_path = os.path.join(e.path, 'system.m')
-    with open(matlab_code_path, mode='w') as file:
-        file.write(matlab_code)
+    # These are the additional informations about the inputs, the outputs and the rail limits of the
+    # system which cannot be derived from the equations but which are needed for a complete system module
+    system_kwargs = {
+        'input_names': ('v_x', 'v_l'),
+        'input_expression_map': {'v_x': 'k_vx * inputs[0]', 'v_l': 'k_vl * inputs[1]'},
+        'state_limit_map': {'x': ('v_x', 0, 2.5), 'l': ('v_l', 0, 1.3)},
+        'output_names': ('x', 'l', 'varphi'),
+        'output_expressions': ('x', 'l', 'k_phi * np.degrees(varphi)'),
+    }
 
+    def generate_code():
+        code_map = {}
+
+        # == PYTHON CODE GENERATION
+        # For every one of the code generation modes we create a separate python module. "plain" is the
+        # direct translation of the solved expressions and "cse" is the version with the simplified
+        # expressions and the hoisted common subexpressions which is a lot faster to evaluate.
+        for mode in CODEGEN_MODES:
+            file_name = 'system.py' if mode == 'plain' else f'system_{mode}.py'
+            code_map[file_name] = render_system_code(
+                solved_dict,
+                params_default_map,
+                mode=mode,
+                jacobian=CODEGEN_JACOBIAN,
+                **system_kwargs,
+            )
+
+        # The batched version of the system evaluates the derivatives for many states and parameter sets in
+        # one numpy pass. It is important that this is generated from the very same solved_dict so that the
+        # batched and the scalar models can never drift apart.
+        code_map['system_batch.py'] = render_system_code(
+            solved_dict,
+            params_default_map,
+            mode=BATCH_CODEGEN_MODE,
+            template_name='system_batch.py.j2',
+            **system_kwargs,
+        )
+
+        if CODEGEN_NUMBA:
+            code_map['system_numba.py'] = render_system_code(
+                solved_dict,
+                params_default_map,
+                mode='cse',
+                template_name='system_numba.py.j2',
+                **system_kwargs,
+            )
+
+        # == MATLAB CODE GENERATION
+        matlab_temporaries = []
+        matlab_solved_dict = solved_dict
+        if MATLAB_CODEGEN_MODE == 'cse':
+            matlab_temporaries, matlab_solved_dict = reduce_equations(solved_dict)
+
+        matlab_expression_map = {sp.octave_code(symbol).replace('d_', ''): sp.octave_code(expression)
+                                 for symbol, expression in matlab_solved_dict.items()}
+        matlab_temporary_map = {sp.octave_code(symbol): sp.octave_code(expression)
+                                for symbol, expression in matlab_temporaries}
+
+        matlab_system_template = TEMPLATE_ENV.get_template('system.m.j2')
+        code_map['system.m'] = matlab_system_template.render({
+            'class_name': 'System',
+            'property_value_map': params_default_map,
+            'state_expression_map': matlab_expression_map,
+            'temporary_expression_map': matlab_temporary_map,
+            'input_names': ['v_x', 'v_l'],
+            'output_names': ['x_out', 'l_out', 'phi_out']
+        })
+
+        return code_map
+
+    # The generated code additionally depends on the templates, which is why their sources are part of the key
+    template_names = ('system.py.j2', 'system_batch.py.j2', 'system_numba.py.j2', 'system.m.j2')
+    template_sources = [TEMPLATE_ENV.loader.get_source(TEMPLATE_ENV, name)[0] for name in template_names]
+    _, code_map = artifacts.compute(
+        'code',
+        [version, solve_key, params_default_map, system_kwargs, CODEGEN_MODES, BATCH_CODEGEN_MODE,
+         MATLAB_CODEGEN_MODE, CODEGEN_JACOBIAN, CODEGEN_NUMBA, template_sources],
+        generate_code,
+    )
+
+    for file_name, code in code_map.items():
+        code_path = os.path.join(e.path, file_name)
+        with open(code_path, mode='w') as file:
+            file.write(code)
+
+    # The symbolic equations are saved as well, such that specialized versions of the system in which some
+    # of the parameters are replaced by constants can be generated at runtime (see "specialize_system")
+    save_system_equations(os.path.join(e.path, 'system.json'), solved_dict, params_default_map,
+                          **system_kwargs)
+
+    # == MASS MATRIX FORM
+    # Instead of solving the lagrange equations symbolically for the accelerations, this derivation only
+    # brings them into the form M @ a = F and the generated module then solves this small linear system
+    # numerically for every evaluation. This is a lot faster to derive and also to evaluate.
+    if CODEGEN_MASS_MATRIX:
+        mass_matrix_key, mass_matrix_form = artifacts.compute(
+            'mass_matrix',
+            [version, sp.srepr(energy), sp.srepr(t), srepr_map(general_coordinates_map),
+             srepr_map(coordinate_derivatives_map), srepr_map(coordinate_rhs_map)],
+            lambda: derive_mass_matrix_form(energy, general_coordinates_map, coordinate_derivatives_map,
+                                            coordinate_rhs_map, t),
+        )
+        acceleration_symbols, mass_matrix, forcing_vector, kinematic_dict = mass_matrix_form
+        save_equations([sp.Eq(mass_matrix * sp.Matrix(acceleration_symbols), forcing_vector)],
+                       'mass_matrix_system.pdf')
+
+        _, code = artifacts.compute(
+            'mass_matrix_code',
+            [version, mass_matrix_key, params_default_map, system_kwargs,
+             TEMPLATE_ENV.loader.get_source(TEMPLATE_ENV, 'system_mass_matrix.py.j2')[0]],
+            lambda: render_mass_matrix_code(acceleration_symbols, mass_matrix, forcing_vector, kinematic_dict,
+                                            params_default_map, mode='cse', **system_kwargs),
+        )
+        code_path = os.path.join(e.path, 'system_mass_matrix.py')
+        with open(code_path, mode='w') as file:
+            file.write(code)
+
+    e.info(f'computed stages: {artifacts.computed} - loaded stages: {artifacts.loaded}')
+
+    # In the parallel and the batch mode, the rendering errors only show up once all the jobs are done.
+    # Usually this is the solved system, which is just too large for latex.
+    e.info('waiting for the latex rendering...')
+    try:
+        latex_queue.close()
+    except ChildProcessError:
+        e.info('could not render all of the equations!')
@@ -0,0 +1,319 @@
+import os
+import glob
+import hashlib
+import typing as t
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from labor_regelungstechnik.data import MeasurementStore, save_measurement_store
+
+# The "asammdf" package is only imported once an MF4 file is actually read, because the import alone takes
+# more than half a second and most of the functions here work on the already extracted signals.
+if t.TYPE_CHECKING:
+    from asammdf import MDF
+
+# The name of the signal which marks the measurements within a recording. While a measurement is running
+# the switch signal is LOW and between the measurements it is HIGH.
+DEFAULT_SWITCH_KEY = 'switch_mess'
+DEFAULT_LOW_THRESHOLD = 0.1
+DEFAULT_HIGH_THRESHOLD = 0.9
+# The number of records which are read from an MF4 file at once in the streaming mode
+DEFAULT_CHUNK_SIZE = 100_000
+
+
+def invert_rope_length(values: np.ndarray) -> np.ndarray:
+    # The sensor measures the distance from the bottom and not the length of the rope
+    return 1.3 - values
+
+
+# These transformations are applied to the signals with the corresponding names when the segments are
+# extracted. The functions have to be defined on the module level so that they can be pickled.
+DEFAULT_TRANSFORM_MAP: t.Dict[str, t.Callable[[np.ndarray], np.ndarray]] = {
+    'y_out_mess': invert_rope_length,
+}
+
+
+def _active_state(switch: np.ndarray,
+                  low_threshold: float,
+                  high_threshold: float,
+                  initial_active: bool = False,
+                  ) -> np.ndarray:
+    # Every sample is an "event" which is either +1 (LOW, the segment is running), -1 (HIGH, no segment)
+    # or 0 for everything in between, in which case the previous state persists. The very first event is
+    # the state which is carried over from a previous chunk of the signal (if any).
+    events = np.zeros(shape=(len(switch) + 1, ), dtype=np.int8)
+    events[0] = 1 if initial_active else -1
+    events[1:][switch < low_threshold] = 1
+    events[1:][switch > high_threshold] = -1
+
+    # To carry the previous state over the samples without an event, we forward fill the index of the
+    # most recent event.
+    indices = np.where(events != 0, np.arange(len(events)), 0)
+    np.maximum.accumulate(indices, out=indices)
+    return events[indices][1:] == 1
+
+
+def _find_runs(active: np.ndarray) -> t.Tuple[np.ndarray, np.ndarray]:
+    # The rising and falling edges of the "active" state are exactly the starts and stops of the segments.
+    # A stop index which is equal to the length means that the segment is still active at the end.
+    edges = np.diff(active.astype(np.int8), prepend=0, append=0)
+    return np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)
+
+
+def find_segments(switch: np.ndarray,
+                  low_threshold: float = DEFAULT_LOW_THRESHOLD,
+                  high_threshold: float = DEFAULT_HIGH_THRESHOLD,
+                  ) -> t.List[t.Tuple[int, int]]:
+    """
+    Finds the index ranges of the measurement segments within the given switch signal. A segment starts
+    at the first sample which is below the low threshold and ends right before the next sample which is
+    above the high threshold (a schmitt trigger, essentially). A segment which is not closed before the
+    end of the signal is discarded, because it is most likely an incomplete measurement.
+
+    :param switch: The array of switch signal samples
+    :returns: A list of (start, stop) index tuples
+    """
+    switch = np.asarray(switch)
+    starts, stops = _find_runs(_active_state(switch, low_threshold, high_threshold))
+
+    return [(int(start), int(stop)) for start, stop in zip(starts, stops) if stop < len(switch)]
+
+
+def iter_segments(chunks: t.Iterable[t.Tuple[np.ndarray, t.Dict[str, np.ndarray]]],
+                  switch_key: str = DEFAULT_SWITCH_KEY,
+                  transform_map: t.Dict[str, t.Callable[[np.ndarray], np.ndarray]] = DEFAULT_TRANSFORM_MAP,
+                  low_threshold: float = DEFAULT_LOW_THRESHOLD,
+                  high_threshold: float = DEFAULT_HIGH_THRESHOLD,
+                  ) -> t.Iterator[t.Dict[str, np.ndarray]]:
+    """
+    Extracts the individual measurements from a recording which is given as a sequence of consecutive
+    chunks. Every measurement is yielded as soon as it is closed. Measurements which span multiple chunks
+    are carried over the chunk boundaries, so only the currently open measurement and the current chunk
+    have to be held in memory.
+
+    :param chunks: An iterable of (timestamps, signal_map) tuples where signal_map is a dict which maps
+        the signal names to the arrays of samples of that chunk.
+    :param switch_key: The name of the signal which marks the measurements
+    :param transform_map: A dict which maps signal names to functions which are applied to the samples
+    :returns: An iterator of measurement dicts. Every dict contains the timestamps relative to the start
+        of the measurement under the key "timestamps" as well as the samples of all the signals.
+    """
+    # The pieces of the currently open measurement, one for every chunk that it spans.
+    pending: t.List[t.Dict[str, np.ndarray]] = []
+    active_state = False
+    for timestamps, signal_map in chunks:
+        timestamps = np.asarray(timestamps)
+        switch = np.asarray(signal_map[switch_key])
+        if len(switch) == 0:
+            continue
+
+        active = _active_state(switch, low_threshold, high_threshold, initial_active=active_state)
+        low = switch < low_threshold
+
+        # If the chunk starts with the switch being HIGH, the measurement which was carried over from the
+        # previous chunk ended exactly at the chunk boundary.
+        if pending and not active[0]:
+            yield _join_pieces(pending, transform_map)
+            pending = []
+
+        starts, stops = _find_runs(active)
+        for start, stop in zip(starts, stops):
+            # Within a segment only those samples are part of the measurement for which the switch is
+            # really LOW. Usually that is the case for all of them and then simple slices are sufficient.
+            mask = low[start:stop]
+            index = slice(start, stop) if mask.all() else np.flatnonzero(mask) + start
+
+            piece = {'timestamps': timestamps[index]}
+            for name, samples in signal_map.items():
+                piece[name] = np.asarray(samples)[index]
+
+            pending.append(piece)
+            if stop < len(switch):
+                yield _join_pieces(pending, transform_map)
+                pending = []
+
+        active_state = bool(active[-1])
+
+    # Whatever is still pending at this point was never closed and is thus discarded
+
+
+def _join_pieces(pieces: t.List[t.Dict[str, np.ndarray]],
+                 transform_map: t.Dict[str, t.Callable[[np.ndarray], np.ndarray]],
+                 ) -> t.Dict[str, np.ndarray]:
+    if len(pieces) == 1:
+        measurement = dict(pieces[0])
+    else:
+        measurement = {key: np.concatenate([piece[key] for piece in pieces]) for key in pieces[0].keys()}
+
+    measurement['timestamps'] = measurement['timestamps'] - measurement['timestamps'][0]
+    for name, function in transform_map.items():
+        if name in measurement:
+            measurement[name] = function(measurement[name])
+
+    return measurement
+
+
+def extract_segments(timestamps: np.ndarray,
+                     signal_map: t.Dict[str, np.ndarray],
+                     **kwargs,
+                     ) -> t.List[t.Dict[str, np.ndarray]]:
+    """
+    Extracts the individual measurements from the given signals of a whole recording.
+
+    :param timestamps: The timestamps which are shared by all the signals
+    :param signal_map: A dict which maps the signal names to the arrays of samples
+    :param kwargs: Additional keyword arguments for "iter_segments"
+    :returns: A list of measurement dicts. Every dict contains the timestamps relative to the start of the
+        measurement under the key "timestamps" as well as the samples of all the signals.
+    """
+    return list(iter_segments([(timestamps, signal_map)], **kwargs))
+
+
+# == MF4 FILES ==
+
+def sanitize_signal_name(name: str) -> str:
+    return name.replace('Model Root/', '').replace('/In1', '')
+
+
+def read_signal_names(mdf: 'MDF', group: int = 0) -> t.List[str]:
+    """
+    Returns the names of all the channels in the given channel group of the given MDF file.
+    """
+    return [channel.name for channel in mdf.groups[group].channels]
+
+
+def iter_mdf_chunks(path: str,
+                    chunk_size: int = DEFAULT_CHUNK_SIZE,
+                    group: int = 0,
+                    ) -> t.Iterator[t.Tuple[np.ndarray, t.Dict[str, np.ndarray]]]:
+    """
+    Reads all the channels of the given channel group of an MF4 file in chunks of ``chunk_size`` records,
+    such that the memory consumption is bounded by the chunk size and not by the length of the recording.
+
+    :returns: An iterator of (timestamps, signal_map) tuples where signal_map maps the sanitized signal
+        names to the samples of the chunk.
+    """
+    from asammdf import MDF
+
+    with MDF(path) as mdf:
+        signal_names = read_signal_names(mdf, group)
+        num_records = mdf.groups[group].channel_group.cycles_nr
+        for offset in range(0, num_records, chunk_size):
+            signals = mdf.select(
+                [(name, group, None) for name in signal_names],
+                record_offset=offset,
+                record_count=chunk_size,
+            )
+            signal_map = {sanitize_signal_name(name): signal.samples
+                          for name, signal in zip(signal_names, signals)}
+            yield signals[0].timestamps, signal_map
+
+
+def stream_measurements(path: str,
+                        chunk_size: int = DEFAULT_CHUNK_SIZE,
+                        **kwargs,
+                        ) -> t.Iterator[t.Dict[str, np.ndarray]]:
+    """
+    Extracts the measurements from an MF4 recording in a streaming fashion. See "iter_mdf_chunks" and
+    "iter_segments".
+    """
+    yield from iter_segments(iter_mdf_chunks(path, chunk_size=chunk_size), **kwargs)
+
+
+# == BATCH EXTRACTION ==
+# The batch extraction processes all the recordings of a directory in parallel worker processes. The
+# measurements of every recording are cached as a measurement store file whose name is the hash of the
+# recording's content, which means that recordings which have already been processed in a previous run
+# are skipped - even if they were renamed or moved in the meantime.
+
+# These are the names of the additional columns which are added to every measurement in the batch mode to
+# identify the recording file and the position of the measurement within that file.
+SOURCE_INDEX_KEY = 'source_index'
+SEGMENT_INDEX_KEY = 'segment_index'
+
+
+def hash_file(path: str, block_size: int = 2 ** 20) -> str:
+    """
+    Returns the hex sha256 digest of the content of the given file.
+    """
+    hasher = hashlib.sha256()
+    with open(path, mode='rb') as file:
+        for block in iter(lambda: file.read(block_size), b''):
+            hasher.update(block)
+
+    return hasher.hexdigest()
+
+
+def find_recordings(source: str, extension: str = '.mf4') -> t.List[str]:
+    """
+    Returns the sorted list of absolute recording file paths for the given source which may either be a
+    directory (in which case all the files with the given extension are used) or a glob pattern.
+    """
+    if os.path.isdir(source):
+        source = os.path.join(source, f'*{extension}')
+
+    return sorted(os.path.abspath(path) for path in glob.glob(source) if os.path.isfile(path))
+
+
+def _extract_recording(path: str, store_path: str, chunk_size: int) -> str:
+    measurements = list(stream_measurements(path, chunk_size=chunk_size))
+    # The store is first written to a temporary file and only then moved to the final location, so that
+    # an interrupted run can never leave an incomplete cache file behind.
+    temp_path = f'{store_path}.{os.getpid()}.tmp'
+    save_measurement_store(temp_path, measurements, metadata={'source': os.path.basename(path)})
+    os.replace(temp_path, store_path)
+    return store_path
+
+
+def extract_recordings(source: str,
+                       cache_path: str,
+                       num_workers: int = 4,
+                       chunk_size: int = DEFAULT_CHUNK_SIZE,
+                       logger: t.Optional[t.Callable[[str], None]] = None,
+                       ) -> t.Tuple[t.List[t.Dict[str, np.ndarray]], t.List[str]]:
+    """
+    Extracts the measurements from all the recordings of the given source (a directory or glob pattern)
+    and merges them into a single list. Every measurement gets two additional constant integer columns
+    SOURCE_INDEX_KEY and SEGMENT_INDEX_KEY which identify the recording (an index into the returned list of
+    file paths) and the position of the measurement within that recording.
+
+    :param source: A directory or a glob pattern for the recording files
+    :param cache_path: The directory in which the extracted measurements of every recording are cached
+    :param num_workers: The number of worker processes which extract the recordings concurrently
+    :param chunk_size: The chunk size for the streaming extraction of the individual recordings
+    :param logger: An optional function which is called with progress messages
+    :returns: A tuple (measurements, paths) where paths is the list of the recording file paths
+    """
+    logger = logger or (lambda message: None)
+    os.makedirs(cache_path, exist_ok=True)
+
+    paths = find_recordings(source)
+    store_paths = []
+    pending = []
+    for path in paths:
+        store_path = os.path.join(cache_path, f'{hash_file(path)}.mstore')
+        store_paths.append(store_path)
+        if os.path.exists(store_path):
+            logger(f'skipping unchanged recording "{os.path.basename(path)}"')
+        else:
+            pending.append((path, store_path))
+
+    if pending:
+        logger(f'extracting {len(pending)} recordings with {num_workers} workers...')
+        with ProcessPoolExecutor(max_workers=num_workers) as pool:
+            futures = [pool.submit(_extract_recording, path, store_path, chunk_size)
+                       for path, store_path in pending]
+            for (path, _), future in zip(pending, futures):
+                future.result()
+                logger(f'extracted recording "{os.path.basename(path)}"')
+
+    measurements = []
+    for source_index, store_path in enumerate(store_paths):
+        for segment_index, measurement in enumerate(MeasurementStore(store_path)):
+            length = len(measurement['timestamps'])
+            measurement[SOURCE_INDEX_KEY] = np.full(length, source_index, dtype=np.int64)
+            measurement[SEGMENT_INDEX_KEY] = np.full(length, segment_index, dtype=np.int64)
+            measurements.append(measurement)
+
+    return measurements, paths
@@ -0,0 +1,188 @@
+import typing as t
+
+import sympy as sp
+import sympy.physics.mechanics as spd
+
+# These are the individual stages of the variational modelling of a system (see the experiment
+# "variational_modelling.py"), which start from the kinetic energy and end with the explicit system of first
+# order ordinary differential equations from which the code is generated. Every stage is a pure function
+# of the results of the previous stage, such that the results can be cached and only the stages whose
+# inputs have actually changed have to be computed again.
+
+
+def _plain_name(name: str) -> str:
+    return name.replace('\\', '').replace('(t)', '')
+
+
+def derive_lagrange_equations(energy: sp.Expr,
+                              general_coordinates_map: t.Dict[str, sp.Function],
+                              coordinate_rhs_map: t.Dict[str, sp.Expr],
+                              time: sp.Symbol,
+                              ) -> t.Dict[str, sp.Eq]:
+    """
+    Derives the lagrange equation "d/dt (dE / dq') - dE / dq = Q" for each of the general coordinates q.
+
+    :param energy: The energy expression in terms of the general coordinates and their time derivatives
+    :param general_coordinates_map: Maps the names of the general coordinates to the dynamic symbols
+    :param coordinate_rhs_map: Maps the names of the general coordinates to the generalized forces Q
+    :param time: The time symbol
+    :returns: A dict which maps the names of the general coordinates to their lagrange equations
+    """
+    equation_map = {}
+    for name, variable in general_coordinates_map.items():
+        energy_derivative = sp.Derivative(energy, variable)
+        energy_dot_derivative = sp.Derivative(energy, variable.diff(time))
+
+        lagrange_term = sp.simplify(sp.Derivative(energy_dot_derivative, time) - energy_derivative)
+        equation_map[name] = sp.Eq(lagrange_term, coordinate_rhs_map[name])
+
+    return equation_map
+
+
+def substitute_derivatives(equation_map: t.Dict[str, sp.Eq],
+                           general_coordinates_map: t.Dict[str, sp.Function],
+                           coordinate_derivatives_map: t.Dict[str, sp.Function],
+                           time: sp.Symbol,
+                           ) -> t.Tuple[t.Dict[str, sp.Eq], t.List[sp.Eq]]:
+    """
+    Replaces the first time derivatives of the general coordinates in the given lagrange equations with the
+    explicit velocity variables, such that there are no derivatives of the second order anymore.
+
+    :param equation_map: The lagrange equations as returned by "derive_lagrange_equations"
+    :param general_coordinates_map: Maps the names of the general coordinates to the dynamic symbols
+    :param coordinate_derivatives_map: Maps the names of the general coordinates to the dynamic symbols of
+        their velocities
+    :param time: The time symbol
+    :returns: A tuple (substituted_equation_map, final_equations) where final_equations is the list of all
+        the first order equations, consisting of the substituted equations and the "q' = Q" definitions
+        of the velocity variables.
+    """
+    substituted_equation_map = {}
+    final_equations = []
+    for name, equation in equation_map.items():
+        substituted_equation = equation.copy()
+        for variable_name, variable in general_coordinates_map.items():
+            substitute = coordinate_derivatives_map[variable_name]
+            substituted_equation = substituted_equation.subs(variable.diff(time), substitute)
+
+        substituted_equation = sp.simplify(substituted_equation)
+        substituted_equation_map[name] = substituted_equation
+        final_equations.append(substituted_equation)
+
+        variable = general_coordinates_map[name]
+        final_equations.append(sp.Eq(variable.diff(time), coordinate_derivatives_map[name]))
+
+    return substituted_equation_map, final_equations
+
+
+def to_numeric_equations(final_equations: t.List[sp.Eq],
+                         general_coordinates_map: t.Dict[str, sp.Function],
+                         coordinate_derivatives_map: t.Dict[str, sp.Function],
+                         time: sp.Symbol,
+                         ) -> t.Tuple[t.List[sp.Eq], t.List[sp.Symbol]]:
+    """
+    Replaces all the time functions and their derivatives in the given equations with plain symbols, which
+    is necessary for the code generation. A variable such as "x(t)" is replaced by the symbol "x" and its
+    derivative by the symbol "d_x".
+
+    :returns: A tuple (numeric_equations, derivative_symbols)
+    """
+    variable_symbol_map = {}
+    derivative_symbols = []
+    for variable in [*coordinate_derivatives_map.values(), *general_coordinates_map.values()]:
+        variable_string = _plain_name(str(variable))
+
+        symbol_d = sp.Symbol(f'd_{variable_string}')
+        variable_symbol_map[variable.diff(time)] = symbol_d
+        derivative_symbols.append(symbol_d)
+
+        variable_symbol_map[variable] = sp.Symbol(variable_string)
+
+    numeric_equations = []
+    for equation in final_equations:
+        if equation != True:
+            numeric_equation = equation.copy()
+            for variable, symbol in variable_symbol_map.items():
+                numeric_equation = sp.Eq(
+                    numeric_equation.lhs.subs(variable, symbol),
+                    numeric_equation.rhs.subs(variable, symbol)
+                )
+
+            numeric_equations.append(numeric_equation)
+
+    return numeric_equations, derivative_symbols
+
+
+def solve_numeric_system(numeric_equations: t.List[sp.Eq],
+                         derivative_symbols: t.List[sp.Symbol],
+                         ) -> t.Dict[sp.Symbol, sp.Expr]:
+    """
+    Solves the given system of equations for the derivative symbols.
+
+    :returns: The solved dict whose keys are the derivative symbols (sorted by their names) and the values
+        the corresponding expressions of the state equations.
+    """
+    solved = sp.solve(numeric_equations, derivative_symbols, dict=True)
+    return {symbol: expression
+            for symbol, expression in sorted(solved[0].items(), key=lambda v: str(v[0]))}
+
+
+# == MASS MATRIX FORM ==
+# Solving the whole nonlinear system for the derivatives with "sp.solve" is by far the slowest stage of the
+# derivation and it results in huge expressions, because it essentially carries around the symbolic inverse
+# of the mass matrix. The lagrange equations are however always linear in the accelerations, which means
+# that they can be written as M(q, t) q'' = F(q, q', u, t). With the mass matrix M and the forcing vector F
+# as separate expressions, the (small) linear system can instead be solved numerically at runtime.
+
+def derive_mass_matrix_form(energy: sp.Expr,
+                            general_coordinates_map: t.Dict[str, sp.Function],
+                            coordinate_derivatives_map: t.Dict[str, sp.Function],
+                            coordinate_rhs_map: t.Dict[str, sp.Expr],
+                            time: sp.Symbol,
+                            ) -> t.Tuple[t.List[sp.Symbol], sp.Matrix, sp.Matrix, t.Dict[sp.Symbol, sp.Expr]]:
+    """
+    Derives the mass matrix form of the lagrange equations with "sympy.physics.mechanics.LagrangesMethod".
+    The energy is used as the lagrangian and the generalized forces Q of the ``coordinate_rhs_map`` are
+    added to the forcing vector. Just like for "to_numeric_equations", all the time functions are replaced
+    by plain symbols.
+
+    :param energy: The energy expression in terms of the general coordinates and their time derivatives
+    :param general_coordinates_map: Maps the names of the general coordinates to the dynamic symbols
+    :param coordinate_derivatives_map: Maps the names of the general coordinates to the dynamic symbols of
+        their velocities
+    :param coordinate_rhs_map: Maps the names of the general coordinates to the generalized forces Q
+    :param time: The time symbol
+    :returns: A tuple (acceleration_symbols, mass_matrix, forcing_vector, kinematic_dict) where the
+        acceleration symbols are the derivative symbols of the velocities such as "d_X" in the order of the
+        general coordinates, which is also the order of the rows and columns of the mass matrix and the
+        forcing vector. The kinematic dict maps the derivative symbols of the general coordinates to the
+        symbols of their velocities, such as "d_x: X".
+    """
+    names = list(general_coordinates_map.keys())
+    coordinates = [general_coordinates_map[name] for name in names]
+    method = spd.LagrangesMethod(energy, coordinates)
+    method.form_lagranges_equations()
+    forcing_vector = method.forcing + sp.Matrix([coordinate_rhs_map[name] for name in names])
+
+    # The velocities have to be replaced before the coordinates themselves, because the derivatives
+    # would not be recognized anymore afterwards
+    velocity_map = {}
+    coordinate_map = {}
+    acceleration_symbols = []
+    kinematic_dict = {}
+    for name, variable in zip(names, coordinates):
+        velocity_symbol = sp.Symbol(_plain_name(str(coordinate_derivatives_map[name])))
+        velocity_map[variable.diff(time)] = velocity_symbol
+        coordinate_map[variable] = sp.Symbol(_plain_name(str(variable)))
+        acceleration_symbols.append(sp.Symbol(f'd_{velocity_symbol}'))
+        kinematic_dict[sp.Symbol(f'd_{coordinate_map[variable]}')] = velocity_symbol
+
+    def to_numeric(expression: sp.Expr) -> sp.Expr:
+        return sp.simplify(expression.subs(velocity_map).subs(coordinate_map))
+
+    return (
+        acceleration_symbols,
+        method.mass_matrix.applyfunc(to_numeric),
+        forcing_vector.applyfunc(to_numeric),
+        kinematic_dict,
+    )
@@ -0,0 +1,243 @@
+import typing as t
+from concurrent.futures import Executor, ProcessPoolExecutor
+
+import numpy as np
+
+from labor_regelungstechnik.data import PreparedMeasurement
+from labor_regelungstechnik.simulation import InputSignal, simulate_response, simulate_hybrid
+from labor_regelungstechnik.cache import SimulationCache
+from labor_regelungstechnik.cache import hash_parts, hash_measurement, model_version
+
+# Importing the "control" package takes about a second, which is why it is only imported when a simulation
+# is actually done. The other modules, such as "sensitivity", only need the helper functions of this module.
+if t.TYPE_CHECKING:
+    import control as ct
+
+# This is the error value which is used for a measurement if the simulation fails. This is usually the
+# case for really bad parameter guesses which cause the solver to diverge.
+FAILED_ERROR = 1000
+
+# The default integration method of solve_ivp and the implicit methods, which are the only ones that
+# actually make use of the jacobian of the system.
+DEFAULT_METHOD = 'RK45'
+IMPLICIT_METHODS = ('Radau', 'BDF', 'LSODA')
+
+
+def interpolate_inputs(timestamps: np.ndarray, inputs: np.ndarray, time: float) -> np.ndarray:
+    """
+    Linearly interpolates the input signals of the shape (num_inputs, T) at the given time. This is the
+    exact same interpolation which "ct.input_output_response" uses for the system inputs.
+    """
+    index = np.clip(np.searchsorted(timestamps, time, side='left'), 1, len(timestamps) - 1)
+    ratio = (time - timestamps[index - 1]) / (timestamps[index] - timestamps[index - 1])
+    return inputs[:, index - 1] * (1. - ratio) + inputs[:, index] * ratio
+
+
+def simulate_measurement(io_system: 'ct.NonlinearIOSystem',
+                         measurement: PreparedMeasurement,
+                         params: dict,
+                         method: str = DEFAULT_METHOD,
+                         jacobian: t.Optional[t.Callable] = None,
+                         state_limit_map: t.Optional[dict] = None,
+                         ) -> dict:
+    """
+    Simulates the given system for the time frame and the inputs of a single measurement and compares
+    the simulated outputs with the measured ones. The inputs are looked up by an InputSignal, which gives
+    the same results as "ct.input_output_response" but does not need to search the interval of every time.
+
+    :param method: The integration method of solve_ivp
+    :param jacobian: Optionally the function which computes the jacobian of the system with respect to the
+        states, such as the "jacobian_states" function of the generated system modules. It has the same
+        signature as the system function itself. It is only used by the IMPLICIT_METHODS, which otherwise
+        have to approximate the jacobian with finite differences.
+    :param state_limit_map: Optionally the "state_limit_map" of the system module. If given, the rail
+        limits are handled as the events of a hybrid simulation (see "simulate_hybrid"), which is much
+        faster for the systems that were generated with the "hybrid" option of the codegen.
+    :returns: A dict with the keys "error" (the weighted mean absolute error), "timestamps", "measured"
+        and "simulated". Raises a RuntimeError if the simulation fails.
+    """
+    signal = InputSignal(measurement.timestamps, measurement.inputs)
+    if method not in IMPLICIT_METHODS:
+        jacobian = None
+
+    if state_limit_map is not None:
+        _, y = simulate_hybrid(
+            io_system,
+            measurement.timestamps,
+            signal,
+            measurement.initial_states,
+            state_limit_map,
+            params=params,
+            jacobian=jacobian,
+            solve_ivp_kwargs={'method': method},
+        )
+    else:
+        solve_ivp_kwargs = {'method': method}
+        if jacobian is not None:
+            def jac(time, states):
+                return jacobian(time, states, signal(time), params)
+
+            solve_ivp_kwargs['jac'] = jac
+
+        _, y = simulate_response(
+            io_system,
+            measurement.timestamps,
+            signal,
+            measurement.initial_states,
+            params=params,
+            solve_ivp_kwargs=solve_ivp_kwargs,
+        )
+
+    return {
+        'timestamps': measurement.timestamps,
+        'measured': list(measurement.targets),
+        'simulated': list(y),
+        'error': measurement.error(y),
+    }
+
+
+# -- PROCESS POOL --
+# Sending all the measurements to the worker processes for every single evaluation of the objective
+# function would be way too expensive. Instead, the system and the measurements are sent once when the
+# worker processes are started and are stored in this global dict of every worker process. After that
+# only the measurement index and the parameters have to be sent.
+_worker_context: t.Dict[str, t.Any] = {}
+
+
+def _init_worker(io_system: 'ct.NonlinearIOSystem', measurements: t.List[PreparedMeasurement]) -> None:
+    _worker_context['io_system'] = io_system
+    _worker_context['measurements'] = measurements
+
+
+def _simulate_safe(io_system: 'ct.NonlinearIOSystem',
+                   measurement: PreparedMeasurement,
+                   params: dict,
+                   method: str = DEFAULT_METHOD,
+                   jacobian: t.Optional[t.Callable] = None,
+                   state_limit_map: t.Optional[dict] = None,
+                   ) -> t.Optional[dict]:
+    try:
+        return simulate_measurement(io_system, measurement, params, method=method, jacobian=jacobian,
+                                    state_limit_map=state_limit_map)
+    except RuntimeError:
+        return None
+
+
+def _simulate_worker(index: int,
+                     params: dict,
+                     method: str = DEFAULT_METHOD,
+                     jacobian: t.Optional[t.Callable] = None,
+                     state_limit_map: t.Optional[dict] = None,
+                     ) -> t.Optional[dict]:
+    return _simulate_safe(
+        _worker_context['io_system'],
+        _worker_context['measurements'][index],
+        params,
+        method=method,
+        jacobian=jacobian,
+        state_limit_map=state_limit_map,
+    )
+
+
+def create_pool(io_system: 'ct.NonlinearIOSystem',
+                measurements: t.List[PreparedMeasurement],
+                num_workers: int) -> ProcessPoolExecutor:
+    """
+    Creates a process pool with ``num_workers`` worker processes which can be passed to
+    "evaluate_measurements" to simulate the different measurements concurrently.
+    """
+    return ProcessPoolExecutor(
+        max_workers=num_workers,
+        initializer=_init_worker,
+        initargs=(io_system, measurements),
+    )
+
+
+def evaluate_measurements(io_system: 'ct.NonlinearIOSystem',
+                          measurements: t.List[PreparedMeasurement],
+                          params: dict,
+                          pool: t.Optional[Executor] = None,
+                          method: str = DEFAULT_METHOD,
+                          jacobian: t.Optional[t.Callable] = None,
+                          cache: t.Optional[SimulationCache] = None,
+                          state_limit_map: t.Optional[dict] = None,
+                          ) -> t.Tuple[float, t.Dict[int, dict]]:
+    """
+    Simulates all the given measurements with the given parameters and returns the total error.
+
+    :param pool: Optionally a process pool created by "create_pool" for the same system and measurements.
+        If given, all the measurements are simulated concurrently by the worker processes. Otherwise they
+        are simulated one after another in the current process.
+    :param method: The integration method of solve_ivp
+    :param jacobian: Optionally the jacobian function of the system for the implicit integration methods.
+        When using a pool, this has to be a module level function so that it can be sent to the workers.
+    :param cache: Optionally a SimulationCache. Only the measurements whose results for the same system,
+        parameters and solver settings are not already in the cache are actually simulated.
+    :param state_limit_map: Optionally the "state_limit_map" of the system module for the hybrid
+        simulation, see "simulate_measurement"
+    :returns: A tuple (total_error, record_dict) where record_dict maps the measurement indices to the
+        records as returned by "simulate_measurement". If any of the simulations fail, the total error is
+        FAILED_ERROR and the record dict is empty.
+    """
+    indices = list(range(len(measurements)))
+    records = {}
+
+    keys = {}
+    if cache is not None:
+        version = model_version(io_system.updfcn, io_system.outfcn)
+        settings = (method, None if jacobian is None else f'{jacobian.__module__}.{jacobian.__qualname__}',
+                    state_limit_map)
+        for index, measurement in enumerate(measurements):
+            keys[index] = hash_parts(version, params, hash_measurement(measurement), settings)
+            entry = cache.get(keys[index])
+            if entry is not None:
+                records[index] = _expand_record(measurement, entry)
+
+    # A cached failure means that the total error is FAILED_ERROR anyways
+    if any(record is None for record in records.values()):
+        return FAILED_ERROR, {}
+
+    pending = [index for index in indices if index not in records]
+    if pool is None:
+        results = (_simulate_safe(io_system, measurements[index], params, method=method, jacobian=jacobian,
+                                  state_limit_map=state_limit_map)
+                   for index in pending)
+    else:
+        num = len(pending)
+        results = pool.map(_simulate_worker, pending, [params] * num, [method] * num, [jacobian] * num,
+                           [state_limit_map] * num)
+
+    for index, record in zip(pending, results):
+        # Failed simulations are cached as well, since they are just as expensive
+        if cache is not None:
+            cache.put(keys[index], _compact_record(record))
+
+        if record is None:
+            return FAILED_ERROR, {}
+
+        records[index] = record
+
+    record_dict = {index: records[index] for index in indices}
+    total_error = sum(record['error'] for record in record_dict.values())
+    return total_error, record_dict
+
+
+def _compact_record(record: t.Optional[dict]) -> dict:
+    # Only the parts of a record which are actually computed are stored in the cache, the rest is just a
+    # reference to the measurement.
+    if record is None:
+        return {'failed': True}
+
+    return {'failed': False, 'simulated': np.array(record['simulated']), 'error': record['error']}
+
+
+def _expand_record(measurement: PreparedMeasurement, entry: dict) -> t.Optional[dict]:
+    if entry['failed']:
+        return None
+
+    return {
+        'timestamps': measurement.timestamps,
+        'measured': list(measurement.targets),
+        'simulated': list(entry['simulated']),
+        'error': entry['error'],
+    }
@@ -0,0 +1,268 @@
+import typing as t
+from concurrent.futures import Future, ProcessPoolExecutor
+
+import numpy as np
+
+# matplotlib is only imported by the functions which actually render the pages. This way, the main process
+# never has to import it at all if the pages are rendered in the background or if plotting is disabled.
+if t.TYPE_CHECKING:
+    import matplotlib.pyplot as plt
+
+# The plots are not created directly but first described as plain data "pages", which can then be
+# rendered either right away or in a worker process. A page is a dict with the following structure:
+#
+# {
+#     'title': 'measurement 0',
+#     'width': 16,
+#     'row_height': 4,
+#     'rows': [
+#         {
+#             'title': 'x',
+#             'ylim': (-0.1, 3),  # optional
+#             'traces': [
+#                 {'x': np.ndarray, 'y': np.ndarray, 'color': 'gray', 'label': 'measured'},
+#                 ...
+#             ]
+#         },
+#         ...
+#     ]
+# }
+
+# The possible plotting modes: "sync" renders the pages immediately in the current process, "background"
+# renders them in worker processes while the main process continues and "disabled" skips them entirely.
+PLOT_MODES = ('sync', 'background', 'disabled')
+
+# By default every trace is reduced to at most this many points before it is plotted. A single page is
+# 16 inches wide so there is no visible difference but a lot less work for matplotlib.
+DEFAULT_MAX_POINTS = 4000
+
+
+def minmax_decimate(x: np.ndarray,
+                    y: np.ndarray,
+                    max_points: int = DEFAULT_MAX_POINTS,
+                    ) -> t.Tuple[np.ndarray, np.ndarray]:
+    """
+    Reduces the number of points of the given trace by splitting it into buckets and only keeping the
+    minimum and the maximum value of every bucket (in their original order). Unlike simple subsampling,
+    this preserves all the peaks of the signal.
+
+    :returns: A tuple (x, y) of the decimated arrays with at most max_points elements
+    """
+    x = np.asarray(x)
+    y = np.asarray(y)
+    num_buckets = max_points // 2
+    if len(y) <= max_points or num_buckets < 1:
+        return x, y
+
+    # The bucket size is rounded up, such that there are at most num_buckets buckets, the last of which
+    # may be shorter than the others.
+    bucket_size = -(-len(y) // num_buckets)
+    num_full = len(y) // bucket_size
+    length = num_full * bucket_size
+    buckets = y[:length].reshape(num_full, bucket_size)
+
+    offsets = np.arange(num_full) * bucket_size
+    index_parts = [offsets + np.argmin(buckets, axis=1), offsets + np.argmax(buckets, axis=1)]
+    if length < len(y):
+        index_parts.append([length + np.argmin(y[length:]), length + np.argmax(y[length:])])
+
+    # np.unique also sorts the indices and if the minimum and the maximum of a bucket are the same
+    # element, it is only kept once
+    indices = np.unique(np.concatenate(index_parts))
+
+    return x[indices], y[indices]
+
+
+def decimate_pages(pages: t.List[dict], max_points: int = DEFAULT_MAX_POINTS) -> t.List[dict]:
+    """
+    Returns a copy of the given pages in which every trace is reduced to at most max_points points by
+    "minmax_decimate". The original pages are not modified.
+    """
+    decimated_pages = []
+    for page in pages:
+        rows = []
+        for row in page['rows']:
+            traces = []
+            for trace in row['traces']:
+                x, y = minmax_decimate(trace['x'], trace['y'], max_points=max_points)
+                traces.append({**trace, 'x': x, 'y': y})
+
+            rows.append({**row, 'traces': traces})
+
+        decimated_pages.append({**page, 'rows': rows})
+
+    return decimated_pages
+
+
+def render_page(page: dict, max_points: int = DEFAULT_MAX_POINTS) -> 'plt.Figure':
+    import matplotlib.pyplot as plt
+
+    rows = page['rows']
+    n_rows = len(rows)
+    fig, axes = plt.subplots(ncols=1, nrows=n_rows, squeeze=False,
+                             figsize=(page.get('width', 16), page.get('row_height', 4) * n_rows))
+    if 'title' in page:
+        fig.suptitle(page['title'])
+
+    for row, (ax, ) in zip(rows, axes):
+        ax.set_title(row.get('title', ''))
+        if row.get('ylim') is not None:
+            ax.set_ylim(row['ylim'])
+
+        has_labels = False
+        for trace in row['traces']:
+            x, y = minmax_decimate(trace['x'], trace['y'], max_points=max_points)
+            ax.plot(x, y, color=trace.get('color'), label=trace.get('label'))
+            has_labels = has_labels or trace.get('label') is not None
+
+        if has_labels:
+            ax.legend()
+
+    return fig
+
+
+def render_pdf(path: str, pages: t.List[dict], max_points: int = DEFAULT_MAX_POINTS) -> str:
+    """
+    Renders all the given pages into a single PDF file at the given path.
+
+    :returns: The path of the PDF file
+    """
+    import matplotlib.pyplot as plt
+    from matplotlib.backends.backend_pdf import PdfPages
+
+    with PdfPages(path) as pdf:
+        for page in pages:
+            fig = render_page(page, max_points=max_points)
+            pdf.savefig(fig)
+            plt.close(fig)
+
+    return path
+
+
+def _init_worker() -> None:
+    # The worker processes never show any figures so they can use the cheapest non-interactive backend
+    import matplotlib
+
+    matplotlib.use('Agg')
+
+
+class PlotQueue:
+    """
+    Collects PDF rendering jobs and renders them according to the given mode. In the "background" mode
+    the jobs are rendered by a pool of worker processes such that the main process can continue with the
+    actual computations in the meantime. All the pending jobs are awaited when the queue is closed.
+
+    .. code-block:: python
+
+        with PlotQueue(mode='background') as queue:
+            queue.submit('measurements.pdf', pages)
+            # ... do something else
+
+    :param mode: One of the PLOT_MODES
+    :param num_workers: The number of worker processes for the "background" mode
+    :param max_points: The maximum number of points for every individual trace
+    """
+    def __init__(self,
+                 mode: str = 'background',
+                 num_workers: int = 2,
+                 max_points: int = DEFAULT_MAX_POINTS):
+        if mode not in PLOT_MODES:
+            raise ValueError(f'The plotting mode "{mode}" is not supported! Please use one of the '
+                             f'following modes: {", ".join(PLOT_MODES)}')
+
+        self.mode = mode
+        self.num_workers = num_workers
+        self.max_points = max_points
+
+        self.pool: t.Optional[ProcessPoolExecutor] = None
+        self.futures: t.List[Future] = []
+
+    def submit(self, path: str, pages: t.List[dict]) -> None:
+        if self.mode == 'sync':
+            render_pdf(path, pages, self.max_points)
+
+        elif self.mode == 'background':
+            # The pool is only started once it is actually needed
+            if self.pool is None:
+                self.pool = ProcessPoolExecutor(max_workers=self.num_workers, initializer=_init_worker)
+
+            # The traces are decimated before they are submitted, because all the arguments have to be
+            # pickled to be sent to the worker process, which would otherwise be the full resolution arrays.
+            pages = decimate_pages(pages, self.max_points)
+            self.futures.append(self.pool.submit(render_pdf, path, pages, self.max_points))
+
+    def wait(self) -> t.List[str]:
+        """
+        Blocks until all the pending jobs are rendered and returns the paths of the rendered files.
+        Exceptions which occurred during the rendering are raised here.
+        """
+        paths = [future.result() for future in self.futures]
+        self.futures = []
+        return paths
+
+    def close(self) -> None:
+        try:
+            self.wait()
+        finally:
+            if self.pool is not None:
+                self.pool.shutdown()
+                self.pool = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+# == PAGE FACTORIES ==
+
+def make_signal_pages(measurements: t.List[t.Dict[str, np.ndarray]],
+                      time_key: str = 'timestamps',
+                      ) -> t.List[dict]:
+    """
+    Creates one page for every measurement, which contains one row for every signal of the measurement.
+    """
+    pages = []
+    for index, measurement in enumerate(measurements):
+        pages.append({
+            'title': f'measurement {index}',
+            'rows': [{'title': key, 'traces': [{'x': measurement[time_key], 'y': values}]}
+                     for key, values in measurement.items()],
+        })
+
+    return pages
+
+
+def make_comparison_pages(records_map: t.Dict[int, dict],
+                          error: float,
+                          names: t.Sequence[str] = ('x', 'l', 'phi'),
+                          limits: t.Optional[t.Sequence[t.Tuple[float, float]]] = None,
+                          ) -> t.List[dict]:
+    """
+    Creates one page for every simulation record (as returned by "optimization.evaluate_measurements"),
+    which compares the measured and the simulated outputs.
+    """
+    limits = limits or [None] * len(names)
+    pages = []
+    for index, records in records_map.items():
+        rows = []
+        for row_index, (name, ylim) in enumerate(zip(names, limits)):
+            rows.append({
+                'title': name,
+                'ylim': ylim,
+                'traces': [
+                    {'x': records['timestamps'], 'y': records['measured'][row_index],
+                     'color': 'gray', 'label': 'measured'},
+                    {'x': records['timestamps'], 'y': records['simulated'][row_index],
+                     'color': 'blue', 'label': 'simulated'},
+                ]
+            })
+
+        pages.append({
+            'title': f'measurement {index}\nerror: {error:.2f}',
+            'row_height': 6,
+            'rows': rows,
+        })
+
+    return pages
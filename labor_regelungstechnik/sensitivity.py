@@ -0,0 +1,634 @@
+import types
+import importlib
+import typing as t
+from concurrent.futures import Executor, ProcessPoolExecutor
+
+import numpy as np
+from scipy.integrate import solve_ivp
+
+from labor_regelungstechnik.data import PreparedMeasurement
+from labor_regelungstechnik.optimization import FAILED_ERROR, IMPLICIT_METHODS, interpolate_inputs
+from labor_regelungstechnik.simulation import InputSignal
+
+# The forward sensitivities S = dx/dp of the states with respect to the parameters are the solution of
+#
+#     dS/dt = df/dx @ S + df/dp        with S(0) = 0
+#
+# which is integrated together with the state equations themselves. With the sensitivities of the states,
+# the sensitivities of the outputs are dy/dp = dh/dx @ S + dh/dp and from those the exact gradient of the
+# error with respect to the parameters follows with a single forward simulation per measurement.
+#
+# All the required jacobians are generated symbolically by the codegen (render_system_code with
+# jacobian=True), which is why the functions in this module work with the generated system *modules*
+# instead of the io_system objects.
+
+# The number of states of the augmented system grows with the number of identified parameters, which
+# makes the finite difference jacobians of the implicit methods really expensive. Because of that, these
+# methods are given the block diagonal approximation of the jacobian (the same one which is used by
+# CVODES for the simultaneous corrector).
+DEFAULT_SENSITIVITY_METHOD = 'LSODA'
+DEFAULT_RTOL = 1e-4
+DEFAULT_ATOL = 1e-7
+
+# The gradient of the error can either be computed with the forward sensitivities ("forward") or with the
+# adjoint method ("adjoint"). The cost of the forward sensitivities grows with the number of identified
+# parameters, whereas the adjoint method always needs one forward and one backward pass per measurement.
+GRADIENT_MODES = ('forward', 'adjoint')
+
+# The adjoint method needs the forward trajectory during the backward pass. Instead of keeping the whole
+# trajectory in memory, only the states at every DEFAULT_CHECKPOINT_INTERVAL'th sample are stored during
+# the forward pass and the trajectory between two checkpoints is recomputed when it is needed.
+DEFAULT_CHECKPOINT_INTERVAL = 500
+
+# The distance by which a state is moved past its rail limit after a limit event, such that the restarted
+# integration does not detect the same event again
+LIMIT_EPSILON = 1e-9
+
+
+def simulate_sensitivities(system_module: types.ModuleType,
+                           measurement: PreparedMeasurement,
+                           params: dict,
+                           param_names: t.Sequence[str],
+                           method: str = DEFAULT_SENSITIVITY_METHOD,
+                           rtol: float = DEFAULT_RTOL,
+                           atol: float = DEFAULT_ATOL,
+                           ) -> dict:
+    """
+    Simulates the given system for a single measurement together with the forward sensitivities of the
+    states and the outputs with respect to the given parameters.
+
+    :param system_module: A generated system module which contains the jacobian functions
+    :param measurement: The measurement which defines the time frame, the inputs and the initial states
+    :param params: The dict of system parameters
+    :param param_names: The names of the parameters for which the sensitivities are computed
+    :param method: The integration method of solve_ivp
+    :returns: A dict with the keys "timestamps", "states" (num_states, T), "simulated" (num_outputs, T)
+        and "sensitivities" (num_outputs, num_params, T). Raises a RuntimeError if the simulation fails.
+    """
+    param_indices = [system_module.param_names.index(name) for name in param_names]
+    num_states = len(measurement.initial_states)
+    num_params = len(param_indices)
+    timestamps = measurement.timestamps
+
+    rhs, jac = _sensitivity_system(system_module, measurement, params, param_indices)
+
+    values = np.concatenate([measurement.initial_states, np.zeros(num_states * num_params)])
+    solution_values, _ = _solve_with_limits(system_module, measurement, params, rhs, jac, values,
+                                            0, len(timestamps) - 1, method, rtol, atol)
+
+    states = solution_values[:num_states]
+    state_sensitivities = solution_values[num_states:].reshape(num_states, num_params, len(timestamps))
+
+    outputs = []
+    output_sensitivities = []
+    for k, time in enumerate(timestamps):
+        inputs = measurement.inputs[:, k]
+        outputs.append(system_module.output(time, states[:, k], inputs, params))
+        output_jacobian_states = system_module.output_jacobian_states(time, states[:, k], inputs, params)
+        output_jacobian_params = system_module.output_jacobian_params(time, states[:, k], inputs, params)
+        output_sensitivities.append(output_jacobian_states @ state_sensitivities[:, :, k] +
+                                    output_jacobian_params[:, param_indices])
+
+    return {
+        'timestamps': timestamps,
+        'states': states,
+        'simulated': np.array(outputs).T,
+        'sensitivities': np.transpose(np.array(output_sensitivities), (1, 2, 0)),
+    }
+
+
+def simulate_window(system_module: types.ModuleType,
+                    measurement: PreparedMeasurement,
+                    params: dict,
+                    param_names: t.Sequence[str],
+                    start_index: int,
+                    end_index: int,
+                    initial_states: np.ndarray,
+                    method: str = DEFAULT_SENSITIVITY_METHOD,
+                    rtol: float = DEFAULT_RTOL,
+                    atol: float = DEFAULT_ATOL,
+                    ) -> dict:
+    """
+    Simulates the given system only for the window of the measurement from the sample start_index to the
+    sample end_index (inclusive), starting from the given initial states. Besides the sensitivities with
+    respect to the parameters, this also computes the sensitivities with respect to the initial states,
+    which is what the multiple shooting needs (see "shooting.MultipleShooting").
+
+    :returns: A dict with the keys "simulated" (num_outputs, N), "sensitivities" (num_outputs,
+        num_states + num_params, N), "final_states" (num_states, ) and "final_sensitivities" (num_states,
+        num_states + num_params), where the first num_states columns of the sensitivities are always the
+        derivatives with respect to the initial states. Raises a RuntimeError if the simulation fails.
+    """
+    param_indices = [system_module.param_names.index(name) for name in param_names]
+    num_states = len(measurement.initial_states)
+    timestamps = measurement.timestamps
+
+    rhs, jac = _sensitivity_system(system_module, measurement, params, param_indices, num_extra=num_states)
+    initial_sensitivities = np.eye(num_states, num_states + len(param_indices))
+    values = np.concatenate([initial_states, initial_sensitivities.ravel()])
+    solution_values, _ = _solve_with_limits(system_module, measurement, params, rhs, jac, values,
+                                            start_index, end_index, method, rtol, atol)
+
+    states = solution_values[:num_states]
+    state_sensitivities = solution_values[num_states:].reshape(num_states, -1, solution_values.shape[1])
+
+    outputs = []
+    output_sensitivities = []
+    for n, k in enumerate(range(start_index, end_index + 1)):
+        time, inputs = timestamps[k], measurement.inputs[:, k]
+        outputs.append(system_module.output(time, states[:, n], inputs, params))
+        output_jacobian_states = system_module.output_jacobian_states(time, states[:, n], inputs, params)
+        output_jacobian_params = system_module.output_jacobian_params(time, states[:, n], inputs, params)
+        sensitivities = output_jacobian_states @ state_sensitivities[:, :, n]
+        sensitivities[:, num_states:] += output_jacobian_params[:, param_indices]
+        output_sensitivities.append(sensitivities)
+
+    return {
+        'simulated': np.array(outputs).T,
+        'sensitivities': np.transpose(np.array(output_sensitivities), (1, 2, 0)),
+        'final_states': states[:, -1],
+        'final_sensitivities': state_sensitivities[:, :, -1],
+    }
+
+
+def _sensitivity_system(system_module: types.ModuleType,
+                        measurement: PreparedMeasurement,
+                        params: dict,
+                        param_indices: t.List[int],
+                        num_extra: int = 0,
+                        ) -> t.Tuple[t.Callable, t.Callable]:
+    # Returns the right hand side and its jacobian of the state equations augmented with the sensitivity
+    # matrix S of the shape (num_states, num_extra + num_params). The first num_extra columns do not have
+    # any forcing term, which means that with the initial value S = [I, 0] they are the state transition
+    # matrix.
+    num_states = len(measurement.initial_states)
+    num_columns = num_extra + len(param_indices)
+    signal = InputSignal(measurement.timestamps, measurement.inputs)
+
+    def rhs(time, values):
+        states = values[:num_states]
+        sensitivities = values[num_states:].reshape(num_states, num_columns)
+        inputs = signal(time)
+
+        derivatives = np.empty_like(values)
+        derivatives[:num_states] = system_module.system(time, states, inputs, params)
+        jacobian_states = system_module.jacobian_states(time, states, inputs, params)
+        jacobian_params = system_module.jacobian_params(time, states, inputs, params)[:, param_indices]
+        sensitivity_derivatives = jacobian_states @ sensitivities
+        sensitivity_derivatives[:, num_extra:] += jacobian_params
+        derivatives[num_states:] = sensitivity_derivatives.ravel()
+        return derivatives
+
+    def jac(time, values):
+        inputs = signal(time)
+        jacobian_states = system_module.jacobian_states(time, values[:num_states], inputs, params)
+        # The state block is exact, but the derivatives of "df/dx @ S" with respect to the states are
+        # neglected. The blocks of the sensitivities are ordered by the state index, which is why the
+        # jacobian of the flattened sensitivity matrix is kron(df/dx, I).
+        return np.block([
+            [jacobian_states, np.zeros((num_states, num_states * num_columns))],
+            [np.zeros((num_states * num_columns, num_states)), np.kron(jacobian_states, np.eye(num_columns))],
+        ])
+
+    return rhs, jac
+
+
+def _solve_with_limits(system_module: types.ModuleType,
+                       measurement: PreparedMeasurement,
+                       params: dict,
+                       rhs: t.Callable,
+                       jac: t.Callable,
+                       values: np.ndarray,
+                       start_index: int,
+                       end_index: int,
+                       method: str,
+                       rtol: float,
+                       atol: float,
+                       ) -> t.Tuple[np.ndarray, t.List[tuple]]:
+    # Integrates the given right hand side from the sample start_index to the sample end_index (inclusive).
+    # The first num_states entries of the values are the states of the system, all the remaining ones are
+    # interpreted as the sensitivity matrix of the shape (num_states, -1).
+    #
+    # The rail limits switch the inputs off, which makes the state equations discontinuous. The
+    # sensitivities are only correct if the integration is stopped at every crossing of a limit, where the
+    # sensitivities then jump (see "_limit_jump").
+    #
+    # Returns the values at all the samples as an array of the shape (num_values, N) and the list of the
+    # events as tuples (time, states_before, states_after, jump_matrix).
+    timestamps = measurement.timestamps
+    num_states = len(measurement.initial_states)
+
+    events = []
+    for name, (_, lower, upper) in getattr(system_module, 'state_limit_map', {}).items():
+        index = system_module.state_names.index(name)
+        for limit in (lower, upper):
+            event = (lambda time, values, index=index, limit=limit: values[index] - limit)
+            event.terminal = True
+            # The direction which points from the limit back into the allowed interval
+            inward = 1 if limit == lower else -1
+            events.append((event, index, limit, inward))
+
+    time = timestamps[start_index]
+    values = np.array(values, dtype=float)
+    num_samples = end_index - start_index + 1
+    solution_values = []
+    limit_events = []
+    while len(solution_values) < num_samples:
+        num_done = len(solution_values)
+        solution = solve_ivp(
+            rhs,
+            (time, timestamps[end_index]),
+            values,
+            t_eval=timestamps[start_index + num_done:end_index + 1],
+            method=method,
+            rtol=rtol,
+            atol=atol,
+            events=[event for event, *_ in events] or None,
+            **({'jac': jac} if method in IMPLICIT_METHODS else {}),
+        )
+        if not solution.success:
+            raise RuntimeError(f'solve_ivp failed: {solution.message}')
+
+        # If the integration is stopped by an event before the next sample, the solution does not contain
+        # any values at all (and "y" is an empty list)
+        if len(solution.t) != 0:
+            solution_values += list(solution.y.T)
+        if solution.status != 1:
+            break
+
+        # An event occurred and the integration is restarted from the event with the updated sensitivities
+        for (_, index, limit, inward), event_times, event_values in zip(events, solution.t_events,
+                                                                        solution.y_events):
+            if len(event_times) != 0:
+                time, values = event_times[0], event_values[0].copy()
+                inputs = interpolate_inputs(timestamps, measurement.inputs, time)
+                states_before = values[:num_states].copy()
+                jump = _limit_jump(system_module, time, states_before, inputs, params, index)
+                if jump is not None:
+                    states_after, jump_matrix = jump
+                    values[:num_states] = states_after
+                    if len(values) > num_states:
+                        sensitivities = values[num_states:].reshape(num_states, -1)
+                        values[num_states:] = (jump_matrix @ sensitivities).ravel()
+                    limit_events.append((time, states_before, states_after, jump_matrix))
+                else:
+                    # The state does not move at all at the limit, so there is no jump. It still has to be
+                    # moved off the limit, since otherwise the restarted integration would detect the very
+                    # same event over and over again.
+                    values[index] = limit + inward * LIMIT_EPSILON
+                break
+
+    if len(solution_values) != num_samples:
+        raise RuntimeError('solve_ivp did not reach the end of the measurement')
+    if not np.all(np.isfinite(solution_values)):
+        raise RuntimeError('the simulation diverged')
+
+    return np.array(solution_values).T, limit_events
+
+
+def _limit_jump(system_module: types.ModuleType,
+                time: float,
+                states: np.ndarray,
+                inputs: np.ndarray,
+                params: dict,
+                index: int,
+                epsilon: float = LIMIT_EPSILON,
+                ) -> t.Optional[t.Tuple[np.ndarray, np.ndarray]]:
+    # When the state with the given index crosses one of its limits at the time tau, the right hand side
+    # jumps from f- to f+. Since tau itself depends on the parameters, the sensitivities jump as well:
+    #
+    #     S+ = S- + (f- - f+) dtau/dp      with      dtau/dp = - S-[index] / f-[index]
+    #
+    # which is the linear map S+ = A @ S- with the jump matrix A = I - (f- - f+) e_index^T / f-[index].
+    # Returns the states after the event, which are moved past the limit by epsilon such that the event
+    # does not immediately trigger again after the restart, and the jump matrix.
+    velocity = system_module.system(time, states, inputs, params)[index]
+    direction = np.sign(velocity)
+    if direction == 0:
+        return None
+
+    states_before = states.copy()
+    states_before[index] -= direction * epsilon
+    states_after = states.copy()
+    states_after[index] += direction * epsilon
+    derivatives_before = np.array(system_module.system(time, states_before, inputs, params))
+    derivatives_after = np.array(system_module.system(time, states_after, inputs, params))
+
+    jump_matrix = np.eye(len(states))
+    jump_matrix[:, index] -= (derivatives_before - derivatives_after) / derivatives_before[index]
+    return states_after, jump_matrix
+
+
+def adjoint_gradient(system_module: types.ModuleType,
+                     measurement: PreparedMeasurement,
+                     params: dict,
+                     param_names: t.Sequence[str],
+                     method: str = DEFAULT_SENSITIVITY_METHOD,
+                     rtol: float = DEFAULT_RTOL,
+                     atol: float = DEFAULT_ATOL,
+                     checkpoint_interval: int = DEFAULT_CHECKPOINT_INTERVAL,
+                     ) -> t.Tuple[float, np.ndarray]:
+    """
+    Computes the weighted mean absolute error of the given system for a single measurement together with
+    its gradient with respect to the given parameters using the adjoint method. The costates lambda are
+    integrated backwards in time
+
+        dlambda/dt = - df/dx^T @ lambda        with the jumps lambda -= dE_k/dx at every sample k
+
+    and the gradient is then the integral of df/dp^T @ lambda plus the direct terms dE_k/dp. Unlike the
+    forward sensitivities, the cost of this is independent of the number of parameters.
+
+    Between two samples, the backward pass uses a single step of the trapezoidal rule (which is A-stable
+    and thus also works for the stiff parts of the system). The resulting gradient therefore agrees with
+    the one of the forward sensitivities up to the discretization error of the sample grid. At the rail
+    limit events the costates jump with the transposed jump matrix of the sensitivities. Since these jumps
+    can be huge, the transition matrix of the sample intervals with events is instead computed with the
+    forward sensitivities of just that interval. Note that if the rope is driven into one of its limits,
+    it chatters around that limit with hundreds of events, for which the gradient is not reliable.
+
+    :param system_module: A generated system module which contains the jacobian functions
+    :param measurement: The measurement which defines the time frame, the inputs and the initial states
+    :param params: The dict of system parameters
+    :param param_names: The names of the parameters for which the gradient is computed
+    :param method: The integration method of solve_ivp for the forward pass
+    :param checkpoint_interval: The number of samples between two checkpoints of the forward trajectory
+    :returns: A tuple (error, gradient) where the gradient is an array of the shape (num_params, ). Raises
+        a RuntimeError if the simulation fails.
+    """
+    param_indices = [system_module.param_names.index(name) for name in param_names]
+    num_states = len(measurement.initial_states)
+    timestamps = measurement.timestamps
+    num_samples = len(timestamps)
+    # The error is sum_o w_o * mean_t |y_o - target_o| and thus every sample enters with the weights / T
+    scale = measurement.weights / num_samples
+
+    signal = InputSignal(timestamps, measurement.inputs)
+
+    def rhs(time, states):
+        return system_module.system(time, states, signal(time), params)
+
+    def jac(time, states):
+        return system_module.jacobian_states(time, states, signal(time), params)
+
+    def sample_terms(k: int, states: np.ndarray) -> t.Tuple[float, np.ndarray, np.ndarray]:
+        # The error of the sample k and its partial derivatives with respect to the states and the params
+        time, inputs = timestamps[k], measurement.inputs[:, k]
+        differences = np.array(system_module.output(time, states, inputs, params)) - measurement.targets[:, k]
+        signs = scale * np.sign(differences)
+        output_jacobian_states = system_module.output_jacobian_states(time, states, inputs, params)
+        output_jacobian_params = system_module.output_jacobian_params(time, states, inputs, params)
+        return (float(np.dot(scale, np.abs(differences))),
+                signs @ output_jacobian_states,
+                signs @ output_jacobian_params[:, param_indices])
+
+    def jacobians(time: float, states: np.ndarray, inputs: np.ndarray) -> t.Tuple[np.ndarray, np.ndarray]:
+        return (system_module.jacobian_states(time, states, inputs, params),
+                system_module.jacobian_params(time, states, inputs, params)[:, param_indices])
+
+    sensitivity_system = _sensitivity_system(system_module, measurement, params, param_indices,
+                                             num_extra=num_states)
+
+    # ~ forward pass
+    # Every chunk goes from one checkpoint to the next one, where the last sample of a chunk is the first
+    # sample of the next chunk.
+    boundaries = list(range(0, num_samples - 1, checkpoint_interval)) + [num_samples - 1]
+    chunks = list(zip(boundaries[:-1], boundaries[1:]))
+    checkpoints = []
+    states = measurement.initial_states
+    for start, end in chunks:
+        checkpoints.append(states)
+        chunk = _solve_with_limits(system_module, measurement, params, rhs, jac, states,
+                                   start, end, method, rtol, atol)
+        states = chunk[0][:, -1]
+
+    # ~ backward pass
+    error = 0.0
+    gradient = np.zeros(len(param_indices))
+    costates = np.zeros(num_states)
+    identity = np.eye(num_states)
+    for (start, end), states in zip(reversed(chunks), reversed(checkpoints)):
+        # The forward trajectory of the chunk is recomputed from its checkpoint. Since the integration is
+        # deterministic, this is exactly the same trajectory as in the forward pass. Only the last chunk is
+        # still available from the forward pass.
+        if end != boundaries[-1]:
+            chunk = _solve_with_limits(system_module, measurement, params, rhs, jac, states,
+                                       start, end, method, rtol, atol)
+        chunk_states, limit_events = chunk
+
+        # Every chunk is responsible for the samples (start, end], only the very first sample belongs to
+        # the first chunk as well.
+        jacobians_b = None
+        for k in range(end, start, -1):
+            states_k = chunk_states[:, k - start]
+            sample_error, error_states, error_params = sample_terms(k, states_k)
+            error += sample_error
+            gradient += error_params
+            costates += error_states
+
+            time_b, time_a = timestamps[k], timestamps[k - 1]
+            interval_events = [event for event in limit_events if time_a < event[0] <= time_b]
+            states_a = chunk_states[:, k - 1 - start]
+            jacobians_a = jacobians(time_a, states_a, measurement.inputs[:, k - 1])
+
+            if len(interval_events) == 0:
+                # The jacobians at time_b are usually still known from the previous interval
+                jacobian_states_b, jacobian_params_b = jacobians_b or jacobians(time_b, states_k,
+                                                                               measurement.inputs[:, k])
+                jacobian_states_a, jacobian_params_a = jacobians_a
+                h = time_b - time_a
+                costates_a = np.linalg.solve(identity - 0.5 * h * jacobian_states_a.T,
+                                             costates + 0.5 * h * jacobian_states_b.T @ costates)
+                gradient += 0.5 * h * (jacobian_params_a.T @ costates_a + jacobian_params_b.T @ costates)
+                costates = costates_a
+
+            else:
+                # The jumps of the costates at the events can be huge, which is why the trapezoidal rule is
+                # not accurate enough for these intervals. Instead, the state transition matrix Phi and the
+                # parameter sensitivities Psi of just this interval are integrated forwards (including
+                # the jumps at the events), such that lambda_k-1 = Phi^T @ lambda_k.
+                initial_transition = np.eye(num_states, num_states + len(param_indices))
+                values = np.concatenate([states_a, initial_transition.ravel()])
+                interval_values, _ = _solve_with_limits(system_module, measurement, params,
+                                                        *sensitivity_system, values, k - 1, k,
+                                                        method, rtol, atol)
+                transition = interval_values[num_states:, -1].reshape(num_states, -1)
+                gradient += transition[:, num_states:].T @ costates
+                costates = transition[:, :num_states].T @ costates
+
+            jacobians_b = jacobians_a
+
+        if start == 0:
+            # The initial states do not depend on the parameters, so only the direct term is needed here
+            sample_error, _, error_params = sample_terms(0, chunk_states[:, 0])
+            error += sample_error
+            gradient += error_params
+
+    return error, gradient
+
+
+# -- PROCESS POOL --
+# Just like in "optimization", the measurements are sent to the worker processes only once. The system
+# module itself cannot be pickled, which is why only its name is sent and the module is imported again
+# within the worker processes.
+_worker_context: t.Dict[str, t.Any] = {}
+
+
+def _init_worker(module_name: str, measurements: t.List[PreparedMeasurement]) -> None:
+    _worker_context['system_module'] = importlib.import_module(module_name)
+    _worker_context['measurements'] = measurements
+
+
+def _call_safe(function: t.Callable,
+               system_module: types.ModuleType,
+               measurement: PreparedMeasurement,
+               args: tuple,
+               kwargs: dict,
+               ) -> t.Any:
+    try:
+        return function(system_module, measurement, *args, **kwargs)
+    except RuntimeError:
+        return None
+
+
+def _call_worker(function: t.Callable, index: int, args: tuple, kwargs: dict) -> t.Any:
+    return _call_safe(
+        function,
+        _worker_context['system_module'],
+        _worker_context['measurements'][index],
+        args,
+        kwargs,
+    )
+
+
+def create_pool(system_module: types.ModuleType,
+                measurements: t.List[PreparedMeasurement],
+                num_workers: int) -> ProcessPoolExecutor:
+    """
+    Creates a process pool with ``num_workers`` worker processes which can be passed to
+    "evaluate_gradient" and "evaluate_residuals" to simulate the different measurements concurrently.
+    """
+    return ProcessPoolExecutor(
+        max_workers=num_workers,
+        initializer=_init_worker,
+        initargs=(system_module.__name__, measurements),
+    )
+
+
+def map_measurements(function: t.Callable,
+                     system_module: types.ModuleType,
+                     measurements: t.List[PreparedMeasurement],
+                     tasks: t.List[t.Tuple[int, tuple]],
+                     pool: t.Optional[Executor] = None,
+                     **kwargs,
+                     ) -> t.List[t.Any]:
+    """
+    Calls ``function(system_module, measurements[index], *args, **kwargs)`` for all the given tasks
+    (index, args), either directly or in the worker processes of the given pool. The function has to be a
+    module level function such that it can be sent to the worker processes.
+
+    :param pool: Optionally a process pool created by "create_pool" for the same system and measurements
+    :returns: The list of the results in the order of the tasks, where the result of every call which
+        raised a RuntimeError (i.e. a failed simulation) is None.
+    """
+    if pool is None:
+        return [_call_safe(function, system_module, measurements[index], args, kwargs)
+                for index, args in tasks]
+
+    num = len(tasks)
+    return list(pool.map(_call_worker,
+                         [function] * num,
+                         [index for index, _ in tasks],
+                         [args for _, args in tasks],
+                         [kwargs] * num))
+
+
+def _forward_gradient(system_module: types.ModuleType,
+                      measurement: PreparedMeasurement,
+                      params: dict,
+                      param_names: t.Sequence[str],
+                      **kwargs,
+                      ) -> t.Tuple[float, np.ndarray]:
+    result = simulate_sensitivities(system_module, measurement, params, param_names, **kwargs)
+    differences = result['simulated'] - measurement.targets
+    # d/dp mean(|y - target|) = mean(sign(y - target) * dy/dp)
+    gradient = np.einsum('o,ot,opt->p',
+                         measurement.weights,
+                         np.sign(differences),
+                         result['sensitivities']) / len(measurement)
+
+    return measurement.error(result['simulated']), gradient
+
+
+def evaluate_gradient(system_module: types.ModuleType,
+                      measurements: t.List[PreparedMeasurement],
+                      params: dict,
+                      param_names: t.Sequence[str],
+                      pool: t.Optional[Executor] = None,
+                      mode: str = 'forward',
+                      **kwargs,
+                      ) -> t.Tuple[float, np.ndarray]:
+    """
+    Computes the total error (the sum of the weighted mean absolute errors, just like
+    "optimization.evaluate_measurements") over all the given measurements together with its exact gradient
+    with respect to the given parameters. The result can directly be used as the objective of
+    ``scipy.optimize.minimize(..., jac=True)``.
+
+    :param pool: Optionally a process pool created by "create_pool" for the same system and measurements
+    :param mode: One of the GRADIENT_MODES. "forward" uses the forward sensitivities, "adjoint" uses the
+        adjoint method, which is cheaper for many parameters and long measurements.
+    :param kwargs: Any additional arguments are passed to "simulate_sensitivities" or "adjoint_gradient"
+    :returns: A tuple (total_error, gradient) where the gradient is an array of the shape (num_params, ).
+        If any of the simulations fail, the total error is FAILED_ERROR and the gradient is zero.
+    """
+    if mode not in GRADIENT_MODES:
+        raise ValueError(f'The gradient mode "{mode}" is not supported! Please use one of the following '
+                         f'modes: {", ".join(GRADIENT_MODES)}')
+
+    function = _forward_gradient if mode == 'forward' else adjoint_gradient
+    tasks = [(index, (params, param_names)) for index in range(len(measurements))]
+    results = map_measurements(function, system_module, measurements, tasks, pool=pool, **kwargs)
+    if any(result is None for result in results):
+        return FAILED_ERROR, np.zeros(len(param_names))
+
+    total_error = sum(error for error, _ in results)
+    gradient = np.sum([gradient for _, gradient in results], axis=0)
+    return total_error, gradient
+
+
+def evaluate_residuals(system_module: types.ModuleType,
+                       measurements: t.List[PreparedMeasurement],
+                       params: dict,
+                       param_names: t.Sequence[str],
+                       pool: t.Optional[Executor] = None,
+                       **kwargs,
+                       ) -> t.Tuple[np.ndarray, np.ndarray]:
+    """
+    Computes the weighted residuals of all the given measurements together with their exact jacobian with
+    respect to the given parameters. The residuals are scaled such that their sum of squares is the sum of
+    the weighted mean *squared* errors of the measurements. This is the least squares formulation of the
+    identification, which can be solved with Gauss-Newton / Levenberg-Marquardt methods such as
+    ``scipy.optimize.least_squares``.
+
+    :param pool: Optionally a process pool created by "create_pool" for the same system and measurements
+    :param kwargs: Any additional arguments are passed to "simulate_sensitivities"
+    :returns: A tuple (residuals, jacobian) of the arrays with the shapes (R, ) and (R, num_params). If
+        any of the simulations fail, all the residuals are set to a value such that their sum of squares
+        is FAILED_ERROR and the jacobian is zero.
+    """
+    tasks = [(index, (params, param_names)) for index in range(len(measurements))]
+    results = map_measurements(simulate_sensitivities, system_module, measurements, tasks, pool=pool,
+                               **kwargs)
+    num_residuals = sum(len(measurement) * len(measurement.weights) for measurement in measurements)
+    if any(result is None for result in results):
+        return (np.full(num_residuals, np.sqrt(FAILED_ERROR / num_residuals)),
+                np.zeros((num_residuals, len(param_names))))
+
+    residuals = []
+    jacobians = []
+    for measurement, result in zip(measurements, results):
+        scale = np.sqrt(measurement.weights / len(measurement))
+        residuals.append((scale[:, None] * (result['simulated'] - measurement.targets)).ravel())
+        jacobians.append(np.transpose(scale[:, None, None] * result['sensitivities'], (0, 2, 1))
+                         .reshape(-1, len(param_names)))
+
+    return np.concatenate(residuals), np.concatenate(jacobians)
@@ -0,0 +1,235 @@
+import types
+import typing as t
+from concurrent.futures import Executor
+
+import numpy as np
+import scipy.sparse as sparse
+
+from labor_regelungstechnik.data import PreparedMeasurement, measured_states
+from labor_regelungstechnik.optimization import FAILED_ERROR
+from labor_regelungstechnik.sensitivity import simulate_window, map_measurements
+
+# With the single shooting of "optimization" and "sensitivity", every measurement is simulated in one
+# piece from its initial states. For a bad guess of the parameters, the simulation then drifts away from
+# the measurement over the whole horizon (or diverges entirely), which makes the error a very nonlinear
+# function of the parameters.
+#
+# The multiple shooting instead splits every measurement into windows, each of which is simulated from
+# its own initial states. These initial states become additional variables of the optimization and the
+# windows are coupled by the continuity defects (the difference between the final states of a window and
+# the initial states of the next one), which have to vanish at the solution. Since the windows are short,
+# the simulations stay close to the measurement even for bad parameters and all the windows of all the
+# measurements can be simulated independently of each other.
+#
+# The problem is formulated as a (sparse) nonlinear least squares problem for "scipy.optimize.least_squares"
+# where the continuity defects are weighted residuals, i.e. the continuity is only enforced as a penalty.
+
+DEFAULT_NUM_WINDOWS = 8
+# The weight of the squared continuity defects relative to the weighted mean squared error of the outputs
+DEFAULT_CONTINUITY_WEIGHT = 10.0
+
+
+def split_windows(num_samples: int, num_windows: int) -> t.List[t.Tuple[int, int]]:
+    """
+    Splits the samples of a measurement into (at most) num_windows windows of roughly the same length.
+
+    :returns: A list of tuples (start, end) with the index of the first and the last sample of every
+        window, where the last sample of a window is the first sample of the next one.
+    """
+    boundaries = np.unique(np.linspace(0, num_samples - 1, num_windows + 1).astype(int))
+    return [(int(start), int(end)) for start, end in zip(boundaries[:-1], boundaries[1:])]
+
+
+class MultipleShooting:
+    """
+    The multiple shooting formulation of the parameter identification for the given measurements.
+
+    The variables of the problem are a single vector, which starts with the parameters relative to their
+    initial values (just like for the other gradient based methods), followed by the initial states of all
+    the windows of all the measurements, except for the first window of every measurement, which always
+    starts from the measured initial states.
+
+    .. code-block:: python
+
+        shooting = MultipleShooting(system_module, measurements, {'k_x': 250, 'k_l': 500})
+        result = least_squares(
+            lambda vector: shooting.residuals(vector)[0],
+            shooting.initial_vector(),
+            jac=lambda vector: shooting.residuals(vector)[1],
+            bounds=shooting.bounds((0.1, 10)),
+            x_scale='jac',
+        )
+        params, window_states = shooting.unpack(result.x)
+
+    :param system_module: A generated system module which contains the jacobian functions
+    :param measurements: The prepared measurements
+    :param initial_params: The dict of the identified parameters and their initial values
+    :param num_windows: The number of windows into which every measurement is split
+    :param continuity_weight: The weight of the continuity defects
+    """
+    def __init__(self,
+                 system_module: types.ModuleType,
+                 measurements: t.List[PreparedMeasurement],
+                 initial_params: t.Dict[str, float],
+                 num_windows: int = DEFAULT_NUM_WINDOWS,
+                 continuity_weight: float = DEFAULT_CONTINUITY_WEIGHT):
+        self.system_module = system_module
+        self.measurements = measurements
+        self.param_names = list(initial_params.keys())
+        self.initial_parameters = np.array(list(initial_params.values()), dtype=float)
+        self.continuity_weight = continuity_weight
+
+        self.num_params = len(self.param_names)
+        self.num_states = len(measurements[0].initial_states)
+        self.windows = [split_windows(len(measurement), num_windows) for measurement in measurements]
+
+        # The offset of the initial states of the second window of every measurement within the vector
+        self.offsets = []
+        offset = self.num_params
+        for windows in self.windows:
+            self.offsets.append(offset)
+            offset += (len(windows) - 1) * self.num_states
+
+        self.num_variables = offset
+        self.num_residuals = sum(len(measurement) * len(measurement.weights) +
+                                 (len(windows) - 1) * self.num_states
+                                 for measurement, windows in zip(measurements, self.windows))
+
+    def unpack(self, vector: np.ndarray) -> t.Tuple[dict, t.List[np.ndarray]]:
+        """
+        :returns: A tuple (params, window_states) of the absolute parameters dict and for every measurement
+            the initial states of all its windows as an array of the shape (num_windows, num_states).
+        """
+        params = dict(zip(self.param_names, vector[:self.num_params] * self.initial_parameters))
+        window_states = []
+        for measurement, windows, offset in zip(self.measurements, self.windows, self.offsets):
+            free_states = vector[offset:offset + (len(windows) - 1) * self.num_states]
+            window_states.append(np.concatenate([
+                measurement.initial_states[None, :],
+                free_states.reshape(-1, self.num_states),
+            ]))
+
+        return params, window_states
+
+    def bounds(self, relative_bounds: t.Tuple[float, float]) -> t.Tuple[np.ndarray, np.ndarray]:
+        """
+        :returns: The tuple (lower, upper) of the bounds of the vector for least_squares, where only the
+            parameters are bounded by the given relative bounds.
+        """
+        lower = np.full(self.num_variables, -np.inf)
+        upper = np.full(self.num_variables, np.inf)
+        lower[:self.num_params], upper[:self.num_params] = relative_bounds
+        return lower, upper
+
+    def initial_vector(self, pool: t.Optional[Executor] = None, **kwargs) -> np.ndarray:
+        """
+        Creates the initial guess of the vector. The initial states of the windows are taken from the
+        measured outputs where possible. All the remaining states (the velocities) are taken from the end
+        of the simulation of the previous window with the initial parameters.
+
+        :param pool: Optionally a process pool created by "sensitivity.create_pool"
+        :param kwargs: Any additional arguments are passed to "sensitivity.simulate_window"
+        """
+        vector = np.zeros(self.num_variables)
+        vector[:self.num_params] = 1.0
+        params = dict(zip(self.param_names, self.initial_parameters))
+
+        # The windows are simulated one after another, but for all the measurements at the same time
+        states_map = {index: measurement.initial_states
+                      for index, measurement in enumerate(self.measurements)}
+        for j in range(max(len(windows) for windows in self.windows) - 1):
+            indices = [index for index, windows in enumerate(self.windows) if j < len(windows) - 1]
+            tasks = [(index, (params, [], *self.windows[index][j], states_map[index])) for index in indices]
+            results = map_measurements(simulate_window, self.system_module, self.measurements, tasks,
+                                       pool=pool, **kwargs)
+
+            for index, result in zip(indices, results):
+                start, _ = self.windows[index][j + 1]
+                states = measured_states(self.measurements[index], start)
+                simulated_states = np.zeros(self.num_states) if result is None else result['final_states']
+                states = np.where(np.isnan(states), simulated_states, states)
+
+                offset = self.offsets[index] + j * self.num_states
+                vector[offset:offset + self.num_states] = states
+                states_map[index] = states
+
+        return vector
+
+    def residuals(self,
+                  vector: np.ndarray,
+                  pool: t.Optional[Executor] = None,
+                  **kwargs,
+                  ) -> t.Tuple[np.ndarray, sparse.csr_matrix]:
+        """
+        Simulates all the windows of all the measurements and computes the residuals together with their
+        sparse jacobian with respect to the vector. The output residuals are scaled just like in
+        "sensitivity.evaluate_residuals", such that their sum of squares is the sum of the weighted mean
+        squared errors, followed by the weighted continuity defects of every measurement.
+
+        :param pool: Optionally a process pool created by "sensitivity.create_pool". All the windows are
+            distributed over the worker processes individually.
+        :param kwargs: Any additional arguments are passed to "sensitivity.simulate_window"
+        :returns: A tuple (residuals, jacobian) with the shapes (num_residuals, ) and (num_residuals,
+            num_variables). If any of the simulations fail, all the residuals are set to a value such that
+            their sum of squares is FAILED_ERROR and the jacobian is zero.
+        """
+        params, window_states = self.unpack(vector)
+        tasks = [(index, (params, self.param_names, start, end, window_states[index][j]))
+                 for index, windows in enumerate(self.windows)
+                 for j, (start, end) in enumerate(windows)]
+        results = map_measurements(simulate_window, self.system_module, self.measurements, tasks,
+                                   pool=pool, **kwargs)
+        if any(result is None for result in results):
+            return (np.full(self.num_residuals, np.sqrt(FAILED_ERROR / self.num_residuals)),
+                    sparse.csr_matrix((self.num_residuals, self.num_variables)))
+
+        num_states = self.num_states
+        param_columns = np.arange(self.num_params)
+        continuity_scale = np.sqrt(self.continuity_weight)
+
+        residuals = []
+        rows, columns, values = [], [], []
+        row = 0
+
+        def add_block(block: np.ndarray, block_columns: np.ndarray) -> None:
+            # Adds the dense block of the jacobian for the residual rows which have been added last
+            block_rows = np.arange(row - block.shape[0], row)
+            rows.append(np.repeat(block_rows, len(block_columns)))
+            columns.append(np.tile(block_columns, len(block_rows)))
+            values.append(block.ravel())
+
+        results_iter = iter(results)
+        for index, (measurement, windows) in enumerate(zip(self.measurements, self.windows)):
+            scale = np.sqrt(measurement.weights / len(measurement))
+            for j, (start, end) in enumerate(windows):
+                result = next(results_iter)
+                is_last = (j == len(windows) - 1)
+                # The last sample of a window is the first sample of the next window and thus only the last
+                # window includes its last sample.
+                num = end - start + int(is_last)
+                state_columns = self.offsets[index] + (j - 1) * num_states + np.arange(num_states)
+
+                differences = result['simulated'][:, :num] - measurement.targets[:, start:start + num]
+                residuals.append((scale[:, None] * differences).ravel())
+                row += differences.size
+                sensitivities = np.transpose(scale[:, None, None] * result['sensitivities'][:, :, :num],
+                                             (0, 2, 1)).reshape(differences.size, -1)
+                add_block(sensitivities[:, num_states:] * self.initial_parameters, param_columns)
+                if j > 0:
+                    add_block(sensitivities[:, :num_states], state_columns)
+
+                if not is_last:
+                    defects = result['final_states'] - window_states[index][j + 1]
+                    residuals.append(continuity_scale * defects)
+                    row += num_states
+                    final_sensitivities = continuity_scale * result['final_sensitivities']
+                    add_block(final_sensitivities[:, num_states:] * self.initial_parameters, param_columns)
+                    if j > 0:
+                        add_block(final_sensitivities[:, :num_states], state_columns)
+                    add_block(-continuity_scale * np.eye(num_states), state_columns + num_states)
+
+        jacobian = sparse.coo_matrix(
+            (np.concatenate(values), (np.concatenate(rows), np.concatenate(columns))),
+            shape=(self.num_residuals, self.num_variables),
+        )
+        return np.concatenate(residuals), jacobian.tocsr()
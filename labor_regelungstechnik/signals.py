@@ -0,0 +1,337 @@
+import math
+import bisect
+import operator
+import typing as t
+
+import numpy as np
+
+from labor_regelungstechnik.simulation import SIGNAL_MODES, InputSignal
+
+# This module contains a small library of input signals for the simulations. Every signal can be evaluated
+# in two ways: For a whole array of time points at once, where all the work is done by numpy, and for a
+# single scalar point in time, which is what the solvers need for every RHS evaluation and which is why the
+# scalar path does not touch numpy at all.
+#
+# The signals can be combined into new signals with the usual arithmetic operators and the "delayed" and
+# "saturated" methods:
+#
+# .. code-block:: python
+#
+#     signal = (Step(1, final_value=0.1) + Ramp(2, 4, final_value=0.05)).delayed(0.3).saturated(-0.1, 0.1)
+#     signal(1.5)                      # float
+#     signal(np.linspace(0, 10, 1000))  # array of the shape (1000, )
+#
+# The parameters of the primitive signals may also be arrays. In that case the signals are "batched" and
+# the parameters are broadcast against the time points. For example, the parameter ``time`` of a Step with
+# the shape (N, 1) creates N different steps, which evaluate to an array of the shape (N, T) for T time
+# points. With "stack", multiple signals are combined into the inputs of a system, which results in the
+# shape (N, num_inputs, T) that "simulate_batch" expects for N trajectories.
+
+Number = t.Union[float, np.ndarray]
+
+
+def _is_batched(*values: t.Any) -> bool:
+    return any(np.ndim(value) > 0 for value in values)
+
+
+class Signal:
+    """
+    Base class of all the signals. Subclasses implement "value" for a single float time and "evaluate" for
+    an array of time points.
+    """
+    batched: bool = False
+
+    def value(self, time: float) -> float:
+        raise NotImplementedError()
+
+    def evaluate(self, times: np.ndarray) -> np.ndarray:
+        raise NotImplementedError()
+
+    def __call__(self, time: Number) -> Number:
+        # Batched signals have array parameters, which is why they can only be evaluated by numpy even for
+        # a scalar time.
+        if np.ndim(time) == 0 and not self.batched:
+            return self.value(float(time))
+
+        return self.evaluate(np.asarray(time, dtype=np.float64))
+
+    # ~ composition
+
+    def __add__(self, other: t.Union['Signal', float]) -> 'Signal':
+        return Combination(operator.add, self, other)
+
+    def __radd__(self, other: t.Union['Signal', float]) -> 'Signal':
+        return Combination(operator.add, other, self)
+
+    def __sub__(self, other: t.Union['Signal', float]) -> 'Signal':
+        return Combination(operator.sub, self, other)
+
+    def __rsub__(self, other: t.Union['Signal', float]) -> 'Signal':
+        return Combination(operator.sub, other, self)
+
+    def __mul__(self, other: t.Union['Signal', float]) -> 'Signal':
+        return Combination(operator.mul, self, other)
+
+    def __rmul__(self, other: t.Union['Signal', float]) -> 'Signal':
+        return Combination(operator.mul, other, self)
+
+    def __neg__(self) -> 'Signal':
+        return Combination(operator.mul, -1.0, self)
+
+    def delayed(self, delay: Number, initial_value: Number = 0) -> 'Signal':
+        return Delay(self, delay, initial_value=initial_value)
+
+    def saturated(self, lower: Number = -math.inf, upper: Number = math.inf) -> 'Signal':
+        return Saturation(self, lower=lower, upper=upper)
+
+
+def as_signal(value: t.Union[Signal, Number]) -> Signal:
+    return value if isinstance(value, Signal) else Constant(value)
+
+
+# == PRIMITIVE SIGNALS ==
+
+class Constant(Signal):
+
+    def __init__(self, value: Number):
+        self.constant = value
+        self.batched = _is_batched(value)
+
+    def value(self, time: float) -> float:
+        return self.constant
+
+    def evaluate(self, times: np.ndarray) -> np.ndarray:
+        return self.constant + np.zeros_like(times)
+
+
+class Step(Signal):
+    """
+    Jumps from the initial value to the final value at the given time. At the time of the step itself the
+    signal already has the final value.
+    """
+    def __init__(self,
+                 time: Number,
+                 initial_value: Number = 0,
+                 final_value: Number = 1):
+        self.time = time
+        self.initial_value = initial_value
+        self.final_value = final_value
+        self.batched = _is_batched(time, initial_value, final_value)
+
+    def value(self, time: float) -> float:
+        return self.final_value if time >= self.time else self.initial_value
+
+    def evaluate(self, times: np.ndarray) -> np.ndarray:
+        return np.where(times >= self.time, self.final_value, self.initial_value)
+
+
+class Ramp(Signal):
+    """
+    Changes linearly from the initial value at ``t_start`` to the final value at ``t_stop`` and holds the
+    respective value before and after that.
+    """
+    def __init__(self,
+                 t_start: Number,
+                 t_stop: Number,
+                 initial_value: Number = 0,
+                 final_value: Number = 1):
+        self.t_start = t_start
+        self.t_stop = t_stop
+        self.initial_value = initial_value
+        self.final_value = final_value
+        self.batched = _is_batched(t_start, t_stop, initial_value, final_value)
+
+    def shape(self, ratio: Number) -> Number:
+        # Maps the progress of the transition from [0, 1] to [0, 1]
+        return ratio
+
+    def value(self, time: float) -> float:
+        # A ramp without any duration is a step at t_stop, where (just like for the Step) the final value
+        # already applies at the time of the step itself
+        if time >= self.t_stop:
+            ratio = 1.0
+        elif time <= self.t_start:
+            ratio = 0.0
+        else:
+            ratio = (time - self.t_start) / (self.t_stop - self.t_start)
+        return self.initial_value + (self.final_value - self.initial_value) * self.shape(ratio)
+
+    def evaluate(self, times: np.ndarray) -> np.ndarray:
+        # The duration of zero is replaced by one for the division, in which case the ratio is only 0 or 1
+        duration = self.t_stop - self.t_start
+        ratio = np.clip((times - self.t_start) / np.where(duration > 0, duration, 1.0), 0.0, 1.0)
+        ratio = np.where(times >= self.t_stop, 1.0, ratio)
+        return self.initial_value + (self.final_value - self.initial_value) * self.shape(ratio)
+
+
+class SmoothStep(Ramp):
+    """
+    Like the Ramp, but with the smooth transition 3r^2 - 2r^3, whose derivative is zero at both ends. This
+    avoids the kinks of the ramp, at which the adaptive solvers have to reduce their step size.
+    """
+    def shape(self, ratio: Number) -> Number:
+        return ratio * ratio * (3 - 2 * ratio)
+
+
+class Piecewise(Signal):
+    """
+    A schedule of values which are reached at the given times. In the "zoh" mode, every value is held from
+    its time until the next time and in the "linear" mode, the values are interpolated. Before the first
+    and after the last time, the first and the last value are held.
+
+    :param times: The sorted times of the schedule
+    :param values: The values of the schedule at those times
+    :param mode: One of the SIGNAL_MODES
+    """
+    def __init__(self,
+                 times: t.Sequence[float],
+                 values: t.Sequence[float],
+                 mode: str = 'zoh'):
+        if mode not in SIGNAL_MODES:
+            raise ValueError(f'The signal mode "{mode}" is not supported! Please use one of the '
+                             f'following modes: {", ".join(SIGNAL_MODES)}')
+        if len(times) != len(values) or len(times) == 0:
+            raise ValueError('A piecewise signal needs the same non-zero number of times and values!')
+
+        self.times = [float(time) for time in times]
+        self.values = [float(value) for value in values]
+        self.mode = mode
+        self.times_array = np.array(self.times)
+        self.values_array = np.array(self.values)
+
+    def value(self, time: float) -> float:
+        index = bisect.bisect_right(self.times, time) - 1
+        if index < 0:
+            return self.values[0]
+        if self.mode == 'zoh' or index == len(self.times) - 1:
+            return self.values[index]
+
+        ratio = (time - self.times[index]) / (self.times[index + 1] - self.times[index])
+        return self.values[index] + (self.values[index + 1] - self.values[index]) * ratio
+
+    def evaluate(self, times: np.ndarray) -> np.ndarray:
+        if self.mode == 'linear':
+            return np.interp(times, self.times_array, self.values_array)
+
+        indices = np.searchsorted(self.times_array, times, side='right') - 1
+        return self.values_array[np.maximum(indices, 0)]
+
+
+class Replay(Signal):
+    """
+    Replays a single measured signal. This is a thin wrapper around the InputSignal, such that the
+    measurements can be combined with the other signals.
+
+    :param timestamps: The array of the T sample times
+    :param values: The samples of the shape (T, )
+    :param mode: One of the SIGNAL_MODES
+    :param delay: Optionally the delay in seconds before which the samples count as zero, just like the
+        ``input_delays`` of "prepare_measurement"
+    """
+    def __init__(self,
+                 timestamps: np.ndarray,
+                 values: np.ndarray,
+                 mode: str = 'linear',
+                 delay: t.Optional[float] = None):
+        self.signal = InputSignal(timestamps, np.asarray(values, dtype=np.float64)[None, :], mode=mode,
+                                  delays=None if delay is None else (delay, ))
+
+    def value(self, time: float) -> float:
+        return float(self.signal(time)[0])
+
+    def evaluate(self, times: np.ndarray) -> np.ndarray:
+        return self.signal.evaluate(times)[0]
+
+
+# == COMPOSED SIGNALS ==
+
+class Combination(Signal):
+    """
+    Combines two signals (or a signal and a number) with the given binary operator.
+    """
+    def __init__(self,
+                 function: t.Callable[[t.Any, t.Any], t.Any],
+                 first: t.Union[Signal, Number],
+                 second: t.Union[Signal, Number]):
+        self.function = function
+        self.first = as_signal(first)
+        self.second = as_signal(second)
+        self.batched = self.first.batched or self.second.batched
+
+    def value(self, time: float) -> float:
+        return self.function(self.first.value(time), self.second.value(time))
+
+    def evaluate(self, times: np.ndarray) -> np.ndarray:
+        return self.function(self.first.evaluate(times), self.second.evaluate(times))
+
+
+class Delay(Signal):
+    """
+    Shifts the given signal by the delay, such that it has the value x(t - delay). Before the delay, the
+    signal has the initial value.
+    """
+    def __init__(self,
+                 signal: Signal,
+                 delay: Number,
+                 initial_value: Number = 0):
+        self.signal = signal
+        self.delay = delay
+        self.initial_value = initial_value
+        self.batched = signal.batched or _is_batched(delay, initial_value)
+
+    def value(self, time: float) -> float:
+        return self.initial_value if time < self.delay else self.signal.value(time - self.delay)
+
+    def evaluate(self, times: np.ndarray) -> np.ndarray:
+        return np.where(times < self.delay, self.initial_value, self.signal.evaluate(times - self.delay))
+
+
+class Saturation(Signal):
+    """
+    Clips the given signal to the interval [lower, upper].
+    """
+    def __init__(self,
+                 signal: Signal,
+                 lower: Number = -math.inf,
+                 upper: Number = math.inf):
+        self.signal = signal
+        self.lower = lower
+        self.upper = upper
+        self.batched = signal.batched or _is_batched(lower, upper)
+
+    def value(self, time: float) -> float:
+        return min(max(self.signal.value(time), self.lower), self.upper)
+
+    def evaluate(self, times: np.ndarray) -> np.ndarray:
+        return np.clip(self.signal.evaluate(times), self.lower, self.upper)
+
+
+class StackedSignal:
+    """
+    The inputs of a system as a stack of one signal per input. For a scalar time it returns the array of
+    the shape (num_inputs, ), such that it can be used directly as the input function of
+    "simulate_response". For an array of T time points it returns the shape (num_inputs, T) or, if any of
+    the signals is batched, (N, num_inputs, T).
+    """
+    def __init__(self, signals: t.Sequence[t.Union[Signal, Number]]):
+        self.signals = [as_signal(signal) for signal in signals]
+        self.batched = any(signal.batched for signal in self.signals)
+
+    def __len__(self) -> int:
+        return len(self.signals)
+
+    def value(self, time: float) -> np.ndarray:
+        return np.array([signal.value(time) for signal in self.signals])
+
+    def evaluate(self, times: np.ndarray) -> np.ndarray:
+        return np.stack(np.broadcast_arrays(*[signal.evaluate(times) for signal in self.signals]), axis=-2)
+
+    def __call__(self, time: Number) -> np.ndarray:
+        if np.ndim(time) == 0 and not self.batched:
+            return self.value(float(time))
+
+        return self.evaluate(np.asarray(time, dtype=np.float64))
+
+
+def stack(*signals: t.Union[Signal, Number]) -> StackedSignal:
+    return StackedSignal(signals)
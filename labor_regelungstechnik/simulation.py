@@ -0,0 +1,440 @@
+import math
+import typing as t
+
+import numpy as np
+from scipy.integrate import solve_ivp
+
+import labor_regelungstechnik.systems.single_pendulum_nonlinear_batch as single_pendulum_nonlinear_batch
+
+# Importing the "control" package takes about a second and the response below only needs the functions of
+# the system, which is why it is not imported here.
+if t.TYPE_CHECKING:
+    import control as ct
+
+# This is the sample rate of the measurements which were recorded at the test bench (measurements_001.json)
+# and thus also the default time step of the simulation grid.
+DEFAULT_DT = 0.01
+
+
+def make_time_grid(duration: float, dt: float = DEFAULT_DT) -> np.ndarray:
+    """
+    Creates a uniform time grid which starts at zero and covers the given duration with steps of ``dt``.
+    """
+    num_steps = int(round(duration / dt))
+    return np.arange(num_steps + 1) * dt
+
+
+# -- INPUT SIGNALS --
+# During the integration, the solver evaluates the inputs at each of its own internal time points, which
+# means that the input signal has to be interpolated for every single RHS evaluation. Since the measurements
+# are sampled on an (almost) uniform grid, the interval of a time point can be computed directly from
+# "floor((t - t_0) / dt)" instead of searching for it.
+
+# The interpolation modes of the InputSignal: "linear" is the same interpolation that
+# "ct.input_output_response" uses and "zoh" (zero order hold) keeps the value of the last sample.
+SIGNAL_MODES = ('linear', 'zoh')
+
+
+class InputSignal:
+    """
+    Callable which returns the values of sampled input signals at an arbitrary point in time in constant
+    time. Outside of the sampled time frame, the signals are extrapolated with the first and the last
+    interval, just like "ct.input_output_response" does.
+
+    The arrays of the timestamps and the values are not copied. The delays are applied at lookup time:
+    The samples before the delay of an input count as zero, which is exactly what "prepare_measurement" does
+    with the ``input_delays``.
+
+    .. code-block:: python
+
+        signal = InputSignal(timestamps, inputs, delays=(0.3, 0.1))
+        signal(1.234)  # array of the shape (num_inputs, )
+
+    :param timestamps: The array of the T sample times
+    :param values: The sampled signals as an array of the shape (num_inputs, T)
+    :param mode: One of the SIGNAL_MODES
+    :param delays: Optionally for each input the delay in seconds before which it is zero
+    """
+    def __init__(self,
+                 timestamps: np.ndarray,
+                 values: np.ndarray,
+                 mode: str = 'linear',
+                 delays: t.Optional[t.Sequence[float]] = None):
+        if mode not in SIGNAL_MODES:
+            raise ValueError(f'The signal mode "{mode}" is not supported! Please use one of the '
+                             f'following modes: {", ".join(SIGNAL_MODES)}')
+
+        self.timestamps = np.asarray(timestamps, dtype=np.float64)
+        self.values = np.asarray(values, dtype=np.float64)
+        self.mode = mode
+        self.num_samples = len(self.timestamps)
+        if self.num_samples < 2:
+            raise ValueError('An input signal needs at least two samples!')
+
+        # For every input the index of the first sample which is not zeroed by the delay
+        self.start_indices = np.zeros(len(self.values), dtype=np.int64)
+        if delays is not None:
+            self.start_indices = np.searchsorted(self.timestamps, delays, side='left').astype(np.int64)
+        self.delayed = bool(self.start_indices.any())
+
+        self.t_start = float(self.timestamps[0])
+        self.dt = (float(self.timestamps[-1]) - self.t_start) / (self.num_samples - 1)
+
+        # The slopes of all the intervals are computed only once. Around the delays, the slopes have to
+        # be the ones of the zeroed samples.
+        self.slopes = np.diff(self.values, axis=-1) / np.diff(self.timestamps)
+        for row, start in enumerate(self.start_indices):
+            if start > 0:
+                interval = self.timestamps[start] - self.timestamps[start - 1]
+                self.slopes[row, :start - 1] = 0
+                self.slopes[row, start - 1] = self.values[row, start] / interval
+
+    def index(self, time: float) -> int:
+        """
+        Returns the index i of the interval [t_i, t_i+1) which contains the given time, clipped to the
+        intervals of the signal.
+        """
+        index = min(max(math.floor((time - self.t_start) / self.dt), 0), self.num_samples - 2)
+        # On a grid which is not perfectly uniform, the estimate may be off by a sample
+        timestamps = self.timestamps
+        while index > 0 and timestamps[index] > time:
+            index -= 1
+        while index < self.num_samples - 2 and timestamps[index + 1] <= time:
+            index += 1
+
+        return index
+
+    def __call__(self, time: float) -> np.ndarray:
+        index = self.index(time)
+        if self.mode == 'zoh' and time >= self.timestamps[index + 1]:
+            # This only happens beyond the last sample, whose value is then held
+            index += 1
+
+        values = self.values[:, index]
+        if self.delayed:
+            values = np.where(index >= self.start_indices, values, 0.0)
+
+        if self.mode == 'zoh':
+            return values
+
+        return values + self.slopes[:, min(index, self.num_samples - 2)] * (time - self.timestamps[index])
+
+    def indices(self, times: np.ndarray) -> np.ndarray:
+        """
+        The vectorized version of "index" for an array of times of any shape.
+        """
+        last = self.num_samples - 2
+        indices = np.clip(np.floor((times - self.t_start) / self.dt), 0, last).astype(np.int64)
+        while True:
+            lower = (indices > 0) & (self.timestamps[indices] > times)
+            upper = (indices < last) & (self.timestamps[np.minimum(indices + 1, last + 1)] <= times)
+            if not (lower.any() or upper.any()):
+                return indices
+
+            indices = indices - lower + upper
+
+    def evaluate(self, times: np.ndarray) -> np.ndarray:
+        """
+        Evaluates the signals for a whole array of times at once.
+
+        :param times: An array of any shape S
+        :returns: An array of the shape (num_inputs, *S)
+        """
+        times = np.asarray(times, dtype=np.float64)
+        indices = self.indices(times)
+        if self.mode == 'zoh':
+            indices = np.where(times >= self.timestamps[indices + 1], indices + 1, indices)
+
+        values = self.values[:, indices]
+        if self.delayed:
+            start_indices = self.start_indices.reshape(-1, *([1] * times.ndim))
+            values = np.where(indices >= start_indices, values, 0.0)
+
+        if self.mode == 'zoh':
+            return values
+
+        slopes = self.slopes[:, np.minimum(indices, self.num_samples - 2)]
+        return values + slopes * (times - self.timestamps[indices])
+
+
+def simulate_response(io_system: 'ct.NonlinearIOSystem',
+                      timestamps: np.ndarray,
+                      signal: t.Callable[[float], np.ndarray],
+                      initial_states: np.ndarray,
+                      params: t.Optional[dict] = None,
+                      solve_ivp_kwargs: t.Optional[dict] = None,
+                      ) -> t.Tuple[np.ndarray, np.ndarray]:
+    """
+    Simulates the given continuous time system just like "ct.input_output_response", except that the
+    inputs are given as a function of the time, such as an InputSignal, instead of an array which has to be
+    interpolated.
+
+    :param io_system: The system whose "updfcn" and "outfcn" are used
+    :param timestamps: The array of the time points at which the outputs are evaluated
+    :param signal: The function which returns the inputs for a given time
+    :param initial_states: The initial conditions of the shape (num_states, )
+    :param params: The parameters of the system
+    :param solve_ivp_kwargs: Additional arguments for solve_ivp such as the "method"
+    :returns: A tuple (timestamps, outputs) with the outputs of the shape (num_outputs, T). Raises a
+        RuntimeError if the integration fails.
+    """
+    params = {**(getattr(io_system, 'params', None) or {}), **(params or {})}
+    system, output = io_system.updfcn, io_system.outfcn
+
+    def rhs(time, states):
+        return np.asarray(system(time, states, signal(time), params), dtype=np.float64).reshape(-1)
+
+    solution = solve_ivp(rhs, (timestamps[0], timestamps[-1]), np.asarray(initial_states, dtype=np.float64),
+                         t_eval=timestamps, **(solve_ivp_kwargs or {}))
+    if not solution.success:
+        raise RuntimeError(f'solve_ivp failed: {solution.message}')
+
+    outputs = np.empty(shape=(io_system.noutputs, len(solution.t)), dtype=np.float64)
+    for index, time in enumerate(solution.t):
+        outputs[:, index] = np.asarray(output(time, solution.y[:, index], signal(time), params)).reshape(-1)
+
+    return solution.t, outputs
+
+
+# -- HYBRID SIMULATION --
+# The generated system functions switch off an input as soon as the corresponding state leaves its rail
+# limit (see the "state_limit_map" of the system modules). This makes the right hand side discontinuous and
+# every step of an adaptive solver which contains such a switch is rejected over and over again with an
+# ever smaller step size, until the step is small enough to jump over the discontinuity.
+#
+# The hybrid simulation instead treats every limit as a discrete mode: Within a mode, the inputs are
+# switched off by the mode and not by the states, which makes the right hand side smooth. The limits are
+# the events of solve_ivp at which the integration stops, the mode is switched and the integration is
+# restarted. For this to have any effect, the system functions must not check the limits themselves,
+# which is what the "hybrid" option of the codegen is for. The inputs are switched off by setting the raw
+# inputs to zero, which assumes that the "input_expression_map" of the system is zero for zero inputs.
+
+# The distance by which the limited state is moved past its limit after an event, such that the very same
+# event is not detected again right at the start of the restarted integration.
+HYBRID_EPSILON = 1e-9
+
+
+def simulate_hybrid(io_system: 'ct.NonlinearIOSystem',
+                    timestamps: np.ndarray,
+                    signal: t.Callable[[float], np.ndarray],
+                    initial_states: np.ndarray,
+                    state_limit_map: t.Dict[str, t.Tuple[str, float, float]],
+                    params: t.Optional[dict] = None,
+                    jacobian: t.Optional[t.Callable] = None,
+                    solve_ivp_kwargs: t.Optional[dict] = None,
+                    ) -> t.Tuple[np.ndarray, np.ndarray]:
+    """
+    Simulates the given system just like "simulate_response", except that the rail limits of the
+    ``state_limit_map`` are handled as events which switch the mode of the system. This is only faster
+    than "simulate_response" if the system functions do not check the limits themselves, i.e. if the
+    system module has been generated with the "hybrid" option. Otherwise the results are the same.
+
+    :param state_limit_map: Maps the names of the limited states to tuples (input_name, lower, upper) of
+        the name of the input which is switched off outside of the limits and the limits themselves. This
+        is the "state_limit_map" of the generated system modules.
+    :param jacobian: Optionally the jacobian function of the system with respect to the states, which is
+        used by the implicit methods of solve_ivp
+    :returns: A tuple (timestamps, outputs) with the outputs of the shape (num_outputs, T). Raises a
+        RuntimeError if the integration fails.
+    """
+    params = {**(getattr(io_system, 'params', None) or {}), **(params or {})}
+    system, output = io_system.updfcn, io_system.outfcn
+    solve_ivp_kwargs = dict(solve_ivp_kwargs or {})
+    timestamps = np.asarray(timestamps, dtype=np.float64)
+    states = np.array(initial_states, dtype=np.float64)
+
+    state_labels = list(io_system.state_labels)
+    input_labels = list(io_system.input_labels)
+    limits = [(state_labels.index(name), input_labels.index(input_name), lower, upper)
+              for name, (input_name, lower, upper) in state_limit_map.items()]
+
+    # The mode is whether each of the limited states is within its limits. The gates are the factors of
+    # the inputs, which are zero for the inputs that are switched off in the current mode. As long as all
+    # the gates are open, the inputs are not touched at all.
+    inside = [lower <= states[index] <= upper for index, _, lower, upper in limits]
+    gates = np.ones(len(input_labels))
+    inputs = signal
+
+    def update_gates():
+        nonlocal inputs
+        gates[:] = 1
+        for (_, input_index, _, _), is_inside in zip(limits, inside):
+            if not is_inside:
+                gates[input_index] = 0
+
+        inputs = signal if gates.all() else (lambda time: signal(time) * gates)
+
+    def rhs(time, states):
+        return np.asarray(system(time, states, inputs(time), params), dtype=np.float64).reshape(-1)
+
+    if jacobian is not None:
+        solve_ivp_kwargs['jac'] = lambda time, states: jacobian(time, states, inputs(time), params)
+
+    # solve_ivp evaluates every event function after every single step, which is why all the limits are
+    # combined into a single event: For every limit the distance of the state to the boundary of its
+    # current region, which is positive within the region, and then the minimum of those distances.
+    def distances(states):
+        return [min(states[index] - lower, upper - states[index]) * (1 if is_inside else -1)
+                for (index, _, lower, upper), is_inside in zip(limits, inside)]
+
+    def event(time, states):
+        return min(distances(states))
+
+    event.terminal = True
+
+    update_gates()
+    time = timestamps[0]
+    outputs = np.empty(shape=(io_system.noutputs, len(timestamps)), dtype=np.float64)
+    num_done = 0
+    while num_done < len(timestamps):
+        solution = solve_ivp(rhs, (time, timestamps[-1]), states, t_eval=timestamps[num_done:],
+                             events=event if limits else None, **solve_ivp_kwargs)
+        if not solution.success:
+            raise RuntimeError(f'solve_ivp failed: {solution.message}')
+
+        # The outputs have to be computed right away, since they may depend on the inputs of the mode. If
+        # the integration is stopped by an event before the next sample, "y" is just an empty list.
+        for sample_time, values in zip(solution.t, np.reshape(solution.y, (len(states), -1)).T):
+            sample_outputs = output(sample_time, values, inputs(sample_time), params)
+            outputs[:, num_done] = np.asarray(sample_outputs).reshape(-1)
+            num_done += 1
+        if solution.status != 1:
+            break
+
+        # An event occurred at the limit with the smallest distance: The state is moved past the nearer
+        # bound into the direction in which it is moving and the mode of that limit is switched accordingly.
+        # If the state does not move at all, it is moved back into the limits.
+        time, states = solution.t_events[0][0], solution.y_events[0][0].copy()
+        event_distances = distances(states)
+        limit_index = event_distances.index(min(event_distances))
+        index, _, lower, upper = limits[limit_index]
+        bound = lower if abs(states[index] - lower) <= abs(states[index] - upper) else upper
+        direction = np.sign(rhs(time, states)[index])
+        if direction == 0:
+            direction = 1 if bound == lower else -1
+
+        states[index] = bound + direction * HYBRID_EPSILON
+        inside[limit_index] = lower <= states[index] <= upper
+        update_gates()
+
+    if num_done != len(timestamps):
+        raise RuntimeError('solve_ivp did not reach the end of the simulation')
+    if not np.all(np.isfinite(outputs)):
+        raise RuntimeError('the simulation diverged')
+
+    return timestamps, outputs
+
+
+def euler_step(system: t.Callable,
+               time: float,
+               dt: float,
+               states: np.ndarray,
+               inputs_start: np.ndarray,
+               inputs_end: np.ndarray,
+               params: dict) -> np.ndarray:
+    return states + dt * system(time, states, inputs_start, params)
+
+
+def rk4_step(system: t.Callable,
+             time: float,
+             dt: float,
+             states: np.ndarray,
+             inputs_start: np.ndarray,
+             inputs_end: np.ndarray,
+             params: dict) -> np.ndarray:
+    # Within one step, the inputs are linearly interpolated between the two grid points. This is the same
+    # thing that "ct.input_output_response" does and thus the results are comparable.
+    inputs_mid = 0.5 * (inputs_start + inputs_end)
+
+    k1 = system(time, states, inputs_start, params)
+    k2 = system(time + 0.5 * dt, states + 0.5 * dt * k1, inputs_mid, params)
+    k3 = system(time + 0.5 * dt, states + 0.5 * dt * k2, inputs_mid, params)
+    k4 = system(time + dt, states + dt * k3, inputs_end, params)
+
+    return states + (dt / 6) * (k1 + 2 * k2 + 2 * k3 + k4)
+
+
+# The supported fixed step integration methods of "simulate_batch"
+STEP_FUNCTIONS = {
+    'euler': euler_step,
+    'rk4': rk4_step,
+}
+
+
+def simulate_batch(ts: np.ndarray,
+                   inputs: np.ndarray,
+                   initial_states: np.ndarray,
+                   params: t.Optional[t.Dict[str, t.Union[float, np.ndarray]]] = None,
+                   system: t.Callable = single_pendulum_nonlinear_batch.system,
+                   output: t.Callable = single_pendulum_nonlinear_batch.output,
+                   method: str = 'rk4',
+                   substeps: int = 1,
+                   ) -> t.Tuple[np.ndarray, np.ndarray]:
+    """
+    Simulates N independent trajectories of a batched system in lockstep with a fixed step integrator.
+
+    The ``system`` and ``output`` functions have to follow the conventions of the generated batch modules
+    (see ``templates/system_batch.py.j2``): The states are passed as an array of the shape (num_states, N)
+    and the inputs as an array of the shape (num_inputs, N).
+
+    :param ts: The array of the T time points at which the trajectories are computed. The grid does not
+        have to be perfectly uniform, the integrator simply steps from one grid point to the next.
+    :param inputs: The input signals, either of the shape (num_inputs, T) if all the trajectories share
+        the same inputs or of the shape (N, num_inputs, T).
+    :param initial_states: The initial conditions of the shape (N, num_states)
+    :param params: The dict of system parameters. Every value may either be a scalar or an array of the
+        shape (N, ) which then defines the parameter individually for every trajectory.
+    :param system: The batched state equation function
+    :param output: The batched output function
+    :param method: The name of the integration method. One of the STEP_FUNCTIONS
+    :param substeps: The number of integration steps which are done between two grid points. This can be
+        increased for stiff parameter combinations (large k_x / k_l) where a single step is unstable.
+    :returns: A tuple (states, outputs) where states is an array of the shape (N, num_states, T) and outputs
+        is an array of the shape (N, num_outputs, T)
+    """
+    if method not in STEP_FUNCTIONS:
+        raise ValueError(f'The integration method "{method}" is not supported! Please use one of the '
+                         f'following methods: {", ".join(STEP_FUNCTIONS.keys())}')
+
+    params = params or {}
+    step = STEP_FUNCTIONS[method]
+
+    ts = np.asarray(ts, dtype=np.float64)
+    initial_states = np.asarray(initial_states, dtype=np.float64)
+    num_trajectories, num_states = initial_states.shape
+    num_steps = len(ts)
+
+    # Internally we want the time to be the first axis of the inputs so that the inputs for one time step
+    # are a contiguous (num_inputs, N) block.
+    inputs = np.asarray(inputs, dtype=np.float64)
+    if inputs.ndim == 2:
+        inputs = inputs[None, :, :]
+    num_inputs = inputs.shape[1]
+    inputs = np.broadcast_to(inputs, (num_trajectories, num_inputs, num_steps))
+    inputs = np.ascontiguousarray(np.transpose(inputs, (2, 1, 0)))
+
+    states = np.empty(shape=(num_steps, num_states, num_trajectories), dtype=np.float64)
+    states[0] = initial_states.T
+    for k in range(num_steps - 1):
+        dt = (ts[k + 1] - ts[k]) / substeps
+        current = states[k]
+        for s in range(substeps):
+            # For the substeps, the inputs also have to be interpolated between the two grid points
+            ratio_start = s / substeps
+            ratio_end = (s + 1) / substeps
+            inputs_start = (1 - ratio_start) * inputs[k] + ratio_start * inputs[k + 1]
+            inputs_end = (1 - ratio_end) * inputs[k] + ratio_end * inputs[k + 1]
+            current = step(system, ts[k] + s * dt, dt, current, inputs_start, inputs_end, params)
+
+        states[k + 1] = current
+
+    # The outputs can be computed for all the time steps at once by flattening the time and the batch
+    # dimension. The per-trajectory parameter arrays have to be tiled accordingly for that.
+    params_flat = {key: (np.tile(value, num_steps) if np.ndim(value) == 1 else value)
+                   for key, value in params.items()}
+    states_flat = np.transpose(states, (1, 0, 2)).reshape(num_states, -1)
+    inputs_flat = np.transpose(inputs, (1, 0, 2)).reshape(num_inputs, -1)
+    outputs = output(ts, states_flat, inputs_flat, params_flat)
+    outputs = outputs.reshape(-1, num_steps, num_trajectories)
+
+    return np.transpose(states, (2, 1, 0)), np.transpose(outputs, (2, 0, 1))
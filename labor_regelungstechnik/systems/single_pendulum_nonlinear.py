@@ -1,4 +1,3 @@
-import control as ct
 import numpy as np
 from numpy import cos, sin, sqrt, tan
 
@@ -374,10 +373,22 @@ def output(t, states, inputs, params):
 
 
 output_names = ('x', 'l', 'varphi')
-io_system = ct.NonlinearIOSystem(
-    system, output,
-    inputs=('v_x', 'v_l'),
-    outputs=output_names,
-    states=('L', 'X', 'l', 'phi', 'varphi', 'x'),
-    name='system',
-)
\ No newline at end of file
+
+
+def __getattr__(name):
+    # The control system is only created when it is accessed for the first time, because just importing the
+    # "control" package takes about a second, which is not needed to simply evaluate the system functions.
+    if name == 'io_system':
+        import control as ct
+
+        global io_system
+        io_system = ct.NonlinearIOSystem(
+            system, output,
+            inputs=('v_x', 'v_l'),
+            outputs=output_names,
+            states=('L', 'X', 'l', 'phi', 'varphi', 'x'),
+            name='system',
+        )
+        return io_system
+
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
@@ -0,0 +1,129 @@
+import numpy as np
+from numpy import sin, cos, sqrt
+from math import pi
+
+# This is the batched version of the system: Instead of a single state vector, the states are given as an
+# array of the shape (num_states, N) and the inputs as an array of the shape (num_inputs, N) where N is
+# the number of independent systems which are evaluated at once. Every parameter may either be a scalar
+# or an array of the shape (N, ) to evaluate different parameter sets at the same time.
+
+state_names = ('L', 'X', 'l', 'phi', 'varphi', 'x', )
+input_names = ('v_x', 'v_l', )
+output_names = ('x', 'l', 'varphi', )
+params_default_map = {
+    'm_x': 40,
+    'm_y': 3,
+    'y_max': 1.2,
+    'g': 9.81,
+    'c_varphi': 0.12,
+    'c_x': 0.5,
+    'k_x': 250,
+    'k_l': 500,
+    'l_0': 0.23,
+    'k_vx': 3.6,
+    'k_vl': -1.65,
+    'k_phi': 0.5,
+}
+
+
+def system(t, states, inputs, params):
+
+    # ~ unpacking the params
+    m_x = np.asarray(params.get('m_x', 40), dtype=float)
+    m_y = np.asarray(params.get('m_y', 3), dtype=float)
+    y_max = np.asarray(params.get('y_max', 1.2), dtype=float)
+    g = np.asarray(params.get('g', 9.81), dtype=float)
+    c_varphi = np.asarray(params.get('c_varphi', 0.12), dtype=float)
+    c_x = np.asarray(params.get('c_x', 0.5), dtype=float)
+    k_x = np.asarray(params.get('k_x', 250), dtype=float)
+    k_l = np.asarray(params.get('k_l', 500), dtype=float)
+    l_0 = np.asarray(params.get('l_0', 0.23), dtype=float)
+    k_vx = np.asarray(params.get('k_vx', 3.6), dtype=float)
+    k_vl = np.asarray(params.get('k_vl', -1.65), dtype=float)
+    k_phi = np.asarray(params.get('k_phi', 0.5), dtype=float)
+    
+    # ~ unpacking the state
+    L = states[0]
+    X = states[1]
+    l = states[2]
+    phi = states[3]
+    varphi = states[4]
+    x = states[5]
+    
+    # ~ unpacking the inputs
+    v_x = k_vx * inputs[0]
+    v_l = k_vl * inputs[1]
+    
+    v_x = np.where((x < 0) | (x > 2.5), 0, v_x)
+    v_l = np.where((l < 0) | (l > 1.3), 0, v_l)
+    
+    # ~ common subexpressions
+    tmp0 = 1/m_y
+    tmp1 = sin(varphi)
+    tmp2 = tmp1**2
+    tmp3 = m_x + m_y*(tmp2 + 1)
+    tmp4 = k_l*tmp3
+    tmp5 = L*tmp4
+    tmp6 = k_x*v_x
+    tmp7 = m_y*tmp1
+    tmp8 = l*m_y
+    tmp9 = m_x + m_y
+    tmp10 = phi**2
+    tmp11 = tmp10*tmp9
+    tmp12 = X*k_x
+    tmp13 = l_0*tmp12
+    tmp14 = cos(varphi)
+    tmp15 = c_varphi*phi
+    tmp16 = tmp14*tmp15
+    tmp17 = l + l_0
+    tmp18 = g*tmp17
+    tmp19 = tmp14*tmp18
+    tmp20 = 1/tmp9
+    tmp21 = tmp20/tmp17
+    tmp22 = k_l*tmp1
+    tmp23 = L*tmp22
+    tmp24 = -m_x + m_y*(tmp2 - 2)
+    tmp25 = 2*phi
+    tmp26 = tmp14*tmp22
+    tmp27 = tmp22*v_l + tmp6
+    tmp28 = l_0*m_y
+    
+    # ~ the main system equations
+    d_L = tmp0*tmp21*(k_l*l_0*tmp3*v_l + k_x*l_0*m_y*tmp1*v_x + l*(2*l_0*m_y*tmp11 + tmp11*tmp8 - tmp12*tmp7 + tmp4*v_l - tmp5 + tmp6*tmp7) + l_0**2*m_y*tmp10*tmp9 - l_0*tmp5 - m_y**2*tmp19*tmp2 - tmp13*tmp7 - tmp16*tmp7)
+    d_X = tmp21*(k_l*l_0*tmp1*v_l + k_x*l_0*v_x + l*(k_l*tmp1*v_l + k_x*v_x - tmp12 - tmp23) - l_0*tmp23 - tmp13 - tmp16 - tmp19*tmp7)
+    d_l = L
+    d_phi = tmp0*tmp20*(-L*tmp28*(tmp25*tmp9 + tmp26) - m_y*tmp13*tmp14 + tmp14*tmp27*tmp28 + tmp15*tmp24 + tmp18*tmp24*tmp7 + tmp8*(-L*(m_x*tmp25 + m_y*tmp25 + tmp26) - tmp12*tmp14 + tmp14*tmp27))/tmp17**2
+    d_varphi = phi
+    d_x = X
+    
+    # Some of the equations may evaluate to scalars (for example constants) which is why all of them have
+    # to be broadcast to the common shape before they can be stacked.
+    return np.stack(np.broadcast_arrays(d_L, d_X, d_l, d_phi, d_varphi, d_x))
+
+
+def output(t, states, inputs, params):
+
+    # ~ unpacking the params
+    m_x = np.asarray(params.get('m_x', 40), dtype=float)
+    m_y = np.asarray(params.get('m_y', 3), dtype=float)
+    y_max = np.asarray(params.get('y_max', 1.2), dtype=float)
+    g = np.asarray(params.get('g', 9.81), dtype=float)
+    c_varphi = np.asarray(params.get('c_varphi', 0.12), dtype=float)
+    c_x = np.asarray(params.get('c_x', 0.5), dtype=float)
+    k_x = np.asarray(params.get('k_x', 250), dtype=float)
+    k_l = np.asarray(params.get('k_l', 500), dtype=float)
+    l_0 = np.asarray(params.get('l_0', 0.23), dtype=float)
+    k_vx = np.asarray(params.get('k_vx', 3.6), dtype=float)
+    k_vl = np.asarray(params.get('k_vl', -1.65), dtype=float)
+    k_phi = np.asarray(params.get('k_phi', 0.5), dtype=float)
+    
+    # ~ unpacking the state
+    L = states[0]
+    X = states[1]
+    l = states[2]
+    phi = states[3]
+    varphi = states[4]
+    x = states[5]
+    
+
+    return np.stack(np.broadcast_arrays(x, l, k_phi * np.degrees(varphi)))
\ No newline at end of file
@@ -0,0 +1,577 @@
+import numpy as np
+from numpy import sin, cos, sqrt
+from math import pi
+
+def system(t, states, inputs, params):
+
+    # ~ unpacking the params
+    m_x = params.get('m_x', 40)
+    m_y = params.get('m_y', 3)
+    y_max = params.get('y_max', 1.2)
+    g = params.get('g', 9.81)
+    c_varphi = params.get('c_varphi', 0.12)
+    c_x = params.get('c_x', 0.5)
+    k_x = params.get('k_x', 250)
+    k_l = params.get('k_l', 500)
+    l_0 = params.get('l_0', 0.23)
+    k_vx = params.get('k_vx', 3.6)
+    k_vl = params.get('k_vl', -1.65)
+    k_phi = params.get('k_phi', 0.5)
+    
+    # ~ unpacking the state
+    L = states[0]
+    X = states[1]
+    l = states[2]
+    phi = states[3]
+    varphi = states[4]
+    x = states[5]
+    
+    # ~ unpacking the inputs
+    v_x = k_vx * inputs[0]
+    v_l = k_vl * inputs[1]
+    
+    if x < 0 or x > 2.5:
+        v_x = 0
+    
+    if l < 0 or l > 1.3:
+        v_l = 0
+    
+    
+    # ~ common subexpressions
+    tmp0 = 1/m_y
+    tmp1 = sin(varphi)
+    tmp2 = tmp1**2
+    tmp3 = m_x + m_y*(tmp2 + 1)
+    tmp4 = k_l*tmp3
+    tmp5 = L*tmp4
+    tmp6 = k_x*v_x
+    tmp7 = m_y*tmp1
+    tmp8 = l*m_y
+    tmp9 = m_x + m_y
+    tmp10 = phi**2
+    tmp11 = tmp10*tmp9
+    tmp12 = X*k_x
+    tmp13 = l_0*tmp12
+    tmp14 = cos(varphi)
+    tmp15 = c_varphi*phi
+    tmp16 = tmp14*tmp15
+    tmp17 = l + l_0
+    tmp18 = g*tmp17
+    tmp19 = tmp14*tmp18
+    tmp20 = 1/tmp9
+    tmp21 = tmp20/tmp17
+    tmp22 = k_l*tmp1
+    tmp23 = L*tmp22
+    tmp24 = -m_x + m_y*(tmp2 - 2)
+    tmp25 = 2*phi
+    tmp26 = tmp14*tmp22
+    tmp27 = tmp22*v_l + tmp6
+    tmp28 = l_0*m_y
+    
+    # ~ the main system equations
+    d_L = tmp0*tmp21*(k_l*l_0*tmp3*v_l + k_x*l_0*m_y*tmp1*v_x + l*(2*l_0*m_y*tmp11 + tmp11*tmp8 - tmp12*tmp7 + tmp4*v_l - tmp5 + tmp6*tmp7) + l_0**2*m_y*tmp10*tmp9 - l_0*tmp5 - m_y**2*tmp19*tmp2 - tmp13*tmp7 - tmp16*tmp7)
+    d_X = tmp21*(k_l*l_0*tmp1*v_l + k_x*l_0*v_x + l*(k_l*tmp1*v_l + k_x*v_x - tmp12 - tmp23) - l_0*tmp23 - tmp13 - tmp16 - tmp19*tmp7)
+    d_l = L
+    d_phi = tmp0*tmp20*(-L*tmp28*(tmp25*tmp9 + tmp26) - m_y*tmp13*tmp14 + tmp14*tmp27*tmp28 + tmp15*tmp24 + tmp18*tmp24*tmp7 + tmp8*(-L*(m_x*tmp25 + m_y*tmp25 + tmp26) - tmp12*tmp14 + tmp14*tmp27))/tmp17**2
+    d_varphi = phi
+    d_x = X
+    
+    return [d_L, d_X, d_l, d_phi, d_varphi, d_x]
+
+
+
+state_names = ('L', 'X', 'l', 'phi', 'varphi', 'x', )
+param_names = ('m_x', 'm_y', 'y_max', 'g', 'c_varphi', 'c_x', 'k_x', 'k_l', 'l_0', 'k_vx', 'k_vl', 'k_phi', )
+# For every state with a rail limit the name of the input which is switched off outside of that limit, the
+# lower and the upper limit
+state_limit_map = {
+    'x': ('v_x', 0, 2.5),
+    'l': ('v_l', 0, 1.3),
+}
+
+
+def jacobian_states(t, states, inputs, params):
+    """
+    The analytical jacobian of the state equations with respect to the states.
+    """
+    # ~ unpacking the params
+    m_x = params.get('m_x', 40)
+    m_y = params.get('m_y', 3)
+    y_max = params.get('y_max', 1.2)
+    g = params.get('g', 9.81)
+    c_varphi = params.get('c_varphi', 0.12)
+    c_x = params.get('c_x', 0.5)
+    k_x = params.get('k_x', 250)
+    k_l = params.get('k_l', 500)
+    l_0 = params.get('l_0', 0.23)
+    k_vx = params.get('k_vx', 3.6)
+    k_vl = params.get('k_vl', -1.65)
+    k_phi = params.get('k_phi', 0.5)
+    
+    # ~ unpacking the state
+    L = states[0]
+    X = states[1]
+    l = states[2]
+    phi = states[3]
+    varphi = states[4]
+    x = states[5]
+    
+    # ~ unpacking the inputs
+    v_x = k_vx * inputs[0]
+    v_l = k_vl * inputs[1]
+    
+    if x < 0 or x > 2.5:
+        v_x = 0
+    
+    if l < 0 or l > 1.3:
+        v_l = 0
+    
+    # ~ common subexpressions
+    jtmp0 = sin(varphi)
+    jtmp1 = jtmp0**2
+    jtmp2 = m_x + m_y*(jtmp1 + 1)
+    jtmp3 = jtmp2*k_l
+    jtmp4 = jtmp3*l_0
+    jtmp5 = 1/m_y
+    jtmp6 = l + l_0
+    jtmp7 = m_x + m_y
+    jtmp8 = 1/jtmp7
+    jtmp9 = jtmp8/jtmp6
+    jtmp10 = jtmp5*jtmp9
+    jtmp11 = k_x*l
+    jtmp12 = jtmp0*m_y
+    jtmp13 = k_x*l_0
+    jtmp14 = cos(varphi)
+    jtmp15 = g*m_y**2
+    jtmp16 = jtmp1*jtmp14*jtmp15
+    jtmp17 = 2*m_y
+    jtmp18 = phi**2
+    jtmp19 = jtmp18*jtmp7
+    jtmp20 = jtmp17*jtmp19
+    jtmp21 = k_x*v_x
+    jtmp22 = X*k_x
+    jtmp23 = -L*jtmp3 - jtmp0*jtmp22*m_y + jtmp12*jtmp21 + jtmp20*l_0 + jtmp3*v_l
+    jtmp24 = l*m_y
+    jtmp25 = l_0**2
+    jtmp26 = X*jtmp13
+    jtmp27 = jtmp12*jtmp26
+    jtmp28 = c_varphi*phi
+    jtmp29 = jtmp14*jtmp28
+    jtmp30 = jtmp16*jtmp6
+    jtmp31 = jtmp8/jtmp6**2
+    jtmp32 = jtmp31*jtmp5
+    jtmp33 = jtmp17*phi
+    jtmp34 = jtmp33*jtmp7
+    jtmp35 = jtmp7*phi
+    jtmp36 = l_0*m_y
+    jtmp37 = jtmp12*jtmp14
+    jtmp38 = jtmp14*jtmp22
+    jtmp39 = jtmp0*k_l
+    jtmp40 = L*jtmp39
+    jtmp41 = jtmp14*jtmp17
+    jtmp42 = jtmp28*m_y
+    jtmp43 = jtmp15*jtmp6
+    jtmp44 = jtmp14**2
+    jtmp45 = jtmp14*m_y
+    jtmp46 = -jtmp26*jtmp45
+    jtmp47 = jtmp39*l_0
+    jtmp48 = L*jtmp47
+    jtmp49 = g*jtmp37
+    jtmp50 = -jtmp0*k_l*v_l + jtmp22 + jtmp40 - k_x*v_x
+    jtmp51 = jtmp14*k_l
+    jtmp52 = L*jtmp51
+    jtmp53 = g*jtmp6
+    jtmp54 = jtmp53*m_y
+    jtmp55 = 2*m_x
+    jtmp56 = jtmp14*jtmp39
+    jtmp57 = jtmp33 + jtmp55*phi + jtmp56
+    jtmp58 = jtmp36*(2*jtmp35 + jtmp56)
+    jtmp59 = jtmp21 + jtmp39*v_l
+    jtmp60 = m_y*(-L*jtmp57 + jtmp14*jtmp59 - jtmp38)
+    jtmp61 = -m_x + m_y*(jtmp1 - 2)
+    jtmp62 = jtmp12*jtmp61
+    jtmp63 = L*(jtmp17 + jtmp55)
+    jtmp64 = L*(-jtmp1*k_l + jtmp44*k_l)
+    jtmp65 = jtmp0*jtmp59
+    
+    jacobian = np.zeros(shape=(6, 6))
+    jacobian[0, 0] = jtmp10*(-jtmp3*l - jtmp4)
+    jacobian[0, 1] = jtmp10*(-jtmp11*jtmp12 - jtmp12*jtmp13)
+    jacobian[0, 2] = jtmp10*(-jtmp16 + jtmp20*l + jtmp23) - jtmp32*(-L*jtmp4 + jtmp0*k_x*l_0*m_y*v_x - jtmp12*jtmp29 + jtmp18*jtmp25*jtmp7*m_y + jtmp2*k_l*l_0*v_l - jtmp27 - jtmp30 + l*(jtmp19*jtmp24 + jtmp23))
+    jacobian[0, 3] = jtmp10*(-c_varphi*jtmp37 + jtmp25*jtmp34 + l*(jtmp34*l + 4*jtmp35*jtmp36))
+    jacobian[0, 4] = jtmp10*(jtmp0**3*jtmp43 - 2*jtmp0*jtmp43*jtmp44 + jtmp1*jtmp42 + jtmp13*jtmp45*v_x + jtmp41*jtmp47*v_l - jtmp41*jtmp48 - jtmp42*jtmp44 + jtmp46 + l*(2*jtmp0*jtmp14*k_l*m_y*v_l + jtmp14*k_x*m_y*v_x - jtmp38*m_y - jtmp40*jtmp41))
+    jacobian[1, 0] = jtmp9*(-jtmp39*l - jtmp47)
+    jacobian[1, 1] = jtmp9*(-jtmp11 - jtmp13)
+    jacobian[1, 2] = -jtmp31*(jtmp0*k_l*l_0*v_l - jtmp26 - jtmp29 - jtmp48 - jtmp49*jtmp6 - jtmp50*l + k_x*l_0*v_x) + jtmp9*(-jtmp49 - jtmp50)
+    jacobian[1, 3] = -c_varphi*jtmp14*jtmp9
+    jacobian[1, 4] = jtmp9*(jtmp0*jtmp28 + jtmp1*jtmp54 - jtmp44*jtmp54 + jtmp51*l_0*v_l - jtmp52*l_0 + l*(jtmp14*k_l*v_l - jtmp52))
+    jacobian[2, 0] = 1
+    jacobian[3, 0] = jtmp32*(-jtmp24*jtmp57 - jtmp58)
+    jacobian[3, 1] = jtmp32*(-jtmp11*jtmp45 - jtmp13*jtmp45)
+    jacobian[3, 2] = jtmp32*(g*jtmp62 + jtmp60) - 2*jtmp5*jtmp8*(-L*jtmp58 + c_varphi*jtmp61*phi + jtmp14*jtmp36*jtmp59 + jtmp46 + jtmp53*jtmp62 + jtmp60*l)/jtmp6**3
+    jacobian[3, 3] = jtmp32*(c_varphi*jtmp61 - jtmp24*jtmp63 - jtmp36*jtmp63)
+    jacobian[3, 4] = jtmp32*(jtmp0*jtmp17*jtmp29 + jtmp24*(X*jtmp0*k_x + jtmp44*k_l*v_l - jtmp64 - jtmp65) + jtmp27 + 2*jtmp30 + jtmp36*jtmp44*k_l*v_l - jtmp36*jtmp64 - jtmp36*jtmp65 + jtmp45*jtmp53*jtmp61)
+    jacobian[4, 3] = 1
+    jacobian[5, 1] = 1
+    
+    return jacobian
+
+
+def jacobian_inputs(t, states, inputs, params):
+    """
+    The analytical jacobian of the state equations with respect to the (raw) inputs.
+    """
+    # ~ unpacking the params
+    m_x = params.get('m_x', 40)
+    m_y = params.get('m_y', 3)
+    y_max = params.get('y_max', 1.2)
+    g = params.get('g', 9.81)
+    c_varphi = params.get('c_varphi', 0.12)
+    c_x = params.get('c_x', 0.5)
+    k_x = params.get('k_x', 250)
+    k_l = params.get('k_l', 500)
+    l_0 = params.get('l_0', 0.23)
+    k_vx = params.get('k_vx', 3.6)
+    k_vl = params.get('k_vl', -1.65)
+    k_phi = params.get('k_phi', 0.5)
+    
+    # ~ unpacking the state
+    L = states[0]
+    X = states[1]
+    l = states[2]
+    phi = states[3]
+    varphi = states[4]
+    x = states[5]
+    
+    # ~ unpacking the inputs
+    v_x = k_vx * inputs[0]
+    v_l = k_vl * inputs[1]
+    
+    # ~ derivatives of the inputs
+    input_derivatives = np.zeros(shape=(2, 2))
+    input_derivatives[0, 0] = k_vx
+    input_derivatives[1, 1] = k_vl
+    
+    if x < 0 or x > 2.5:
+        v_x = 0
+        input_derivatives[0] = 0
+    
+    if l < 0 or l > 1.3:
+        v_l = 0
+        input_derivatives[1] = 0
+    
+    # ~ common subexpressions
+    jtmp0 = k_x*l
+    jtmp1 = sin(varphi)
+    jtmp2 = jtmp1*m_y
+    jtmp3 = k_x*l_0
+    jtmp4 = 1/m_y
+    jtmp5 = l + l_0
+    jtmp6 = 1/(m_x + m_y)
+    jtmp7 = jtmp6/jtmp5
+    jtmp8 = jtmp4*jtmp7
+    jtmp9 = k_l*(m_x + m_y*(jtmp1**2 + 1))
+    jtmp10 = jtmp1*k_l
+    jtmp11 = jtmp10*l
+    jtmp12 = jtmp10*l_0
+    jtmp13 = m_y*cos(varphi)
+    jtmp14 = jtmp4*jtmp6/jtmp5**2
+    
+    jacobian = np.zeros(shape=(6, 2))
+    
+    jacobian_inputs = np.zeros(shape=(6, 2))
+    jacobian_inputs[0, 0] = jtmp8*(jtmp0*jtmp2 + jtmp2*jtmp3)
+    jacobian_inputs[0, 1] = jtmp8*(jtmp9*l + jtmp9*l_0)
+    jacobian_inputs[1, 0] = jtmp7*(jtmp0 + jtmp3)
+    jacobian_inputs[1, 1] = jtmp7*(jtmp11 + jtmp12)
+    jacobian_inputs[3, 0] = jtmp14*(jtmp0*jtmp13 + jtmp13*jtmp3)
+    jacobian_inputs[3, 1] = jtmp14*(jtmp11*jtmp13 + jtmp12*jtmp13)
+    
+    return jacobian + jacobian_inputs @ input_derivatives
+
+
+def jacobian_params(t, states, inputs, params):
+    """
+    The analytical jacobian of the state equations with respect to the parameters in the
+    order of "param_names".
+    """
+    # ~ unpacking the params
+    m_x = params.get('m_x', 40)
+    m_y = params.get('m_y', 3)
+    y_max = params.get('y_max', 1.2)
+    g = params.get('g', 9.81)
+    c_varphi = params.get('c_varphi', 0.12)
+    c_x = params.get('c_x', 0.5)
+    k_x = params.get('k_x', 250)
+    k_l = params.get('k_l', 500)
+    l_0 = params.get('l_0', 0.23)
+    k_vx = params.get('k_vx', 3.6)
+    k_vl = params.get('k_vl', -1.65)
+    k_phi = params.get('k_phi', 0.5)
+    
+    # ~ unpacking the state
+    L = states[0]
+    X = states[1]
+    l = states[2]
+    phi = states[3]
+    varphi = states[4]
+    x = states[5]
+    
+    # ~ unpacking the inputs
+    v_x = k_vx * inputs[0]
+    v_l = k_vl * inputs[1]
+    
+    # ~ derivatives of the inputs
+    input_derivatives = np.zeros(shape=(2, 12))
+    input_derivatives[0, 9] = inputs[0]
+    input_derivatives[1, 10] = inputs[1]
+    
+    if x < 0 or x > 2.5:
+        v_x = 0
+        input_derivatives[0] = 0
+    
+    if l < 0 or l > 1.3:
+        v_l = 0
+        input_derivatives[1] = 0
+    
+    # ~ common subexpressions
+    jtmp0 = k_l*v_l
+    jtmp1 = L*k_l
+    jtmp2 = phi**2
+    jtmp3 = jtmp2*m_y
+    jtmp4 = jtmp3*l
+    jtmp5 = 2*l_0
+    jtmp6 = jtmp3*jtmp5
+    jtmp7 = jtmp4 + jtmp6
+    jtmp8 = jtmp0*l_0
+    jtmp9 = l_0**2
+    jtmp10 = jtmp3*jtmp9
+    jtmp11 = jtmp1*l_0
+    jtmp12 = 1/m_y
+    jtmp13 = l + l_0
+    jtmp14 = 1/jtmp13
+    jtmp15 = m_x + m_y
+    jtmp16 = 1/jtmp15
+    jtmp17 = jtmp14*jtmp16
+    jtmp18 = jtmp12*jtmp17
+    jtmp19 = jtmp15**(-2)
+    jtmp20 = jtmp14*jtmp19
+    jtmp21 = jtmp15*jtmp4
+    jtmp22 = sin(varphi)
+    jtmp23 = jtmp22**2
+    jtmp24 = jtmp23 + 1
+    jtmp25 = jtmp24*m_y + m_x
+    jtmp26 = k_x*v_x
+    jtmp27 = jtmp22*jtmp26
+    jtmp28 = X*k_x
+    jtmp29 = jtmp22*jtmp28
+    jtmp30 = jtmp29*m_y
+    jtmp31 = jtmp0*jtmp25 - jtmp1*jtmp25 + jtmp15*jtmp6 + jtmp27*m_y - jtmp30
+    jtmp32 = jtmp22*m_y
+    jtmp33 = cos(varphi)
+    jtmp34 = c_varphi*phi
+    jtmp35 = jtmp33*jtmp34
+    jtmp36 = m_y**2
+    jtmp37 = jtmp23*jtmp33
+    jtmp38 = g*jtmp36*jtmp37
+    jtmp39 = -jtmp11*jtmp25 - jtmp13*jtmp38 + jtmp15*jtmp2*jtmp9*m_y + jtmp22*k_x*l_0*m_y*v_x + jtmp25*k_l*l_0*v_l - jtmp30*l_0 - jtmp32*jtmp35 + l*(jtmp21 + jtmp31)
+    jtmp40 = jtmp12*jtmp39
+    jtmp41 = jtmp20*jtmp40
+    jtmp42 = 1/jtmp36
+    jtmp43 = jtmp15*jtmp2
+    jtmp44 = jtmp37*m_y
+    jtmp45 = jtmp17*jtmp33*phi
+    jtmp46 = l_0*v_x
+    jtmp47 = X*l_0
+    jtmp48 = L*jtmp25
+    jtmp49 = jtmp13**(-2)
+    jtmp50 = jtmp16*jtmp49
+    jtmp51 = jtmp1*jtmp22 - jtmp22*k_l*v_l + jtmp28 - k_x*v_x
+    jtmp52 = jtmp28*l_0
+    jtmp53 = g*jtmp32
+    jtmp54 = jtmp33*jtmp53
+    jtmp55 = -jtmp11*jtmp22 - jtmp13*jtmp54 + jtmp22*k_l*l_0*v_l - jtmp35 - jtmp51*l - jtmp52 + k_x*l_0*v_x
+    jtmp56 = jtmp20*jtmp55
+    jtmp57 = jtmp16*jtmp33
+    jtmp58 = g*jtmp22
+    jtmp59 = L*jtmp22
+    jtmp60 = jtmp22*l_0*v_l
+    jtmp61 = jtmp59*l_0
+    jtmp62 = jtmp13*jtmp53
+    jtmp63 = 2*phi
+    jtmp64 = jtmp63*m_y
+    jtmp65 = L*jtmp64
+    jtmp66 = jtmp65*l
+    jtmp67 = jtmp65*l_0
+    jtmp68 = jtmp12*jtmp50
+    jtmp69 = jtmp23 - 2
+    jtmp70 = jtmp69*m_y - m_x
+    jtmp71 = jtmp22*k_l
+    jtmp72 = jtmp33*jtmp71
+    jtmp73 = jtmp0*jtmp22 + jtmp26
+    jtmp74 = jtmp28*jtmp33
+    jtmp75 = l*(-L*(jtmp63*m_x + jtmp64 + jtmp72) + jtmp33*jtmp73 - jtmp74)
+    jtmp76 = jtmp33*jtmp73*l_0
+    jtmp77 = L*(jtmp15*jtmp63 + jtmp72)
+    jtmp78 = jtmp77*l_0
+    jtmp79 = jtmp33*jtmp52
+    jtmp80 = jtmp34*jtmp70 + jtmp62*jtmp70 + jtmp75*m_y + jtmp76*m_y - jtmp78*m_y - jtmp79*m_y
+    jtmp81 = jtmp12*jtmp80
+    jtmp82 = jtmp19*jtmp49*jtmp81
+    jtmp83 = jtmp13*jtmp58
+    jtmp84 = l*m_y
+    jtmp85 = jtmp33*m_y
+    jtmp86 = k_x*l
+    jtmp87 = k_x*l_0
+    jtmp88 = jtmp25*k_l
+    jtmp89 = jtmp32*jtmp33*k_l
+    
+    jacobian = np.zeros(shape=(6, 12))
+    jacobian[0, 0] = jtmp18*(jtmp10 - jtmp11 + jtmp8 + l*(jtmp0 - jtmp1 + jtmp7)) - jtmp41
+    jacobian[0, 1] = jtmp12*jtmp14*jtmp16*(-2*g*jtmp13*jtmp44 + jtmp10 - jtmp11*jtmp24 - jtmp22*jtmp35 + jtmp24*jtmp8 + jtmp27*l_0 - jtmp29*l_0 + jtmp43*jtmp9 + l*(jtmp0*jtmp24 - jtmp1*jtmp24 + jtmp27 - jtmp29 + jtmp43*jtmp5 + jtmp43*l + jtmp7)) - jtmp17*jtmp39*jtmp42 - jtmp41
+    jacobian[0, 3] = -jtmp16*jtmp44
+    jacobian[0, 4] = -jtmp22*jtmp45
+    jacobian[0, 6] = jtmp18*(jtmp32*jtmp46 - jtmp32*jtmp47 + l*(-X*jtmp32 + jtmp22*m_y*v_x))
+    jacobian[0, 7] = jtmp18*(jtmp25*l_0*v_l - jtmp48*l_0 + l*(jtmp25*v_l - jtmp48))
+    jacobian[0, 8] = jtmp18*(2*jtmp21 + jtmp31 - jtmp38) - jtmp40*jtmp50
+    jacobian[1, 0] = -jtmp56
+    jacobian[1, 1] = -jtmp56 - jtmp57*jtmp58
+    jacobian[1, 3] = -jtmp32*jtmp57
+    jacobian[1, 4] = -jtmp45
+    jacobian[1, 6] = jtmp17*(jtmp46 - jtmp47 + l*(-X + v_x))
+    jacobian[1, 7] = jtmp17*(jtmp60 - jtmp61 + l*(jtmp22*v_l - jtmp59))
+    jacobian[1, 8] = jtmp17*(-jtmp51 - jtmp54) - jtmp50*jtmp55
+    jacobian[3, 0] = jtmp68*(-jtmp34 - jtmp62 - jtmp66 - jtmp67) - jtmp82
+    jacobian[3, 1] = jtmp12*jtmp16*jtmp49*(jtmp34*jtmp69 - jtmp66 - jtmp67 + jtmp69*jtmp83*m_y + jtmp70*jtmp83 + jtmp75 + jtmp76 - jtmp78 - jtmp79) - jtmp42*jtmp50*jtmp80 - jtmp82
+    jacobian[3, 3] = jtmp17*jtmp22*jtmp70
+    jacobian[3, 4] = jtmp68*jtmp70*phi
+    jacobian[3, 6] = jtmp68*(jtmp46*jtmp85 - jtmp47*jtmp85 + jtmp84*(-X*jtmp33 + jtmp33*v_x))
+    jacobian[3, 7] = jtmp68*(jtmp60*jtmp85 - jtmp61*jtmp85 + jtmp84*(jtmp22*jtmp33*v_l - jtmp33*jtmp59))
+    jacobian[3, 8] = jtmp68*(g*jtmp22*jtmp70*m_y + jtmp33*jtmp73*m_y - jtmp74*m_y - jtmp77*m_y) - 2*jtmp16*jtmp81/jtmp13**3
+    
+    jacobian_inputs = np.zeros(shape=(6, 2))
+    jacobian_inputs[0, 0] = jtmp18*(jtmp32*jtmp86 + jtmp32*jtmp87)
+    jacobian_inputs[0, 1] = jtmp18*(jtmp88*l + jtmp88*l_0)
+    jacobian_inputs[1, 0] = jtmp17*(jtmp86 + jtmp87)
+    jacobian_inputs[1, 1] = jtmp17*(jtmp71*l + jtmp71*l_0)
+    jacobian_inputs[3, 0] = jtmp68*(jtmp85*jtmp86 + jtmp85*jtmp87)
+    jacobian_inputs[3, 1] = jtmp68*(jtmp89*l + jtmp89*l_0)
+    
+    return jacobian + jacobian_inputs @ input_derivatives
+
+
+def output_jacobian_states(t, states, inputs, params):
+    """
+    The analytical jacobian of the outputs with respect to the states.
+    """
+    # ~ unpacking the params
+    m_x = params.get('m_x', 40)
+    m_y = params.get('m_y', 3)
+    y_max = params.get('y_max', 1.2)
+    g = params.get('g', 9.81)
+    c_varphi = params.get('c_varphi', 0.12)
+    c_x = params.get('c_x', 0.5)
+    k_x = params.get('k_x', 250)
+    k_l = params.get('k_l', 500)
+    l_0 = params.get('l_0', 0.23)
+    k_vx = params.get('k_vx', 3.6)
+    k_vl = params.get('k_vl', -1.65)
+    k_phi = params.get('k_phi', 0.5)
+    
+    # ~ unpacking the state
+    L = states[0]
+    X = states[1]
+    l = states[2]
+    phi = states[3]
+    varphi = states[4]
+    x = states[5]
+    
+    jacobian = np.zeros(shape=(3, 6))
+    jacobian[0, 5] = 1
+    jacobian[1, 2] = 1
+    jacobian[2, 4] = 180*k_phi/pi
+    
+    return jacobian
+
+
+def output_jacobian_params(t, states, inputs, params):
+    """
+    The analytical jacobian of the outputs with respect to the parameters in the order of
+    "param_names".
+    """
+    # ~ unpacking the params
+    m_x = params.get('m_x', 40)
+    m_y = params.get('m_y', 3)
+    y_max = params.get('y_max', 1.2)
+    g = params.get('g', 9.81)
+    c_varphi = params.get('c_varphi', 0.12)
+    c_x = params.get('c_x', 0.5)
+    k_x = params.get('k_x', 250)
+    k_l = params.get('k_l', 500)
+    l_0 = params.get('l_0', 0.23)
+    k_vx = params.get('k_vx', 3.6)
+    k_vl = params.get('k_vl', -1.65)
+    k_phi = params.get('k_phi', 0.5)
+    
+    # ~ unpacking the state
+    L = states[0]
+    X = states[1]
+    l = states[2]
+    phi = states[3]
+    varphi = states[4]
+    x = states[5]
+    
+    jacobian = np.zeros(shape=(3, 12))
+    jacobian[2, 11] = 180*varphi/pi
+    
+    return jacobian
+
+
+def output(t, states, inputs, params):
+
+    # ~ unpacking the params
+    m_x = params.get('m_x', 40)
+    m_y = params.get('m_y', 3)
+    y_max = params.get('y_max', 1.2)
+    g = params.get('g', 9.81)
+    c_varphi = params.get('c_varphi', 0.12)
+    c_x = params.get('c_x', 0.5)
+    k_x = params.get('k_x', 250)
+    k_l = params.get('k_l', 500)
+    l_0 = params.get('l_0', 0.23)
+    k_vx = params.get('k_vx', 3.6)
+    k_vl = params.get('k_vl', -1.65)
+    k_phi = params.get('k_phi', 0.5)
+    
+    # ~ unpacking the state
+    L = states[0]
+    X = states[1]
+    l = states[2]
+    phi = states[3]
+    varphi = states[4]
+    x = states[5]
+    
+
+    return [x, l, k_phi * np.degrees(varphi)]
+
+
+output_names = ('x', 'l', 'varphi', )
+
+
+def __getattr__(name):
+    # The control system is only created when it is accessed for the first time, because just importing the
+    # "control" package takes about a second, which is not needed to simply evaluate the system functions.
+    if name == 'io_system':
+        import control as ct
+
+        global io_system
+        io_system = ct.NonlinearIOSystem(
+            system, output,
+            inputs=('v_x', 'v_l', ),
+            outputs=('x', 'l', 'varphi', ),
+            states=('L', 'X', 'l', 'phi', 'varphi', 'x', ),
+            name='system',
+        )
+        return io_system
+
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
\ No newline at end of file
@@ -0,0 +1,207 @@
+import numpy as np
+from numpy import sin, cos, sqrt
+from math import pi
+
+state_names = ('L', 'X', 'l', 'phi', 'varphi', 'x', )
+param_names = ('m_x', 'm_y', 'y_max', 'g', 'c_varphi', 'c_x', 'k_x', 'k_l', 'l_0', 'k_vx', 'k_vl', 'k_phi', )
+# For every state with a rail limit the name of the input which is switched off outside of that limit, the
+# lower and the upper limit
+state_limit_map = {
+    'x': ('v_x', 0, 2.5),
+    'l': ('v_l', 0, 1.3),
+}
+
+
+def mass_matrix_form(t, states, inputs, params):
+    """
+    Computes the mass matrix M and the forcing vector F of the system equations M @ a = F for the
+    accelerations a = (d_X, d_L, d_phi).
+    """
+    # ~ unpacking the params
+    m_x = params.get('m_x', 40)
+    m_y = params.get('m_y', 3)
+    y_max = params.get('y_max', 1.2)
+    g = params.get('g', 9.81)
+    c_varphi = params.get('c_varphi', 0.12)
+    c_x = params.get('c_x', 0.5)
+    k_x = params.get('k_x', 250)
+    k_l = params.get('k_l', 500)
+    l_0 = params.get('l_0', 0.23)
+    k_vx = params.get('k_vx', 3.6)
+    k_vl = params.get('k_vl', -1.65)
+    k_phi = params.get('k_phi', 0.5)
+    
+    # ~ unpacking the state
+    L = states[0]
+    X = states[1]
+    l = states[2]
+    phi = states[3]
+    varphi = states[4]
+    x = states[5]
+    
+    # ~ unpacking the inputs
+    v_x = k_vx * inputs[0]
+    v_l = k_vl * inputs[1]
+    
+    if x < 0 or x > 2.5:
+        v_x = 0
+    
+    if l < 0 or l > 1.3:
+        v_l = 0
+    
+    
+    # ~ common subexpressions
+    tmp0 = 2*m_y
+    tmp1 = sin(varphi)
+    tmp2 = m_y*tmp1
+    tmp3 = l + l_0
+    tmp4 = cos(varphi)
+    tmp5 = m_y*phi**2
+    tmp6 = g*tmp2
+    tmp7 = L*phi*tmp0
+    
+    # ~ the entries of the mass matrix and the forcing vector
+    mass_0_0 = m_x + tmp0
+    mass_1_0 = -tmp2
+    mass_2_0 = -m_y*tmp3*tmp4
+    mass_1_1 = m_y
+    mass_2_2 = m_y*tmp3**2
+    forcing_0 = -k_x*(X - v_x) + m_y*phi*(2*L*tmp4 - phi*tmp1*tmp3)
+    forcing_1 = -L*k_l + k_l*v_l + l*tmp5 + l_0*tmp5
+    forcing_2 = -c_varphi*phi - l*tmp6 - l*tmp7 - l_0*tmp6 - l_0*tmp7
+    
+    mass_matrix = np.array([
+        [mass_0_0, mass_1_0, mass_2_0],
+        [mass_1_0, mass_1_1, 0],
+        [mass_2_0, 0, mass_2_2],
+    ], dtype=float)
+    forcing = np.array([forcing_0, forcing_1, forcing_2], dtype=float)
+    return mass_matrix, forcing
+
+
+def system(t, states, inputs, params):
+
+    # ~ unpacking the params
+    m_x = params.get('m_x', 40)
+    m_y = params.get('m_y', 3)
+    y_max = params.get('y_max', 1.2)
+    g = params.get('g', 9.81)
+    c_varphi = params.get('c_varphi', 0.12)
+    c_x = params.get('c_x', 0.5)
+    k_x = params.get('k_x', 250)
+    k_l = params.get('k_l', 500)
+    l_0 = params.get('l_0', 0.23)
+    k_vx = params.get('k_vx', 3.6)
+    k_vl = params.get('k_vl', -1.65)
+    k_phi = params.get('k_phi', 0.5)
+    
+    # ~ unpacking the state
+    L = states[0]
+    X = states[1]
+    l = states[2]
+    phi = states[3]
+    varphi = states[4]
+    x = states[5]
+    
+    # ~ unpacking the inputs
+    v_x = k_vx * inputs[0]
+    v_l = k_vl * inputs[1]
+    
+    if x < 0 or x > 2.5:
+        v_x = 0
+    
+    if l < 0 or l > 1.3:
+        v_l = 0
+    
+    
+    # ~ common subexpressions
+    tmp0 = 2*m_y
+    tmp1 = sin(varphi)
+    tmp2 = m_y*tmp1
+    tmp3 = l + l_0
+    tmp4 = cos(varphi)
+    tmp5 = m_y*phi**2
+    tmp6 = g*tmp2
+    tmp7 = L*phi*tmp0
+    
+    # ~ the entries of the mass matrix and the forcing vector
+    mass_0_0 = m_x + tmp0
+    mass_1_0 = -tmp2
+    mass_2_0 = -m_y*tmp3*tmp4
+    mass_1_1 = m_y
+    mass_2_2 = m_y*tmp3**2
+    forcing_0 = -k_x*(X - v_x) + m_y*phi*(2*L*tmp4 - phi*tmp1*tmp3)
+    forcing_1 = -L*k_l + k_l*v_l + l*tmp5 + l_0*tmp5
+    forcing_2 = -c_varphi*phi - l*tmp6 - l*tmp7 - l_0*tmp6 - l_0*tmp7
+    
+    # ~ the kinematic equations
+    d_x = X
+    d_l = L
+    d_varphi = phi
+    
+    # ~ the accelerations from the LDL^T decomposition of the mass matrix
+    stmp0 = 1/mass_0_0
+    stmp1 = mass_1_0**2
+    stmp2 = 1/(mass_1_1 - stmp0*stmp1)
+    stmp3 = forcing_0*stmp0
+    stmp4 = stmp2*(forcing_1 - mass_1_0*stmp3)
+    stmp5 = mass_1_0*stmp0
+    stmp6 = mass_2_0**2
+    stmp7 = (forcing_2 - mass_2_0*stmp3 + mass_2_0*stmp4*stmp5)/(mass_2_2 - stmp0*stmp6 - stmp1*stmp2*stmp6/mass_0_0**2)
+    stmp8 = mass_2_0*stmp7
+    stmp9 = stmp2*stmp5*stmp8 + stmp4
+    d_X = forcing_0*stmp0 - stmp0*stmp8 - stmp5*stmp9
+    d_L = stmp9
+    d_phi = stmp7
+    
+    return [d_L, d_X, d_l, d_phi, d_varphi, d_x]
+
+
+def output(t, states, inputs, params):
+
+    # ~ unpacking the params
+    m_x = params.get('m_x', 40)
+    m_y = params.get('m_y', 3)
+    y_max = params.get('y_max', 1.2)
+    g = params.get('g', 9.81)
+    c_varphi = params.get('c_varphi', 0.12)
+    c_x = params.get('c_x', 0.5)
+    k_x = params.get('k_x', 250)
+    k_l = params.get('k_l', 500)
+    l_0 = params.get('l_0', 0.23)
+    k_vx = params.get('k_vx', 3.6)
+    k_vl = params.get('k_vl', -1.65)
+    k_phi = params.get('k_phi', 0.5)
+    
+    # ~ unpacking the state
+    L = states[0]
+    X = states[1]
+    l = states[2]
+    phi = states[3]
+    varphi = states[4]
+    x = states[5]
+    
+
+    return [x, l, k_phi * np.degrees(varphi)]
+
+
+output_names = ('x', 'l', 'varphi', )
+
+
+def __getattr__(name):
+    # The control system is only created when it is accessed for the first time, because just importing the
+    # "control" package takes about a second, which is not needed to simply evaluate the system functions.
+    if name == 'io_system':
+        import control as ct
+
+        global io_system
+        io_system = ct.NonlinearIOSystem(
+            system, output,
+            inputs=('v_x', 'v_l', ),
+            outputs=('x', 'l', 'varphi', ),
+            states=('L', 'X', 'l', 'phi', 'varphi', 'x', ),
+            name='system',
+        )
+        return io_system
+
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
\ No newline at end of file
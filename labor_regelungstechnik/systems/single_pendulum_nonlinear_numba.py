@@ -0,0 +1,209 @@
+import numpy as np
+from numpy import sin, cos, sqrt
+from math import pi
+
+# numba is an optional dependency. Without it, the array functions below are simply plain python functions
+# with the exact same results. These are slightly slower than the "cse" version of the system though,
+# because the states, inputs and params have to be packed into arrays for every call.
+try:
+    from numba import njit
+except ImportError:
+    def njit(*args, **kwargs):
+        return lambda function: function
+
+# This is the JIT compiled version of the system: The "system_array" and "output_array" functions only work
+# with flat float arrays for the states, the inputs and the params (in the order of "param_names"), which
+# is what numba needs to compile them. The "system" and "output" functions are thin adapters with the usual
+# signature of the system modules, such that they can still be used by "ct.NonlinearIOSystem".
+
+state_names = ('L', 'X', 'l', 'phi', 'varphi', 'x', )
+input_names = ('v_x', 'v_l', )
+param_names = ('m_x', 'm_y', 'y_max', 'g', 'c_varphi', 'c_x', 'k_x', 'k_l', 'l_0', 'k_vx', 'k_vl', 'k_phi', )
+param_defaults = np.array([40, 3, 1.2, 9.81, 0.12, 0.5, 250, 500, 0.23, 3.6, -1.65, 0.5, ], dtype=float)
+# For every state with a rail limit the name of the input which is switched off outside of that limit, the
+# lower and the upper limit
+state_limit_map = {
+    'x': ('v_x', 0, 2.5),
+    'l': ('v_l', 0, 1.3),
+}
+
+
+@njit(cache=True)
+def system_array(t, states, inputs, params):
+
+    # ~ unpacking the params
+    m_x = params[0]
+    m_y = params[1]
+    y_max = params[2]
+    g = params[3]
+    c_varphi = params[4]
+    c_x = params[5]
+    k_x = params[6]
+    k_l = params[7]
+    l_0 = params[8]
+    k_vx = params[9]
+    k_vl = params[10]
+    k_phi = params[11]
+    
+    # ~ unpacking the state
+    L = states[0]
+    X = states[1]
+    l = states[2]
+    phi = states[3]
+    varphi = states[4]
+    x = states[5]
+    
+    # ~ unpacking the inputs
+    v_x = k_vx * inputs[0]
+    v_l = k_vl * inputs[1]
+    
+    if x < 0 or x > 2.5:
+        v_x = 0.0
+    
+    if l < 0 or l > 1.3:
+        v_l = 0.0
+    
+    
+    # ~ common subexpressions
+    tmp0 = 1/m_y
+    tmp1 = sin(varphi)
+    tmp2 = tmp1**2
+    tmp3 = m_x + m_y*(tmp2 + 1)
+    tmp4 = k_l*tmp3
+    tmp5 = L*tmp4
+    tmp6 = k_x*v_x
+    tmp7 = m_y*tmp1
+    tmp8 = l*m_y
+    tmp9 = m_x + m_y
+    tmp10 = phi**2
+    tmp11 = tmp10*tmp9
+    tmp12 = X*k_x
+    tmp13 = l_0*tmp12
+    tmp14 = cos(varphi)
+    tmp15 = c_varphi*phi
+    tmp16 = tmp14*tmp15
+    tmp17 = l + l_0
+    tmp18 = g*tmp17
+    tmp19 = tmp14*tmp18
+    tmp20 = 1/tmp9
+    tmp21 = tmp20/tmp17
+    tmp22 = k_l*tmp1
+    tmp23 = L*tmp22
+    tmp24 = -m_x + m_y*(tmp2 - 2)
+    tmp25 = 2*phi
+    tmp26 = tmp14*tmp22
+    tmp27 = tmp22*v_l + tmp6
+    tmp28 = l_0*m_y
+    
+    # ~ the main system equations
+    derivatives = np.empty(6)
+    derivatives[0] = tmp0*tmp21*(k_l*l_0*tmp3*v_l + k_x*l_0*m_y*tmp1*v_x + l*(2*l_0*m_y*tmp11 + tmp11*tmp8 - tmp12*tmp7 + tmp4*v_l - tmp5 + tmp6*tmp7) + l_0**2*m_y*tmp10*tmp9 - l_0*tmp5 - m_y**2*tmp19*tmp2 - tmp13*tmp7 - tmp16*tmp7)
+    derivatives[1] = tmp21*(k_l*l_0*tmp1*v_l + k_x*l_0*v_x + l*(k_l*tmp1*v_l + k_x*v_x - tmp12 - tmp23) - l_0*tmp23 - tmp13 - tmp16 - tmp19*tmp7)
+    derivatives[2] = L
+    derivatives[3] = tmp0*tmp20*(-L*tmp28*(tmp25*tmp9 + tmp26) - m_y*tmp13*tmp14 + tmp14*tmp27*tmp28 + tmp15*tmp24 + tmp18*tmp24*tmp7 + tmp8*(-L*(m_x*tmp25 + m_y*tmp25 + tmp26) - tmp12*tmp14 + tmp14*tmp27))/tmp17**2
+    derivatives[4] = phi
+    derivatives[5] = X
+    
+    return derivatives
+
+
+@njit(cache=True)
+def output_array(t, states, inputs, params):
+
+    # ~ unpacking the params
+    m_x = params[0]
+    m_y = params[1]
+    y_max = params[2]
+    g = params[3]
+    c_varphi = params[4]
+    c_x = params[5]
+    k_x = params[6]
+    k_l = params[7]
+    l_0 = params[8]
+    k_vx = params[9]
+    k_vl = params[10]
+    k_phi = params[11]
+    
+    # ~ unpacking the state
+    L = states[0]
+    X = states[1]
+    l = states[2]
+    phi = states[3]
+    varphi = states[4]
+    x = states[5]
+    
+    outputs = np.empty(3)
+    outputs[0] = x
+    outputs[1] = l
+    outputs[2] = k_phi * np.degrees(varphi)
+    
+    return outputs
+
+
+# The params dict is the same for all the evaluations of a simulation, which is why the last packed params
+# are reused as long as the names and the values of the dict do not change. The values are converted to
+# floats for the comparison, because they may also be numpy scalars or arrays, for which "!=" is ambiguous.
+_packed_params = (None, param_defaults)
+
+
+def pack_params(params):
+    """
+    Converts the params dict into the flat float array of the "system_array" and "output_array" functions.
+    Missing params are replaced by their default values.
+    """
+    global _packed_params
+    key = (tuple(params.keys()), tuple(float(value) for value in params.values()))
+    if key != _packed_params[0]:
+        vector = np.array([params.get(name, default) for name, default in zip(param_names, param_defaults)],
+                          dtype=float)
+        _packed_params = (key, vector)
+
+    return _packed_params[1]
+
+
+def system(t, states, inputs, params):
+    return system_array(float(t), np.asarray(states, dtype=float), np.asarray(inputs, dtype=float),
+                        pack_params(params))
+
+
+def output(t, states, inputs, params):
+    return output_array(float(t), np.asarray(states, dtype=float), np.asarray(inputs, dtype=float),
+                        pack_params(params))
+
+
+def make_rhs(params, input_function):
+    """
+    Creates the right hand side function "rhs(t, states)" for "scipy.integrate.solve_ivp", which packs the
+    given params only once.
+
+    :param params: The params dict
+    :param input_function: A function which returns the array of the raw inputs for a given time
+    """
+    vector = pack_params(params).copy()
+
+    def rhs(t, states):
+        return system_array(t, states, np.asarray(input_function(t), dtype=float), vector)
+
+    return rhs
+
+
+output_names = ('x', 'l', 'varphi', )
+
+
+def __getattr__(name):
+    # The control system is only created when it is accessed for the first time, because just importing the
+    # "control" package takes about a second, which is not needed to simply evaluate the system functions.
+    if name == 'io_system':
+        import control as ct
+
+        global io_system
+        io_system = ct.NonlinearIOSystem(
+            system, output,
+            inputs=('v_x', 'v_l', ),
+            outputs=('x', 'l', 'varphi', ),
+            states=('L', 'X', 'l', 'phi', 'varphi', 'x', ),
+            name='system',
+        )
+        return io_system
+
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
\ No newline at end of file
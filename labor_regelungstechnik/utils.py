@@ -1,29 +1,24 @@
 import os
+import hashlib
 import pathlib
 import subprocess
 import tempfile
+import threading
 import typing as t
+from concurrent.futures import Future, ThreadPoolExecutor
 
 import shutil
-import jinja2 as j2
+import functools
+
+# jinja is only imported once the template environment is used for the first time (see get_template_env)
+if t.TYPE_CHECKING:
+    import jinja2 as j2
 
 PATH = pathlib.Path(__file__).parent.absolute()
 MEASUREMENTS_PATH = os.path.join(PATH, 'measurements')
 TEMPLATES_PATH = os.path.join(PATH, 'templates')
 
 
-
-
-TEMPLATE_ENV = j2.Environment(
-    loader=j2.FileSystemLoader(TEMPLATES_PATH),
-    autoescape=j2.select_autoescape(),
-)
-TEMPLATE_ENV.globals.update(**{
-    'zip': zip,
-    'int': int,
-    'enumerate': enumerate,
-})
-
 def add_prefix(inp, prefix: str):
 
     if isinstance(inp, str):
@@ -34,24 +29,72 @@ def add_prefix(inp, prefix: str):
     return func
 
 
-TEMPLATE_ENV.filters['add_prefix'] = add_prefix
+@functools.lru_cache(maxsize=None)
+def get_template_env() -> 'j2.Environment':
+    """
+    Returns the jinja environment for the templates of the "templates" folder. The environment is only
+    created on the first call, such that modules which only need the paths of this module do not have to
+    import jinja at all. It is also available as the module attribute TEMPLATE_ENV.
+    """
+    import jinja2 as j2
+
+    template_env = j2.Environment(
+        loader=j2.FileSystemLoader(TEMPLATES_PATH),
+        autoescape=j2.select_autoescape(),
+    )
+    template_env.globals.update(**{
+        'zip': zip,
+        'int': int,
+        'enumerate': enumerate,
+    })
+    template_env.filters['add_prefix'] = add_prefix
+    return template_env
+
+
+def __getattr__(name: str) -> t.Any:
+    if name == 'TEMPLATE_ENV':
+        return get_template_env()
+
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
 
 
 def latex_math(content: str,
                template_name: str = 'math.tex.j2') -> str:
-    template = TEMPLATE_ENV.get_template(template_name)
+    template = get_template_env().get_template(template_name)
     latex_string = template.render({'content': content})
     return latex_string
 
 
-def render_latex(kwargs: dict,
-                 output_path: str,
-                 template_name: str = 'article.tex.j2'
-                 ) -> None:
+# These are the modes in which the LatexQueue renders the PDF files. "sync" renders every file right away,
+# "parallel" renders the files concurrently in the background and "batch" collects all the contents into a
+# single multi page document which is rendered with one pdflatex call when the queue is closed.
+LATEX_MODES = ('sync', 'parallel', 'batch')
+
+
+def compile_latex(latex_string: str,
+                  output_path: str,
+                  cache_path: t.Optional[str] = None,
+                  ) -> str:
+    """
+    Compiles the given latex source code with "pdflatex" and copies the resulting PDF to the output path.
+
+    :param latex_string: The complete latex source code of the document
+    :param output_path: The path of the resulting PDF file
+    :param cache_path: Optionally a directory in which the compiled PDF files are stored by the hash of
+        their source code. If the same source has been compiled before, the PDF is just copied from there.
+    :returns: The output path
+    """
+    cached_path = None
+    if cache_path is not None:
+        os.makedirs(cache_path, exist_ok=True)
+        key = hashlib.sha256(latex_string.encode()).hexdigest()
+        cached_path = os.path.join(cache_path, f'{key}.pdf')
+        if os.path.exists(cached_path):
+            shutil.copy(cached_path, output_path)
+            return output_path
+
     with tempfile.TemporaryDirectory() as temp_path:
         # First of all we need to create the latex file on which we can then later invoke "pdflatex"
-        template = TEMPLATE_ENV.get_template(template_name)
-        latex_string = template.render(**kwargs)
         latex_file_path = os.path.join(temp_path, 'main.tex')
         with open(latex_file_path, mode='w') as file:
             file.write(latex_string)
@@ -69,4 +112,123 @@ def render_latex(kwargs: dict,
 
         # Now finally we copy the pdf file - currently in the temp folder - to the final destination
         pdf_file_path = os.path.join(temp_path, 'main.pdf')
-        shutil.copy(pdf_file_path, output_path)
\ No newline at end of file
+        shutil.copy(pdf_file_path, output_path)
+        if cached_path is not None:
+            # The file is copied to a temporary name first such that parallel jobs never see an incomplete
+            # file in the cache
+            temp_cached_path = f'{cached_path}.{os.getpid()}.{threading.get_ident()}.tmp'
+            shutil.copy(pdf_file_path, temp_cached_path)
+            os.replace(temp_cached_path, cached_path)
+
+    return output_path
+
+
+def render_latex(kwargs: dict,
+                 output_path: str,
+                 template_name: str = 'article.tex.j2',
+                 cache_path: t.Optional[str] = None,
+                 ) -> None:
+    template = get_template_env().get_template(template_name)
+    latex_string = template.render(**kwargs)
+    compile_latex(latex_string, output_path, cache_path=cache_path)
+
+
+class LatexQueue:
+    """
+    Collects the jobs of "render_latex" and renders them according to the given mode. In the "parallel" mode
+    the pdflatex processes are started by a pool of worker threads such that multiple documents are
+    compiled at the same time while the main thread can continue in the meantime. In the "batch" mode the
+    contents of all the jobs become the pages of a single document at ``batch_path``, which is compiled when
+    the queue is closed. Note that a single broken content then breaks the whole document.
+
+    .. code-block:: python
+
+        with LatexQueue(mode='parallel', cache_path='latex_cache') as queue:
+            queue.submit({'content': latex}, 'energy.pdf')
+            # ... do something else
+
+    :param mode: One of the LATEX_MODES
+    :param num_workers: The number of pdflatex processes which run concurrently in the "parallel" mode
+    :param cache_path: Optionally the directory of the PDF cache, see "compile_latex"
+    :param batch_path: The path of the single document in the "batch" mode
+    """
+    def __init__(self,
+                 mode: str = 'parallel',
+                 num_workers: int = 4,
+                 cache_path: t.Optional[str] = None,
+                 batch_path: t.Optional[str] = None):
+        if mode not in LATEX_MODES:
+            raise ValueError(f'The latex mode "{mode}" is not supported! Please use one of the '
+                             f'following modes: {", ".join(LATEX_MODES)}')
+        if mode == 'batch' and batch_path is None:
+            raise ValueError('The "batch" mode requires the batch_path of the resulting document!')
+
+        self.mode = mode
+        self.num_workers = num_workers
+        self.cache_path = cache_path
+        self.batch_path = batch_path
+
+        self.pool: t.Optional[ThreadPoolExecutor] = None
+        self.futures: t.List[Future] = []
+        self.contents: t.List[str] = []
+
+    def submit(self,
+               kwargs: dict,
+               output_path: str,
+               template_name: str = 'article.tex.j2',
+               ) -> None:
+        """
+        Submits a job with the same arguments as "render_latex". In the "batch" mode only the "content" of
+        the kwargs is used and the output path and the template are ignored.
+        """
+        if self.mode == 'sync':
+            render_latex(kwargs, output_path, template_name=template_name, cache_path=self.cache_path)
+
+        elif self.mode == 'parallel':
+            # The pool is only started once it is actually needed
+            if self.pool is None:
+                self.pool = ThreadPoolExecutor(max_workers=self.num_workers)
+
+            latex_string = get_template_env().get_template(template_name).render(**kwargs)
+            self.futures.append(self.pool.submit(compile_latex, latex_string, output_path, self.cache_path))
+
+        elif self.mode == 'batch':
+            self.contents.append(kwargs['content'])
+
+    def wait(self) -> t.List[str]:
+        """
+        Blocks until all the pending jobs are rendered and returns the paths of the rendered files. If any
+        of the jobs failed, the first exception is raised, but only after all the other jobs are finished.
+        """
+        if self.mode == 'batch' and self.contents:
+            latex_string = get_template_env().get_template('pages.tex.j2').render(contents=self.contents)
+            self.contents = []
+            return [compile_latex(latex_string, self.batch_path, cache_path=self.cache_path)]
+
+        paths = []
+        exceptions = []
+        for future in self.futures:
+            try:
+                paths.append(future.result())
+            except ChildProcessError as exception:
+                exceptions.append(exception)
+
+        self.futures = []
+        if exceptions:
+            raise exceptions[0]
+
+        return paths
+
+    def close(self) -> None:
+        try:
+            self.wait()
+        finally:
+            if self.pool is not None:
+                self.pool.shutdown()
+                self.pool = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
@@ -0,0 +1,66 @@
+import os
+import tempfile
+
+import pytest
+from click.testing import CliRunner
+
+from labor_regelungstechnik.benchmark import run_benchmarks
+from labor_regelungstechnik.benchmark import compare_results
+from labor_regelungstechnik.benchmark import save_results, load_results
+from labor_regelungstechnik.cli import cli
+
+
+def make_results(**values) -> dict:
+    return {
+        'commit': None,
+        'results': {
+            name: {'value': value, 'unit': unit, 'higher_is_better': unit == 'calls/s'}
+            for name, (value, unit) in values.items()
+        }
+    }
+
+
+def test_compare_results_flags_regressions():
+    baseline = make_results(rhs=(1000, 'calls/s'), simulation=(1.0, 's'), objective=(1.0, 's'))
+    current = make_results(rhs=(800, 'calls/s'), simulation=(1.5, 's'), objective=(1.05, 's'))
+
+    comparisons = {comparison['name']: comparison for comparison in compare_results(baseline, current)}
+    assert comparisons['rhs']['regression']
+    assert comparisons['simulation']['regression']
+    # A change within the threshold is considered noise
+    assert not comparisons['objective']['regression']
+    assert comparisons['simulation']['change'] == pytest.approx(0.5)
+
+    # An improvement is never a regression
+    comparisons = compare_results(current, baseline)
+    assert not any(comparison['regression'] for comparison in comparisons)
+
+
+def test_run_benchmarks_basically_works():
+    results = run_benchmarks(['rhs/single_pendulum_nonlinear_cse'], repeat=1)
+    assert set(results.keys()) == {'commit', 'timestamp', 'python', 'platform', 'results'}
+    result = results['results']['rhs/single_pendulum_nonlinear_cse']
+    assert result['value'] > 0
+    assert result['unit'] == 'calls/s'
+
+    with tempfile.TemporaryDirectory() as path:
+        results_path = os.path.join(path, 'results.json')
+        save_results(results_path, results)
+        assert load_results(results_path) == results
+
+    with pytest.raises(ValueError):
+        run_benchmarks(['does_not_exist'])
+
+
+def test_compare_benchmarks_command_exit_code():
+    runner = CliRunner()
+    with runner.isolated_filesystem():
+        save_results('baseline.json', make_results(rhs=(1000, 'calls/s')))
+        save_results('current.json', make_results(rhs=(500, 'calls/s')))
+
+        result = runner.invoke(cli, ['compare-benchmarks', 'baseline.json', 'baseline.json'])
+        assert result.exit_code == 0
+
+        result = runner.invoke(cli, ['compare-benchmarks', 'baseline.json', 'current.json'])
+        assert result.exit_code == 1
+        assert 'REGRESSION' in result.output
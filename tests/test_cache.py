@@ -0,0 +1,82 @@
+import os
+import tempfile
+
+import numpy as np
+
+from labor_regelungstechnik.cache import hash_parts
+from labor_regelungstechnik.cache import SimulationCache
+from labor_regelungstechnik.cache import ArtifactCache
+
+
+def test_hash_parts():
+    array = np.arange(10, dtype=float)
+    key = hash_parts('model', {'k_x': 250, 'k_l': 500.0}, array, ('RK45', None))
+
+    # Numbers are hashed as floats and the order of the dict items does not matter
+    assert key == hash_parts('model', {'k_l': 500, 'k_x': 250.0}, array.copy(), ('RK45', None))
+    assert key != hash_parts('model', {'k_x': 250, 'k_l': 500.1}, array, ('RK45', None))
+    assert key != hash_parts('model', {'k_x': 250, 'k_l': 500.0}, array + 1e-12, ('RK45', None))
+    assert key != hash_parts('model', {'k_x': 250, 'k_l': 500.0}, array.astype(np.float32), ('RK45', None))
+    assert key != hash_parts('model', {'k_x': 250, 'k_l': 500.0}, array, ('LSODA', None))
+    # Strings are delimited properly
+    assert hash_parts('ab', 'c') != hash_parts('a', 'bc')
+
+
+def test_simulation_cache_lru():
+    # Every value is a bit more than 800 bytes, so only two of them fit into the budget
+    cache = SimulationCache(max_bytes=2000)
+    for key in ('a', 'b', 'c'):
+        cache.put(key, {'simulated': np.zeros(100)})
+        # Accessing "a" makes it the most recently used entry, which is why "b" is evicted instead
+        cache.get('a')
+
+    assert len(cache) == 2
+    assert cache.get('b') is None
+    assert cache.get('a') is not None and cache.get('c') is not None
+    assert cache.num_bytes <= 2000
+
+
+def test_simulation_cache_disk():
+    with tempfile.TemporaryDirectory() as path:
+        cache = SimulationCache(max_bytes=1000, path=path)
+        cache.put('a', {'simulated': np.ones(100)})
+        cache.put('b', {'simulated': np.zeros(100)})
+        assert len(cache) == 1
+        assert len(os.listdir(path)) == 2
+
+        # The evicted entry as well as the entries of a previous run are loaded from the disk tier
+        assert np.all(cache.get('a')['simulated'] == 1)
+        assert cache.disk_hits == 1
+        cache_new = SimulationCache(path=path)
+        assert np.all(cache_new.get('b')['simulated'] == 0)
+        assert cache_new.get('c') is None
+
+
+def test_artifact_cache_stages():
+    calls = []
+
+    def stage(value):
+        calls.append(value)
+        return value * 2
+
+    with tempfile.TemporaryDirectory() as path:
+        cache = ArtifactCache(path)
+        first_key, first = cache.compute('first', ['energy'], lambda: stage(1))
+        _, second = cache.compute('second', [first_key, 'options'], lambda: stage(first))
+        assert (first, second) == (2, 4)
+        assert cache.computed == ['first', 'second']
+
+        # A new run with the same inputs loads everything, while changing only the inputs of the second
+        # stage recomputes just that one
+        cache = ArtifactCache(path)
+        first_key, first = cache.compute('first', ['energy'], lambda: stage(1))
+        _, second = cache.compute('second', [first_key, 'other options'], lambda: stage(first))
+        assert cache.loaded == ['first']
+        assert cache.computed == ['second']
+        assert calls == [1, 2, 2]
+
+    # Without a path nothing is cached at all
+    cache = ArtifactCache(None)
+    cache.compute('first', ['energy'], lambda: stage(1))
+    cache.compute('first', ['energy'], lambda: stage(1))
+    assert cache.computed == ['first', 'first']
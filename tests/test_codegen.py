@@ -0,0 +1,359 @@
+import ast
+import inspect
+import os
+import tempfile
+
+import numpy as np
+import pytest
+import sympy as sp
+
+import labor_regelungstechnik.systems.single_pendulum_nonlinear as single_pendulum_nonlinear
+import labor_regelungstechnik.systems.single_pendulum_nonlinear_cse as single_pendulum_nonlinear_cse
+import labor_regelungstechnik.systems.single_pendulum_nonlinear_batch as single_pendulum_nonlinear_batch
+import labor_regelungstechnik.systems.single_pendulum_nonlinear_mass_matrix as mass_matrix_system
+import labor_regelungstechnik.systems.single_pendulum_nonlinear_numba as numba_system
+from labor_regelungstechnik.codegen import simplify_trigonometric
+from labor_regelungstechnik.codegen import reduce_equations
+from labor_regelungstechnik.codegen import render_system_code
+from labor_regelungstechnik.codegen import load_system_equations, save_system_equations, specialize_system
+from labor_regelungstechnik.utils import PATH
+
+# The default parameters of the systems module. These are explicitly passed to both systems because the
+# "output" function of the original module uses different defaults than its "system" function.
+PARAMS = {
+    'm_x': 40, 'm_y': 3, 'y_max': 1.2, 'g': 9.81, 'c_varphi': 0.12, 'c_x': 0.5,
+    'k_x': 250, 'k_l': 500, 'l_0': 0.23, 'k_vx': 3.6, 'k_vl': -1.65, 'k_phi': 0.5
+}
+
+
+def toy_solved_dict():
+    x, v, m, k = sp.symbols('x v m k')
+    denominator = m * sp.sin(x) ** 2 + m * sp.cos(x) ** 2 + k
+    return {
+        sp.Symbol('d_v'): -k * x / denominator + sp.sin(x) / denominator,
+        sp.Symbol('d_x'): v + sp.sin(x) / denominator,
+    }
+
+
+def test_simplify_trigonometric():
+    x, m = sp.symbols('x m')
+    expression = simplify_trigonometric(m / (m * sp.sin(x) ** 2 + m * sp.cos(x) ** 2))
+    assert expression == 1
+
+
+def test_reduce_equations():
+    solved_dict = toy_solved_dict()
+    temporaries, reduced_dict = reduce_equations(solved_dict)
+    assert len(temporaries) != 0
+    assert list(reduced_dict.keys()) == list(solved_dict.keys())
+
+    # Substituting the temporaries back in has to result in the original expressions
+    for symbol, expression in reduced_dict.items():
+        for temporary, value in reversed(temporaries):
+            expression = expression.subs(temporary, value)
+
+        difference = sp.simplify(expression - solved_dict[symbol])
+        assert difference == 0
+
+
+def test_render_system_code_cse():
+    code = render_system_code(
+        toy_solved_dict(),
+        {'m': 1.0, 'k': 2.0},
+        mode='cse',
+        input_names=('u', ),
+        output_names=('x', ),
+        output_expressions=('x', ),
+    )
+    assert 'common subexpressions' in code
+
+    namespace = {}
+    exec(code, namespace)
+    # The states are ordered alphabetically by the derivative symbols: (v, x)
+    derivatives = namespace['system'](0, [0.5, 1.0], [0], {})
+    assert np.isclose(derivatives[0], (-2.0 * 1.0 + np.sin(1.0)) / 3.0)
+    assert np.isclose(derivatives[1], 0.5 + np.sin(1.0) / 3.0)
+
+
+def test_single_pendulum_nonlinear_cse_matches_plain():
+    states = np.random.uniform(low=[-1, -1, 0.0, -1, -1, 0.0],
+                               high=[1, 1, 1.3, 1, 1, 2.5],
+                               size=(50, 6))
+    inputs = np.random.uniform(-1, 1, size=(50, 2))
+    for state, input in zip(states, inputs):
+        expected = single_pendulum_nonlinear.system(0, state, input, PARAMS)
+        actual = single_pendulum_nonlinear_cse.system(0, state, input, PARAMS)
+        assert np.allclose(actual, expected)
+
+        expected = single_pendulum_nonlinear.output(0, state, input, PARAMS)
+        actual = single_pendulum_nonlinear_cse.output(0, state, input, PARAMS)
+        assert np.allclose(actual, expected)
+
+
+def test_single_pendulum_nonlinear_batch_matches_scalar():
+    num = 50
+    # The rail limits are deliberately violated for some of the states to check the np.where masks
+    states = np.random.uniform(low=[-1, -1, -0.2, -1, -1, -0.2],
+                               high=[1, 1, 1.5, 1, 1, 2.7],
+                               size=(num, 6))
+    inputs = np.random.uniform(-1, 1, size=(num, 2))
+    m_x = np.random.uniform(30, 50, size=num)
+    c_varphi = np.random.uniform(0.05, 0.5, size=num)
+
+    params = {**PARAMS, 'm_x': m_x, 'c_varphi': c_varphi}
+    derivatives = single_pendulum_nonlinear_batch.system(0, states.T, inputs.T, params)
+    outputs = single_pendulum_nonlinear_batch.output(0, states.T, inputs.T, params)
+    assert derivatives.shape == (6, num)
+    assert outputs.shape == (3, num)
+
+    for i in range(num):
+        params_scalar = {**PARAMS, 'm_x': m_x[i], 'c_varphi': c_varphi[i]}
+        expected = single_pendulum_nonlinear_cse.system(0, states[i], inputs[i], params_scalar)
+        assert np.allclose(derivatives[:, i], expected)
+
+        expected = single_pendulum_nonlinear_cse.output(0, states[i], inputs[i], params_scalar)
+        assert np.allclose(outputs[:, i], expected)
+
+
+def test_single_pendulum_nonlinear_cse_jacobians():
+    # The analytical jacobians are compared with central finite differences of the system function
+    system = single_pendulum_nonlinear_cse.system
+    states = np.random.uniform(low=[-1, -1, 0.1, -1, -1, 0.1],
+                               high=[1, 1, 1.2, 1, 1, 2.4],
+                               size=(20, 6))
+    inputs = np.random.uniform(-1, 1, size=(20, 2))
+    h = 1e-6
+    for state, input in zip(states, inputs):
+        jacobian_states = single_pendulum_nonlinear_cse.jacobian_states(0, state, input, PARAMS)
+        jacobian_inputs = single_pendulum_nonlinear_cse.jacobian_inputs(0, state, input, PARAMS)
+        assert jacobian_states.shape == (6, 6)
+        assert jacobian_inputs.shape == (6, 2)
+
+        expected = np.stack([(np.array(system(0, state + h * e, input, PARAMS)) -
+                              np.array(system(0, state - h * e, input, PARAMS))) / (2 * h)
+                             for e in np.eye(6)], axis=1)
+        assert np.allclose(jacobian_states, expected, rtol=1e-5, atol=1e-4)
+
+        expected = np.stack([(np.array(system(0, state, input + h * e, PARAMS)) -
+                              np.array(system(0, state, input - h * e, PARAMS))) / (2 * h)
+                             for e in np.eye(2)], axis=1)
+        assert np.allclose(jacobian_inputs, expected, rtol=1e-5, atol=1e-4)
+
+    # Outside of the rail limits the inputs have no effect
+    state = np.array([0, 0, 0.5, 0, 0, 2.7])
+    jacobian_inputs = single_pendulum_nonlinear_cse.jacobian_inputs(0, state, [0.5, 0.5], PARAMS)
+    assert np.allclose(jacobian_inputs[:, 0], 0)
+
+
+def test_render_system_code_jacobian():
+    for mode in ('plain', 'cse'):
+        code = render_system_code(
+            toy_solved_dict(),
+            {'m': 1.0, 'k': 2.0},
+            mode=mode,
+            jacobian=True,
+            input_names=('u', ),
+            input_expression_map={'u': '3 * inputs[0]'},
+            state_limit_map={},
+            output_names=('x', ),
+            output_expressions=('x', ),
+        )
+        namespace = {}
+        exec(code, namespace)
+        # d_v = (sin(x) - k x) / (m + k) and d_x = v + sin(x) / (m + k), neither depends on the input
+        jacobian = namespace['jacobian_states'](0, [0.5, 1.0], [0], {})
+        assert np.allclose(jacobian, [[0, (np.cos(1.0) - 2.0) / 3.0], [1, np.cos(1.0) / 3.0]])
+        assert np.allclose(namespace['jacobian_inputs'](0, [0.5, 1.0], [0], {}), 0)
+
+
+def test_single_pendulum_nonlinear_mass_matrix_matches_cse():
+    states = np.random.uniform(low=[-1, -1, 0.0, -1, -1, 0.0],
+                               high=[1, 1, 1.3, 1, 1, 2.5],
+                               size=(50, 6))
+    inputs = np.random.uniform(-1, 1, size=(50, 2))
+    for state, input in zip(states, inputs):
+        expected = single_pendulum_nonlinear_cse.system(0, state, input, PARAMS)
+        actual = mass_matrix_system.system(0, state, input, PARAMS)
+        assert np.allclose(actual, expected)
+
+        # The unrolled solution has to be the same as the one of the numeric linear system
+        mass_matrix, forcing = mass_matrix_system.mass_matrix_form(0, state, input, PARAMS)
+        accelerations = np.linalg.solve(mass_matrix, forcing)
+        assert np.allclose(accelerations, [actual[1], actual[0], actual[3]])
+
+
+def test_single_pendulum_nonlinear_numba_matches_cse():
+    states = np.random.uniform(low=[-1, -1, -0.5, -1, -1, -0.5],
+                               high=[1, 1, 1.5, 1, 1, 3.0],
+                               size=(50, 6))
+    inputs = np.random.uniform(-1, 1, size=(50, 2))
+    params = {**PARAMS, 'k_x': 180}
+    for state, input in zip(states, inputs):
+        assert np.allclose(numba_system.system(0, state, input, params),
+                           single_pendulum_nonlinear_cse.system(0, state, input, params))
+        assert np.allclose(numba_system.output(0, state, input, params),
+                           single_pendulum_nonlinear_cse.output(0, state, input, params))
+
+    # The packed params are only reused as long as the params do not change
+    assert numba_system.pack_params(params)[numba_system.param_names.index('k_x')] == 180
+    assert numba_system.pack_params({})[numba_system.param_names.index('k_x')] == PARAMS['k_x']
+
+    rhs = numba_system.make_rhs(params, lambda time: inputs[0])
+    expected = single_pendulum_nonlinear_cse.system(0, states[0], inputs[0], params)
+    assert np.allclose(rhs(0.0, states[0]), expected)
+
+
+def test_save_and_load_system_equations():
+    solved_dict = toy_solved_dict()
+    with tempfile.TemporaryDirectory() as path:
+        file_path = os.path.join(path, 'system.json')
+        save_system_equations(file_path, solved_dict, {'m': 1.0, 'k': 2.0},
+                              input_names=('u', ), state_limit_map={'x': ('v', 0, 1)}, hybrid=True)
+        loaded_dict, params_default_map, kwargs = load_system_equations(file_path)
+
+    assert loaded_dict == solved_dict
+    assert params_default_map == {'m': 1.0, 'k': 2.0}
+    # Only the lists are converted back into tuples, scalar options such as "hybrid" are kept as they are
+    assert kwargs['input_names'] == ('u', )
+    assert kwargs['hybrid'] is True
+    assert kwargs['state_limit_map'] == {'x': ['v', 0, 1]}
+
+
+def test_specialize_system_matches_cse():
+    solved_dict, params_default_map, kwargs = load_system_equations(
+        os.path.join(PATH, 'systems', 'single_pendulum_nonlinear.json')
+    )
+    assert params_default_map == PARAMS
+
+    free_params = {'m_x': 35, 'm_y': 2.5, 'c_varphi': 0.2}
+    frozen_params = {name: value for name, value in PARAMS.items() if name not in free_params}
+    with tempfile.TemporaryDirectory() as path:
+        module = specialize_system(solved_dict, params_default_map, frozen_params, cache_path=path, **kwargs)
+        assert module.param_names == tuple(free_params.keys())
+        assert len(os.listdir(path)) == 1
+        # The specializations are cached per frozen parameter set
+        assert specialize_system(solved_dict, params_default_map, frozen_params, **kwargs) is module
+
+    param_indices = [single_pendulum_nonlinear_cse.param_names.index(name) for name in free_params]
+    states = np.random.uniform(low=[-1, -1, -0.5, -1, -1, -0.5],
+                               high=[1, 1, 1.5, 1, 1, 3.0],
+                               size=(20, 6))
+    inputs = np.random.uniform(-1, 1, size=(20, 2))
+    for state, input in zip(states, inputs):
+        for name in ('system', 'output', 'jacobian_states', 'jacobian_inputs'):
+            assert np.allclose(getattr(module, name)(0, state, input, free_params),
+                               getattr(single_pendulum_nonlinear_cse, name)(0, state, input, free_params))
+
+        expected = single_pendulum_nonlinear_cse.jacobian_params(0, state, input, free_params)
+        assert np.allclose(module.jacobian_params(0, state, input, free_params), expected[:, param_indices])
+
+    with pytest.raises(ValueError):
+        specialize_system(solved_dict, params_default_map, {'does_not_exist': 1.0}, **kwargs)
+
+
+@pytest.mark.parametrize('module_name, template_name, jacobian', [
+    ('single_pendulum_nonlinear_cse', 'system.py.j2', True),
+    ('single_pendulum_nonlinear_batch', 'system_batch.py.j2', False),
+    ('single_pendulum_nonlinear_numba', 'system_numba.py.j2', False),
+])
+def test_generated_systems_match_committed_modules(module_name, template_name, jacobian):
+    # The committed system modules are artifacts of the "variational_modelling" experiment. Rendering them
+    # again from the saved equations has to reproduce them exactly, otherwise they have drifted apart from
+    # the generator (or from each other).
+    solved_dict, params_default_map, kwargs = load_system_equations(
+        os.path.join(PATH, 'systems', 'single_pendulum_nonlinear.json')
+    )
+    code = render_system_code(solved_dict, params_default_map, mode='cse', jacobian=jacobian,
+                              template_name=template_name, **kwargs)
+    with open(os.path.join(PATH, 'systems', f'{module_name}.py'), mode='r') as file:
+        assert code == file.read()
+
+
+def test_generated_systems_use_experiment_defaults():
+    # The experiment is not imported here, because that would run it. Instead, the default parameters are
+    # read from its source, where they are a plain dict literal.
+    with open(os.path.join(PATH, 'experiments', 'variational_modelling.py'), mode='r') as file:
+        tree = ast.parse(file.read())
+
+    assignments = {node.targets[0].id: node.value for node in tree.body
+                   if isinstance(node, ast.Assign) and isinstance(node.targets[0], ast.Name)}
+    experiment_defaults = ast.literal_eval(assignments['PARAMS_DEFAULT_MAP'])
+
+    _, params_default_map, _ = load_system_equations(
+        os.path.join(PATH, 'systems', 'single_pendulum_nonlinear.json')
+    )
+    assert experiment_defaults == params_default_map
+
+    # The mass matrix module is rendered from a different form of the equations, which is why it is not
+    # compared to the json as code. Without any params it has to fall back to the same defaults though.
+    states = np.random.uniform(low=[-1, -1, 0.0, -1, -1, 0.0],
+                               high=[1, 1, 1.3, 1, 1, 2.5],
+                               size=(10, 6))
+    inputs = np.random.uniform(-1, 1, size=(10, 2))
+    for state, input in zip(states, inputs):
+        assert np.allclose(mass_matrix_system.system(0, state, input, {}),
+                           single_pendulum_nonlinear_cse.system(0, state, input, {}))
+
+
+def test_specialize_system_numba():
+    solved_dict, params_default_map, kwargs = load_system_equations(
+        os.path.join(PATH, 'systems', 'single_pendulum_nonlinear.json')
+    )
+    frozen_params = {'g': 9.81, 'l_0': 0.23}
+    # numba can not cache the functions of a module which only exists in memory, which is why the disk
+    # cache is only enabled if the module is stored in the cache path
+    module = specialize_system(solved_dict, params_default_map, frozen_params,
+                               template_name='system_numba.py.j2', jacobian=False, **kwargs)
+    assert '@njit(cache=False)' in inspect.getsource(module)
+    with tempfile.TemporaryDirectory() as path:
+        cached_module = specialize_system(solved_dict, params_default_map, {'g': 9.81},
+                                          template_name='system_numba.py.j2', jacobian=False,
+                                          cache_path=path, **kwargs)
+        assert '@njit(cache=True)' in inspect.getsource(cached_module)
+
+    states = np.random.uniform(low=[-1, -1, -0.5, -1, -1, -0.5],
+                               high=[1, 1, 1.5, 1, 1, 3.0],
+                               size=(10, 6))
+    inputs = np.random.uniform(-1, 1, size=(10, 2))
+    for state, input in zip(states, inputs):
+        assert np.allclose(module.system(0, state, input, PARAMS),
+                           single_pendulum_nonlinear_cse.system(0, state, input, PARAMS))
+
+
+def test_numba_pack_params_numpy_values():
+    # The optimizers pass the params as numpy scalars or 0-d arrays, whose comparison must not be ambiguous
+    params = {**PARAMS, 'm_x': np.float64(35.0), 'c_varphi': np.array(0.2)}
+    vector = numba_system.pack_params(params)
+    assert vector[numba_system.param_names.index('m_x')] == 35.0
+    assert vector[numba_system.param_names.index('c_varphi')] == 0.2
+
+    vector = numba_system.pack_params({**params, 'c_varphi': np.array(0.3)})
+    assert vector[numba_system.param_names.index('c_varphi')] == 0.3
+
+    # The values are compared and not the objects, so even an array which is changed in place is noticed
+    value = np.array(0.4)
+    numba_system.pack_params({**PARAMS, 'c_varphi': value})
+    value[()] = 0.5
+    vector = numba_system.pack_params({**PARAMS, 'c_varphi': value})
+    assert vector[numba_system.param_names.index('c_varphi')] == 0.5
+
+
+def test_numba_system_compiled():
+    pytest.importorskip('numba')
+    # Only with numba installed are "system_array" and "output_array" actually JIT compiled
+    assert hasattr(numba_system.system_array, 'py_func')
+
+    params = {**PARAMS, 'm_x': np.float64(35.0), 'c_varphi': np.array(0.2)}
+    states = np.random.uniform(low=[-1, -1, -0.5, -1, -1, -0.5],
+                               high=[1, 1, 1.5, 1, 1, 3.0],
+                               size=(10, 6))
+    inputs = np.random.uniform(-1, 1, size=(10, 2))
+    for state, input in zip(states, inputs):
+        assert np.allclose(numba_system.system(0, state, input, params),
+                           single_pendulum_nonlinear_cse.system(0, state, input, params))
+        assert np.allclose(numba_system.output(0, state, input, params),
+                           single_pendulum_nonlinear_cse.output(0, state, input, params))
+
+    rhs = numba_system.make_rhs(params, lambda time: inputs[0])
+    assert np.allclose(rhs(0.0, states[0]),
+                       single_pendulum_nonlinear_cse.system(0, states[0], inputs[0], params))
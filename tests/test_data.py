@@ -0,0 +1,92 @@
+import os
+import json
+import tempfile
+
+import numpy as np
+import pytest
+
+from labor_regelungstechnik.data import prepare_measurement
+from labor_regelungstechnik.data import measured_states
+from labor_regelungstechnik.data import MeasurementStore, STORE_EXTENSION, STORE_VERSION
+from labor_regelungstechnik.data import save_measurement_store
+from labor_regelungstechnik.data import convert_json_to_store, load_measurements
+
+
+def test_prepare_measurement():
+    timestamps = [0.0, 0.1, 0.2, 0.3, 0.4, 0.5]
+    measurement = {
+        'timestamps': timestamps,
+        'x_const_mess': [1.0] * 6,
+        'y_const_mess': [2.0] * 6,
+        'x_out_mess': [0.0, 0.1, 0.2, 0.3, 0.4, 0.5],
+        'y_out_mess': [1.0] * 6,
+        'phi_out_mess': [0.0, 0.0, 0.0, 90.0, 0.0, 0.0],
+    }
+    prepared = prepare_measurement(measurement, input_delays=(0.3, 0.1))
+    assert len(prepared) == 6
+    assert prepared.inputs.shape == (2, 6)
+    assert prepared.inputs.flags['C_CONTIGUOUS']
+    assert np.allclose(prepared.inputs[0], [0, 0, 0, 1, 1, 1])
+    assert np.allclose(prepared.inputs[1], [0, 2, 2, 2, 2, 2])
+    # The initial conditions are taken from the sample with the index 3 and the angle is converted
+    assert np.allclose(prepared.initial_states, [0, 0, 1.0, 0, np.pi / 2, 0.3])
+    assert prepared.targets.shape == (3, 6)
+
+    # The error for outputs which are exactly the targets has to be zero
+    assert prepared.error(prepared.targets) == 0
+    outputs = prepared.targets.copy()
+    outputs[2] += 1
+    assert np.isclose(prepared.error(outputs), 1.0)
+
+    # The measured states at the initial index are exactly the initial conditions, except for those which
+    # are not measured at all
+    states = measured_states(prepared, 3)
+    assert np.all(np.isnan(states[[0, 1, 3]]))
+    assert np.allclose(states[[2, 4, 5]], prepared.initial_states[[2, 4, 5]])
+
+
+def test_measurement_store():
+    measurements = [
+        {'timestamps': [0.0, 0.01, 0.02], 'x': [1.0, 2.0, 3.0], 'y': [4.0, 5.0, 6.0]},
+        {'timestamps': [0.0, 0.01], 'x': [7.0, 8.0], 'y': [9.0, 10.0]},
+    ]
+    with tempfile.TemporaryDirectory() as path:
+        json_path = os.path.join(path, 'measurements.json')
+        with open(json_path, mode='w') as file:
+            json.dump(measurements, file)
+
+        store_path = convert_json_to_store(json_path)
+        assert store_path.endswith(STORE_EXTENSION)
+
+        for mmap in (True, False):
+            store = MeasurementStore(store_path, mmap=mmap)
+            assert len(store) == 2
+            assert store.columns == ['timestamps', 'x', 'y']
+            for measurement, loaded in zip(measurements, store):
+                for key, values in measurement.items():
+                    assert np.allclose(loaded[key], values)
+
+            assert np.allclose(store.column('x'), [1, 2, 3, 7, 8])
+            del store
+
+        # Both formats have to result in the same measurements
+        for file_path in (json_path, store_path):
+            loaded = load_measurements(file_path)
+            assert len(loaded) == 2
+            assert np.allclose(loaded[1]['y'], [9.0, 10.0])
+
+
+def test_measurement_store_version(monkeypatch):
+    measurements = [{'timestamps': [0.0, 0.01], 'x': [1.0, 2.0]}]
+    with tempfile.TemporaryDirectory() as path:
+        store_path = os.path.join(path, f'measurements{STORE_EXTENSION}')
+        # A store which was written by a different version of the code must not be read
+        monkeypatch.setattr('labor_regelungstechnik.data.STORE_VERSION', STORE_VERSION + 1)
+        save_measurement_store(store_path, measurements)
+        monkeypatch.undo()
+
+        with pytest.raises(ValueError, match='version'):
+            MeasurementStore(store_path)
+
+        save_measurement_store(store_path, measurements)
+        assert MeasurementStore(store_path).header['version'] == STORE_VERSION
@@ -0,0 +1,141 @@
+import os
+import json
+import tempfile
+from collections import defaultdict
+
+import numpy as np
+
+from labor_regelungstechnik.utils import MEASUREMENTS_PATH
+from labor_regelungstechnik.extraction import find_segments
+from labor_regelungstechnik.extraction import extract_segments
+from labor_regelungstechnik.extraction import iter_segments
+from labor_regelungstechnik.extraction import stream_measurements
+from labor_regelungstechnik.extraction import extract_recordings
+from labor_regelungstechnik.extraction import SOURCE_INDEX_KEY, SEGMENT_INDEX_KEY
+
+
+def extract_segments_reference(timestamps, signal_map):
+    # This is the original, sample by sample implementation of the segmentation which was used to create
+    # the measurements json file.
+    measurements = []
+    measurement_data = defaultdict(list)
+    start_time = None
+    for i in range(len(timestamps)):
+        t = timestamps[i]
+
+        if start_time is None and signal_map['switch_mess'][i] < 0.1:
+            start_time = t
+
+        if start_time is not None and signal_map['switch_mess'][i] < 0.1:
+            measurement_data['timestamps'].append(t - start_time)
+            for name, samples in signal_map.items():
+                if name == 'y_out_mess':
+                    value = 1.3 - samples[i]
+                else:
+                    value = samples[i]
+
+                measurement_data[name].append(value)
+
+        if start_time is not None and signal_map['switch_mess'][i] > 0.9:
+            measurements.append(dict(measurement_data))
+            measurement_data = defaultdict(list)
+            start_time = None
+
+    return measurements
+
+
+def test_find_segments():
+    switch = np.array([1, 1, 0, 0, 0, 1, 1, 0, 0.5, 0, 1, 0, 0])
+    segments = find_segments(switch)
+    # The last segment is never closed and thus discarded
+    assert segments == [(2, 5), (7, 10)]
+
+    # A recording which starts right within a measurement
+    assert find_segments(np.array([0, 0, 1, 1])) == [(0, 2)]
+    assert find_segments(np.array([1, 1, 1])) == []
+
+
+def test_extract_segments_matches_reference():
+    num = 5000
+    timestamps = np.arange(num) * 0.01
+    # A switch signal with random segment lengths and some noise samples in between the two thresholds
+    switch = np.repeat(np.random.randint(0, 2, size=num // 50), 50).astype(float)
+    switch[np.random.randint(0, num, size=20)] = 0.5
+    signal_map = {
+        'switch_mess': switch,
+        'x_out_mess': np.random.uniform(0, 2.5, size=num),
+        'y_out_mess': np.random.uniform(0, 1.3, size=num),
+    }
+
+    measurements = extract_segments(timestamps, signal_map)
+    reference = extract_segments_reference(timestamps, signal_map)
+    assert len(measurements) == len(reference)
+    for measurement, measurement_reference in zip(measurements, reference):
+        assert list(measurement.keys()) == list(measurement_reference.keys())
+        for key, values in measurement_reference.items():
+            assert np.allclose(measurement[key], values)
+
+
+def test_iter_segments_chunked_matches_whole():
+    num = 5000
+    timestamps = np.arange(num) * 0.01
+    switch = np.repeat(np.random.randint(0, 2, size=num // 50), 50).astype(float)
+    switch[np.random.randint(0, num, size=20)] = 0.5
+    signal_map = {
+        'switch_mess': switch,
+        'y_out_mess': np.random.uniform(0, 1.3, size=num),
+    }
+    expected = extract_segments(timestamps, signal_map)
+
+    # Some of the chunk sizes are chosen such that chunk boundaries coincide with segment boundaries
+    for chunk_size in (1, 7, 50, 333, num):
+        chunks = [(timestamps[i:i + chunk_size], {key: values[i:i + chunk_size]
+                                                  for key, values in signal_map.items()})
+                  for i in range(0, num, chunk_size)]
+        measurements = list(iter_segments(chunks))
+        assert len(measurements) == len(expected)
+        for measurement, measurement_expected in zip(measurements, expected):
+            for key, values in measurement_expected.items():
+                assert np.allclose(measurement[key], values)
+
+
+def test_stream_measurements_reproduces_json():
+    with open(os.path.join(MEASUREMENTS_PATH, 'measurements_001.json')) as file:
+        expected = json.loads(file.read())
+
+    path = os.path.join(MEASUREMENTS_PATH, 'messungen_18_11_22.mf4')
+    measurements = list(stream_measurements(path, chunk_size=2000))
+    assert len(measurements) == len(expected)
+    for measurement, measurement_expected in zip(measurements, expected):
+        assert list(measurement.keys()) == list(measurement_expected.keys())
+        for key, values in measurement_expected.items():
+            assert np.allclose(measurement[key], values)
+
+
+def test_extract_recordings():
+    messages = []
+    with tempfile.TemporaryDirectory() as cache_path:
+        measurements, paths = extract_recordings(MEASUREMENTS_PATH, cache_path, num_workers=2,
+                                                 logger=messages.append)
+        assert [os.path.basename(path) for path in paths] == ['messungen_17_11_22.mf4',
+                                                              'messungen_18_11_22.mf4']
+        assert len(os.listdir(cache_path)) == 2
+
+        # The measurements of the second recording are exactly those of the json file
+        with open(os.path.join(MEASUREMENTS_PATH, 'measurements_001.json')) as file:
+            expected = json.loads(file.read())
+
+        measurements_second = [m for m in measurements if m[SOURCE_INDEX_KEY][0] == 1]
+        assert len(measurements_second) == len(expected)
+        for segment_index, (measurement, measurement_expected) in enumerate(zip(measurements_second,
+                                                                                expected)):
+            assert np.all(measurement[SEGMENT_INDEX_KEY] == segment_index)
+            assert measurement[SEGMENT_INDEX_KEY].dtype == np.int64
+            for key, values in measurement_expected.items():
+                assert np.allclose(measurement[key], values)
+
+        # In the second run all the recordings are unchanged and have to be loaded from the cache
+        messages.clear()
+        measurements_cached, _ = extract_recordings(MEASUREMENTS_PATH, cache_path, logger=messages.append)
+        assert all(message.startswith('skipping') for message in messages)
+        assert len(measurements_cached) == len(measurements)
@@ -0,0 +1,56 @@
+import sys
+import json
+import subprocess
+
+import pytest
+
+# The heavy dependencies which have to be imported lazily and the modules of the package which must not
+# import them. The generated system modules in particular should only cost the numpy import, such that
+# they can be used in worker processes and for simple simulations without any noticeable startup time.
+HEAVY_MODULES = ('control', 'matplotlib', 'jinja2', 'sympy', 'asammdf')
+LIGHT_MODULES = {
+    'labor_regelungstechnik.systems.single_pendulum_nonlinear_cse': HEAVY_MODULES,
+    'labor_regelungstechnik.systems.single_pendulum_nonlinear_mass_matrix': HEAVY_MODULES,
+    'labor_regelungstechnik.utils': HEAVY_MODULES,
+    'labor_regelungstechnik.optimization': HEAVY_MODULES,
+    'labor_regelungstechnik.sensitivity': HEAVY_MODULES,
+    'labor_regelungstechnik.plotting': HEAVY_MODULES,
+    'labor_regelungstechnik.extraction': HEAVY_MODULES,
+}
+# The budget for the import time of a single light module in seconds. Importing "control" alone takes about
+# a second, so this is very generous for the modules themselves, but still catches any eager heavy import.
+IMPORT_TIME_BUDGET = 0.6
+
+SCRIPT = """
+import sys, time, json
+start = time.perf_counter()
+import {module}
+duration = time.perf_counter() - start
+print(json.dumps({{'duration': duration, 'modules': sorted(sys.modules.keys())}}))
+"""
+
+
+def measure_import(module: str) -> dict:
+    # Every import is measured in a fresh interpreter, since the test process itself has already imported
+    # everything
+    proc = subprocess.run([sys.executable, '-c', SCRIPT.format(module=module)],
+                          stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True)
+    return json.loads(proc.stdout.decode().splitlines()[-1])
+
+
+@pytest.mark.parametrize('module', LIGHT_MODULES.keys())
+def test_light_module_imports(module):
+    result = measure_import(module)
+    imported = [name for name in LIGHT_MODULES[module] if name in result['modules']]
+    assert imported == [], f'"{module}" eagerly imports {imported}'
+    assert result['duration'] < IMPORT_TIME_BUDGET
+
+
+def test_lazy_attributes():
+    # The lazily created objects are still available as module attributes
+    from labor_regelungstechnik.utils import TEMPLATE_ENV
+    from labor_regelungstechnik.systems.single_pendulum_nonlinear_cse import io_system
+
+    assert TEMPLATE_ENV.get_template('system.py.j2') is not None
+    assert io_system.nstates == 6
+    assert io_system.ninputs == 2
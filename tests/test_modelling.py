@@ -0,0 +1,53 @@
+import sympy as sp
+import sympy.physics.mechanics as spd
+
+from labor_regelungstechnik.modelling import derive_lagrange_equations
+from labor_regelungstechnik.modelling import substitute_derivatives
+from labor_regelungstechnik.modelling import to_numeric_equations
+from labor_regelungstechnik.modelling import solve_numeric_system
+from labor_regelungstechnik.modelling import derive_mass_matrix_form
+
+
+def test_modelling_stages_simple_pendulum():
+    # A simple damped pendulum, for which the resulting equation is known: phi'' = -g/l sin(phi) - c phi'
+    t = sp.Symbol('t')
+    m, l, g, c = sp.symbols('m l g c', positive=True)
+    phi = spd.dynamicsymbols('phi')
+    Phi = spd.dynamicsymbols('Phi')
+
+    energy = sp.Rational(1, 2) * m * l ** 2 * phi.diff(t) ** 2
+    general_coordinates_map = {str(phi): phi}
+    coordinate_derivatives_map = {str(phi): Phi}
+    coordinate_rhs_map = {str(phi): -m * g * l * sp.sin(phi) - c * m * l ** 2 * phi.diff(t)}
+
+    equation_map = derive_lagrange_equations(energy, general_coordinates_map, coordinate_rhs_map, t)
+    _, final_equations = substitute_derivatives(equation_map, general_coordinates_map,
+                                                coordinate_derivatives_map, t)
+    numeric_equations, derivative_symbols = to_numeric_equations(final_equations, general_coordinates_map,
+                                                                 coordinate_derivatives_map, t)
+    solved_dict = solve_numeric_system(numeric_equations, derivative_symbols)
+
+    phi_, Phi_ = sp.symbols('phi Phi')
+    assert list(solved_dict.keys()) == [sp.Symbol('d_Phi'), sp.Symbol('d_phi')]
+    assert sp.simplify(solved_dict[sp.Symbol('d_Phi')] - (-g / l * sp.sin(phi_) - c * Phi_)) == 0
+    assert solved_dict[sp.Symbol('d_phi')] == Phi_
+
+
+def test_derive_mass_matrix_form_simple_pendulum():
+    t = sp.Symbol('t')
+    m, l, g, c = sp.symbols('m l g c', positive=True)
+    phi = spd.dynamicsymbols('phi')
+    Phi = spd.dynamicsymbols('Phi')
+
+    acceleration_symbols, mass_matrix, forcing_vector, kinematic_dict = derive_mass_matrix_form(
+        sp.Rational(1, 2) * m * l ** 2 * phi.diff(t) ** 2,
+        {str(phi): phi},
+        {str(phi): Phi},
+        {str(phi): -m * g * l * sp.sin(phi) - c * m * l ** 2 * phi.diff(t)},
+        t,
+    )
+    phi_, Phi_ = sp.symbols('phi Phi')
+    assert acceleration_symbols == [sp.Symbol('d_Phi')]
+    assert kinematic_dict == {sp.Symbol('d_phi'): Phi_}
+    assert mass_matrix == sp.Matrix([[m * l ** 2]])
+    assert sp.simplify(forcing_vector[0] - (-m * g * l * sp.sin(phi_) - c * m * l ** 2 * Phi_)) == 0
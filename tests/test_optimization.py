@@ -0,0 +1,94 @@
+import os
+import json
+
+import numpy as np
+
+import labor_regelungstechnik.systems.single_pendulum_nonlinear_cse as single_pendulum_nonlinear_cse
+from labor_regelungstechnik.utils import MEASUREMENTS_PATH
+from labor_regelungstechnik.data import prepare_measurements
+from labor_regelungstechnik.optimization import create_pool
+from labor_regelungstechnik.optimization import evaluate_measurements
+from labor_regelungstechnik.cache import SimulationCache
+
+MEASUREMENTS_JSON_PATH = os.path.join(MEASUREMENTS_PATH, 'measurements_001.json')
+
+
+def load_measurements(num: int = 3, length: int = 200):
+    with open(MEASUREMENTS_JSON_PATH, mode='r') as file:
+        measurements = json.loads(file.read())
+
+    # Only the beginning of a few measurements is used to keep the tests fast
+    return prepare_measurements([{key: values[:length] for key, values in measurement.items()}
+                                 for measurement in measurements[:num]])
+
+
+def test_evaluate_measurements_pool_matches_serial():
+    measurements = load_measurements()
+    io_system = single_pendulum_nonlinear_cse.io_system
+    params = {'m_x': 35, 'c_varphi': 0.2}
+
+    error, record_dict = evaluate_measurements(io_system, measurements, params)
+    assert len(record_dict) == len(measurements)
+    assert error > 0
+
+    with create_pool(io_system, measurements, 2) as pool:
+        error_pool, record_dict_pool = evaluate_measurements(io_system, measurements, params, pool=pool)
+
+    assert np.isclose(error, error_pool)
+    for index, record in record_dict.items():
+        assert np.allclose(record['simulated'], record_dict_pool[index]['simulated'])
+
+
+def test_evaluate_measurements_implicit_with_jacobian():
+    measurements = load_measurements()
+    io_system = single_pendulum_nonlinear_cse.io_system
+    params = {'m_x': 35, 'c_varphi': 0.2}
+
+    error, record_dict = evaluate_measurements(io_system, measurements, params)
+    error_jacobian, record_dict_jacobian = evaluate_measurements(
+        io_system, measurements, params,
+        method='LSODA',
+        jacobian=single_pendulum_nonlinear_cse.jacobian_states,
+    )
+    assert np.isclose(error, error_jacobian, rtol=1e-2)
+    for index, record in record_dict.items():
+        assert np.allclose(record['simulated'], record_dict_jacobian[index]['simulated'], atol=1e-2)
+
+
+def test_evaluate_measurements_cache():
+    measurements = load_measurements()
+    io_system = single_pendulum_nonlinear_cse.io_system
+    params = {'m_x': 35, 'c_varphi': 0.2}
+    cache = SimulationCache()
+
+    error, record_dict = evaluate_measurements(io_system, measurements, params, cache=cache)
+    assert cache.misses == len(measurements) and cache.hits == 0
+
+    # The same parameters (even though given as floats this time) are now taken from the cache
+    error_cached, record_dict_cached = evaluate_measurements(io_system, measurements,
+                                                             {'c_varphi': 0.2, 'm_x': 35.0}, cache=cache)
+    assert cache.hits == len(measurements)
+    assert error == error_cached
+    for index, record in record_dict.items():
+        assert np.allclose(record['simulated'], record_dict_cached[index]['simulated'])
+        assert np.allclose(record['measured'], record_dict_cached[index]['measured'])
+
+    # Different solver settings are different entries
+    evaluate_measurements(io_system, measurements, params, cache=cache, method='LSODA')
+    assert cache.misses == 2 * len(measurements)
+
+
+def test_evaluate_measurements_hybrid_limits():
+    measurements = load_measurements()
+    io_system = single_pendulum_nonlinear_cse.io_system
+    params = {'m_x': 35, 'c_varphi': 0.2}
+
+    error, record_dict = evaluate_measurements(io_system, measurements, params, method='LSODA')
+    error_hybrid, record_dict_hybrid = evaluate_measurements(
+        io_system, measurements, params,
+        method='LSODA',
+        state_limit_map=single_pendulum_nonlinear_cse.state_limit_map,
+    )
+    assert np.isclose(error, error_hybrid, rtol=1e-2)
+    for index, record in record_dict.items():
+        assert np.allclose(record['simulated'], record_dict_hybrid[index]['simulated'], atol=1e-2)
@@ -0,0 +1,58 @@
+import os
+import tempfile
+
+import numpy as np
+
+from labor_regelungstechnik.plotting import minmax_decimate
+from labor_regelungstechnik.plotting import decimate_pages
+from labor_regelungstechnik.plotting import make_signal_pages
+from labor_regelungstechnik.plotting import PlotQueue
+
+
+def test_minmax_decimate():
+    x = np.linspace(0, 10, 100_001)
+    y = np.sin(x) + np.random.normal(0, 0.1, size=x.shape)
+    # A single spike which has to survive the decimation
+    y[12345] = 10
+
+    x_decimated, y_decimated = minmax_decimate(x, y, max_points=1000)
+    assert len(x_decimated) == len(y_decimated) <= 1000
+    assert np.all(np.diff(x_decimated) > 0)
+    assert np.isclose(np.max(y_decimated), np.max(y))
+    assert np.isclose(np.min(y_decimated), np.min(y))
+
+    # Short traces are not changed at all
+    x_short, y_short = minmax_decimate(x[:500], y[:500], max_points=1000)
+    assert np.all(y_short == y[:500])
+
+
+def test_plot_queue_modes():
+    timestamps = np.linspace(0, 10, 10_000)
+    measurements = [{'timestamps': timestamps, 'x': np.sin(timestamps * i)} for i in range(3)]
+    pages = make_signal_pages(measurements)
+    assert len(pages) == 3
+    assert [row['title'] for row in pages[0]['rows']] == ['timestamps', 'x']
+
+    with tempfile.TemporaryDirectory() as path:
+        for mode in ('sync', 'background', 'disabled'):
+            pdf_path = os.path.join(path, f'{mode}.pdf')
+            with PlotQueue(mode=mode, num_workers=2, max_points=500) as queue:
+                queue.submit(pdf_path, pages)
+
+            assert os.path.exists(pdf_path) == (mode != 'disabled')
+
+
+def test_decimate_pages():
+    timestamps = np.linspace(0, 10, 10_000)
+    pages = make_signal_pages([{'timestamps': timestamps, 'x': np.sin(timestamps)}])
+    pages[0]['rows'][1]['ylim'] = (-1, 1)
+
+    decimated = decimate_pages(pages, max_points=500)
+    assert decimated[0]['title'] == pages[0]['title']
+    assert decimated[0]['rows'][1]['ylim'] == (-1, 1)
+    for row in decimated[0]['rows']:
+        for trace in row['traces']:
+            assert len(trace['x']) == len(trace['y']) <= 500
+
+    # The original pages still contain the full resolution traces
+    assert len(pages[0]['rows'][1]['traces'][0]['y']) == 10_000
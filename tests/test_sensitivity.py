@@ -0,0 +1,94 @@
+import numpy as np
+
+import labor_regelungstechnik.systems.single_pendulum_nonlinear_cse as single_pendulum_nonlinear_cse
+from labor_regelungstechnik.data import PreparedMeasurement
+from labor_regelungstechnik.sensitivity import simulate_sensitivities
+from labor_regelungstechnik.sensitivity import evaluate_gradient
+from labor_regelungstechnik.sensitivity import evaluate_residuals
+from labor_regelungstechnik.sensitivity import adjoint_gradient
+
+PARAM_NAMES = ['k_x', 'l_0', 'k_vx', 'c_varphi', 'k_phi']
+
+
+def make_measurement(duration: float = 2.0, input_value: float = 0.8) -> PreparedMeasurement:
+    # A synthetic measurement in which the cart hits the rail limit at x = 2.5 after about one second,
+    # such that the jump of the sensitivities at the limit is tested as well.
+    timestamps = np.arange(0, duration, 0.01)
+    inputs = np.zeros(shape=(2, len(timestamps)))
+    inputs[0, timestamps > 0.1] = input_value
+    inputs[1, timestamps > 0.5] = 0.2
+    return PreparedMeasurement(
+        timestamps=timestamps,
+        inputs=inputs,
+        initial_states=np.array([0, 0, 0.5, 0, 0.05, 0.01]),
+        targets=np.zeros(shape=(3, len(timestamps))),
+        weights=np.array([0.2, 0.2, 1.0]),
+    )
+
+
+def test_simulate_sensitivities_matches_finite_differences():
+    measurement = make_measurement()
+    kwargs = {'rtol': 1e-8, 'atol': 1e-10}
+    result = simulate_sensitivities(single_pendulum_nonlinear_cse, measurement, {}, PARAM_NAMES, **kwargs)
+    assert result['simulated'].shape == (3, len(measurement))
+    assert result['sensitivities'].shape == (3, len(PARAM_NAMES), len(measurement))
+    # Makes sure that the rail limit is actually reached
+    assert np.max(result['states'][5]) > 2.5
+
+    defaults = {'k_x': 250, 'l_0': 0.23, 'k_vx': 3.6, 'c_varphi': 0.12, 'k_phi': 0.5}
+    for index, name in enumerate(PARAM_NAMES):
+        h = 1e-5 * defaults[name]
+        outputs = [simulate_sensitivities(single_pendulum_nonlinear_cse, measurement,
+                                          {name: defaults[name] + sign * h}, PARAM_NAMES,
+                                          **kwargs)['simulated']
+                   for sign in (1, -1)]
+        expected = (outputs[0] - outputs[1]) / (2 * h)
+        scale = np.max(np.abs(expected)) + 1e-6
+        assert np.max(np.abs(result['sensitivities'][:, index] - expected)) < 1e-3 * scale, name
+
+
+def test_evaluate_gradient_and_residuals():
+    measurements = [make_measurement(duration=1.0, input_value=value) for value in (0.2, 0.5)]
+    error, gradient = evaluate_gradient(single_pendulum_nonlinear_cse, measurements, {}, PARAM_NAMES)
+    assert error > 0
+    assert gradient.shape == (len(PARAM_NAMES), )
+
+    residuals, jacobian = evaluate_residuals(single_pendulum_nonlinear_cse, measurements, {}, PARAM_NAMES)
+    assert residuals.shape == (2 * 3 * 100, )
+    assert jacobian.shape == (2 * 3 * 100, len(PARAM_NAMES))
+    # On failure, the sum of squares would be the (huge) FAILED_ERROR
+    assert np.all(np.isfinite(jacobian))
+    assert np.sum(residuals ** 2) < 1e3
+
+
+def test_adjoint_gradient_matches_forward_gradient():
+    # Note that the rope reaches its lower limit at t = 2, after which it chatters around that limit, for
+    # which neither of the gradients is reliable
+    measurements = [make_measurement(), make_measurement(duration=1.8, input_value=0.3)]
+    error, gradient = evaluate_gradient(single_pendulum_nonlinear_cse, measurements, {}, PARAM_NAMES)
+    # A small checkpoint interval makes sure that the trajectory has to be recomputed from the checkpoints
+    error_adjoint, gradient_adjoint = evaluate_gradient(single_pendulum_nonlinear_cse, measurements, {},
+                                                        PARAM_NAMES, mode='adjoint', checkpoint_interval=70)
+    assert np.isclose(error, error_adjoint, rtol=1e-3)
+    # The backward pass uses the trapezoidal rule on the sample grid, so it is not exactly the same
+    assert np.allclose(gradient, gradient_adjoint, rtol=2e-2, atol=1e-2 * np.max(np.abs(gradient)))
+
+    # Apart from the tolerance of the integration (which is restarted at every checkpoint), the result
+    # must not depend on the checkpoints
+    error_single, gradient_single = adjoint_gradient(single_pendulum_nonlinear_cse, measurements[0], {},
+                                                     PARAM_NAMES, checkpoint_interval=10_000)
+    error_chunked, gradient_chunked = adjoint_gradient(single_pendulum_nonlinear_cse, measurements[0], {},
+                                                       PARAM_NAMES, checkpoint_interval=70)
+    assert np.isclose(error_single, error_chunked, rtol=1e-3)
+    assert np.allclose(gradient_single, gradient_chunked, rtol=5e-3)
+
+
+def test_simulate_sensitivities_resting_on_the_limit():
+    # The cart starts at rest exactly on its lower rail limit x = 0 and stays there, which triggers a limit
+    # event without any velocity. The integration must nevertheless make progress.
+    measurement = make_measurement(duration=0.5, input_value=0.0)
+    measurement.inputs[1] = 0
+    measurement.initial_states[:] = [0, 0, 0.5, 0, 0, 0]
+    result = simulate_sensitivities(single_pendulum_nonlinear_cse, measurement, {}, PARAM_NAMES)
+    assert result['simulated'].shape == (3, len(measurement))
+    assert np.allclose(result['states'][5], 0, atol=1e-6)
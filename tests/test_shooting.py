@@ -0,0 +1,70 @@
+import numpy as np
+from scipy.optimize import least_squares
+
+import labor_regelungstechnik.systems.single_pendulum_nonlinear_cse as single_pendulum_nonlinear_cse
+from labor_regelungstechnik.sensitivity import simulate_sensitivities
+from labor_regelungstechnik.shooting import split_windows
+from labor_regelungstechnik.shooting import MultipleShooting
+
+from .test_sensitivity import make_measurement
+
+
+def make_synthetic_measurements():
+    # Measurements whose targets are the simulated outputs for the default parameters
+    measurements = [make_measurement(duration=1.5, input_value=0.4), make_measurement(duration=1.0)]
+    for measurement in measurements:
+        measurement.targets = simulate_sensitivities(single_pendulum_nonlinear_cse, measurement,
+                                                     {}, [])['simulated']
+
+    return measurements
+
+
+def test_split_windows():
+    windows = split_windows(101, 4)
+    assert windows == [(0, 25), (25, 50), (50, 75), (75, 100)]
+    # There can never be more windows than samples
+    assert len(split_windows(3, 10)) == 2
+
+
+def test_multiple_shooting_jacobian():
+    measurements = make_synthetic_measurements()
+    shooting = MultipleShooting(single_pendulum_nonlinear_cse, measurements,
+                                {'k_vx': 3.6, 'l_0': 0.23, 'c_varphi': 0.12}, num_windows=3)
+    assert shooting.num_variables == 3 + 2 * 2 * 6
+
+    vector = shooting.initial_vector()
+    vector += np.random.RandomState(0).normal(size=vector.shape) * 0.01
+    kwargs = {'rtol': 1e-9, 'atol': 1e-11}
+    residuals, jacobian = shooting.residuals(vector, **kwargs)
+    assert residuals.shape == (shooting.num_residuals, )
+    assert jacobian.shape == (shooting.num_residuals, shooting.num_variables)
+
+    expected = np.zeros(jacobian.shape)
+    for i in range(len(vector)):
+        delta = np.zeros_like(vector)
+        delta[i] = 1e-6
+        expected[:, i] = (shooting.residuals(vector + delta, **kwargs)[0] -
+                          shooting.residuals(vector - delta, **kwargs)[0]) / 2e-6
+
+    assert np.allclose(jacobian.toarray(), expected, atol=1e-5 * np.max(np.abs(expected)))
+
+
+def test_multiple_shooting_recovers_parameters():
+    measurements = make_synthetic_measurements()
+    # The initial guess is far away from the true parameters
+    shooting = MultipleShooting(single_pendulum_nonlinear_cse, measurements,
+                                {'k_vx': 3.6 * 0.3, 'l_0': 0.23 * 4, 'c_varphi': 0.12 * 8}, num_windows=4)
+    result = least_squares(
+        lambda vector: shooting.residuals(vector)[0],
+        shooting.initial_vector(),
+        jac=lambda vector: shooting.residuals(vector)[1],
+        bounds=shooting.bounds((0.1, 10)),
+        x_scale='jac',
+        max_nfev=30,
+    )
+    params, window_states = shooting.unpack(result.x)
+    assert np.isclose(params['k_vx'], 3.6, rtol=1e-2)
+    assert np.isclose(params['l_0'], 0.23, rtol=1e-2)
+    assert np.isclose(params['c_varphi'], 0.12, rtol=5e-2)
+    assert len(window_states) == 2
+    assert window_states[0].shape == (4, 6)
@@ -0,0 +1,67 @@
+import numpy as np
+
+from labor_regelungstechnik.simulation import make_time_grid
+from labor_regelungstechnik.simulation import InputSignal
+from labor_regelungstechnik.signals import Step, Ramp, SmoothStep, Piecewise, Replay, stack
+
+
+def test_signals_scalar_and_grid_evaluation_match():
+    ts = make_time_grid(5)
+    signals = [
+        Step(1, initial_value=0.2, final_value=-0.1),
+        Ramp(1, 2, final_value=0.5),
+        SmoothStep(0.5, 3, initial_value=1, final_value=0),
+        Piecewise([1, 2, 3], [0.1, -0.2, 0.3], mode='zoh'),
+        Piecewise([1, 2, 3], [0.1, -0.2, 0.3], mode='linear'),
+        (Step(1) + 0.5 * Ramp(2, 4)).delayed(0.3).saturated(-0.2, 1.2),
+        -Step(2) - SmoothStep(1, 3),
+    ]
+    for signal in signals:
+        values = signal(ts)
+        assert values.shape == ts.shape
+        assert np.allclose(values, [signal(time) for time in ts])
+
+
+def test_signals_composition():
+    signal = (Step(1, final_value=2) + Ramp(0, 4, final_value=4)).delayed(1).saturated(upper=3)
+    assert np.isclose(signal(0.5), 0)
+    assert np.isclose(signal(2.0), 3)
+    assert np.isclose(signal(3.0), 3)
+    assert np.isclose(signal(1.5), 0.5)
+
+
+def test_signals_batched_shapes():
+    ts = make_time_grid(5)
+    times = np.array([[0.5], [1.0], [2.0]])
+    inputs = stack(Step(times, final_value=0.1), Ramp(times, times + 1, final_value=-0.1))
+    values = inputs(ts)
+    assert values.shape == (3, 2, len(ts))
+    for index, time in enumerate(times[:, 0]):
+        assert np.allclose(values[index, 0], np.where(ts >= time, 0.1, 0))
+
+    # Without batched parameters, the stacked signals are the inputs of the shape (num_inputs, T)
+    inputs = stack(Step(1, final_value=0.1), 0.2)
+    assert inputs(ts).shape == (2, len(ts))
+    assert np.allclose(inputs(1.5), [0.1, 0.2])
+
+
+def test_replay_matches_input_signal():
+    ts = make_time_grid(5)
+    values = np.sin(ts)
+    replay = Replay(ts, values, delay=0.3)
+    reference = InputSignal(ts, values[None, :], delays=(0.3, ))
+    times = np.linspace(-1, 6, 333)
+    assert np.allclose(replay(times), [reference(time)[0] for time in times])
+    assert np.isclose(replay(2.345), reference(2.345)[0])
+
+
+def test_ramp_without_duration():
+    # A ramp whose start and stop are the same is just a step at that time
+    times = np.array([0.0, 0.5, 1.0, 1.5])
+    for signal in (Ramp(1, 1, final_value=2), SmoothStep(1, 1, final_value=2)):
+        assert [signal(time) for time in times] == [0.0, 0.0, 2.0, 2.0]
+        assert np.all(signal(times) == [0.0, 0.0, 2.0, 2.0])
+
+    # Batched ramps where only some of them have no duration
+    ramps = Ramp(np.array([[1.0], [0.0]]), 1.0, final_value=2)
+    assert np.allclose(ramps(times), [[0.0, 0.0, 2.0, 2.0], [0.0, 1.0, 2.0, 2.0]])
@@ -0,0 +1,128 @@
+import os
+
+import control as ct
+import numpy as np
+import pytest
+
+import labor_regelungstechnik.systems.single_pendulum_nonlinear_cse as single_pendulum_nonlinear_cse
+from labor_regelungstechnik.simulation import make_time_grid
+from labor_regelungstechnik.simulation import simulate_batch
+from labor_regelungstechnik.simulation import InputSignal, simulate_response, simulate_hybrid
+from labor_regelungstechnik.signals import Step, stack
+from labor_regelungstechnik.codegen import load_system_equations, specialize_system
+from labor_regelungstechnik.utils import PATH
+from labor_regelungstechnik.optimization import interpolate_inputs
+
+
+def test_make_time_grid():
+    ts = make_time_grid(10)
+    assert len(ts) == 1001
+    assert np.isclose(ts[-1], 10)
+    assert np.allclose(np.diff(ts), 0.01)
+
+
+def test_simulate_batch_matches_input_output_response():
+    ts = make_time_grid(5)
+    inputs = np.array([
+        [0 if t < 1 else 0.1 for t in ts],
+        [0 if t < 1 else -0.1 for t in ts],
+    ])
+    initial_states = np.array([0, 0, 0.5, 0, 0.1, 0.5])
+
+    _, y = ct.input_output_response(
+        single_pendulum_nonlinear_cse.io_system,
+        ts,
+        U=inputs,
+        X0=initial_states,
+        solve_ivp_kwargs={'rtol': 1e-8, 'atol': 1e-8},
+    )
+    _, outputs = simulate_batch(ts, inputs, initial_states[None, :], substeps=4)
+    assert outputs.shape == (1, 3, len(ts))
+    assert np.allclose(outputs[0], y, atol=1e-2)
+
+
+def test_simulate_batch_per_trajectory_parameters():
+    num = 8
+    ts = make_time_grid(2)
+    inputs = np.random.uniform(-0.2, 0.2, size=(num, 2, len(ts)))
+    initial_states = np.zeros(shape=(num, 6))
+    initial_states[:, 2] = 0.5
+    initial_states[:, 5] = 1.0
+    params = {'m_x': np.linspace(30, 50, num), 'c_varphi': np.linspace(0.1, 0.5, num)}
+
+    states, outputs = simulate_batch(ts, inputs, initial_states, params=params)
+    assert states.shape == (num, 6, len(ts))
+    assert outputs.shape == (num, 3, len(ts))
+
+    # Simulating every trajectory on its own has to produce exactly the same results
+    for i in range(num):
+        params_single = {key: value[i] for key, value in params.items()}
+        states_single, outputs_single = simulate_batch(ts, inputs[i], initial_states[i:i+1], params_single)
+        assert np.allclose(states_single[0], states[i])
+        assert np.allclose(outputs_single[0], outputs[i])
+
+
+def test_input_signal_matches_interpolation():
+    # A grid which is only almost uniform, just like the one of the recorded measurements
+    ts = make_time_grid(5) + np.random.uniform(-1e-6, 1e-6, size=501)
+    raw_inputs = np.random.uniform(-1, 1, size=(2, len(ts)))
+    delays = (0.3, 0.1)
+    inputs = np.array([np.where(ts < delay, 0.0, values) for delay, values in zip(delays, raw_inputs)])
+
+    signal = InputSignal(ts, inputs)
+    delayed_signal = InputSignal(ts, raw_inputs, delays=delays)
+    zoh_signal = InputSignal(ts, inputs, mode='zoh')
+    # The extrapolation beyond the sampled time frame has to be the same as well
+    for time in [*np.random.uniform(-1, 6, size=500), *ts, *delays]:
+        expected = interpolate_inputs(ts, inputs, time)
+        assert np.allclose(signal(time), expected)
+        assert np.allclose(delayed_signal(time), expected)
+
+        index = np.clip(np.searchsorted(ts, time, side='right') - 1, 0, len(ts) - 1)
+        assert np.allclose(zoh_signal(time), inputs[:, index])
+
+    with pytest.raises(ValueError):
+        InputSignal(ts, inputs, mode='cubic')
+
+
+def test_simulate_response_matches_input_output_response():
+    ts = make_time_grid(5)
+    inputs = np.array([
+        [0 if t < 1 else 0.1 for t in ts],
+        [0 if t < 1 else -0.1 for t in ts],
+    ])
+    initial_states = np.array([0, 0, 0.5, 0, 0.1, 0.5])
+    params = {'k_x': 200}
+
+    _, y = ct.input_output_response(
+        single_pendulum_nonlinear_cse.io_system,
+        ts,
+        U=inputs,
+        X0=initial_states,
+        params=params,
+    )
+    _, outputs = simulate_response(single_pendulum_nonlinear_cse.io_system, ts, InputSignal(ts, inputs),
+                                   initial_states, params=params)
+    assert np.allclose(outputs, y)
+
+
+def test_simulate_hybrid_matches_simulate_response():
+    solved_dict, params_default_map, kwargs = load_system_equations(
+        os.path.join(PATH, 'systems', 'single_pendulum_nonlinear.json')
+    )
+    hybrid_module = specialize_system(solved_dict, params_default_map, {}, hybrid=True, **kwargs)
+    assert hybrid_module.hybrid
+
+    # The cart is driven into its end stop and the rope into its upper limit
+    ts = make_time_grid(10)
+    signal = stack(Step(1, final_value=0.5), Step(1, final_value=-0.3) - Step(6, final_value=-0.6))
+    initial_states = np.array([0, 0, 1.0, 0, 0, 0.5])
+    solve_ivp_kwargs = {'method': 'LSODA', 'rtol': 1e-6, 'atol': 1e-8}
+
+    _, expected = simulate_response(single_pendulum_nonlinear_cse.io_system, ts, signal, initial_states,
+                                    solve_ivp_kwargs=solve_ivp_kwargs)
+    assert expected[0].max() > 2.5 and expected[1].max() > 1.3
+    _, outputs = simulate_hybrid(hybrid_module.io_system, ts, signal, initial_states,
+                                 hybrid_module.state_limit_map, jacobian=hybrid_module.jacobian_states,
+                                 solve_ivp_kwargs=solve_ivp_kwargs)
+    assert np.allclose(outputs, expected, atol=1e-3)
@@ -0,0 +1,83 @@
+import os
+import sys
+import stat
+import tempfile
+
+import pytest
+
+from labor_regelungstechnik.utils import LatexQueue
+
+# This script replaces the actual "pdflatex" command for the tests. Instead of compiling the document it
+# just copies the latex source into the PDF file and counts the number of calls in the "calls" file.
+FAKE_PDFLATEX = f"""#!{sys.executable}
+import os, sys
+latex_path = sys.argv[-1]
+output_path = [arg for arg in sys.argv if arg.startswith('-output-directory=')][0].split('=', 1)[1]
+with open(os.path.join(os.path.dirname(__file__), 'calls'), mode='a') as file:
+    file.write('.')
+with open(latex_path) as file:
+    content = file.read()
+if 'FAIL' in content:
+    sys.exit(1)
+with open(os.path.join(output_path, 'main.pdf'), mode='w') as file:
+    file.write(content)
+"""
+
+
+@pytest.fixture
+def fake_pdflatex(monkeypatch):
+    with tempfile.TemporaryDirectory() as path:
+        bin_path = os.path.join(path, 'bin')
+        os.mkdir(bin_path)
+        script_path = os.path.join(bin_path, 'pdflatex')
+        with open(script_path, mode='w') as file:
+            file.write(FAKE_PDFLATEX)
+        os.chmod(script_path, os.stat(script_path).st_mode | stat.S_IEXEC)
+        monkeypatch.setenv('PATH', f'{bin_path}{os.pathsep}{os.environ["PATH"]}')
+
+        def num_calls():
+            calls_path = os.path.join(bin_path, 'calls')
+            return len(open(calls_path).read()) if os.path.exists(calls_path) else 0
+
+        yield path, num_calls
+
+
+def test_latex_queue_parallel_cache(fake_pdflatex):
+    path, num_calls = fake_pdflatex
+    cache_path = os.path.join(path, 'cache')
+    with LatexQueue(mode='parallel', num_workers=2, cache_path=cache_path) as queue:
+        for index in range(4):
+            queue.submit({'content': f'x_{index}'}, os.path.join(path, f'{index}.pdf'))
+
+    assert num_calls() == 4
+    assert 'x_2' in open(os.path.join(path, '2.pdf')).read()
+
+    # The same sources are copied from the cache, only the new one has to be compiled
+    with LatexQueue(mode='parallel', cache_path=cache_path) as queue:
+        queue.submit({'content': 'x_0'}, os.path.join(path, 'copy.pdf'))
+        queue.submit({'content': 'y'}, os.path.join(path, 'new.pdf'))
+        assert len(queue.wait()) == 2
+
+    assert num_calls() == 5
+    assert 'x_0' in open(os.path.join(path, 'copy.pdf')).read()
+
+
+def test_latex_queue_errors_and_batch(fake_pdflatex):
+    path, num_calls = fake_pdflatex
+    queue = LatexQueue(mode='parallel')
+    queue.submit({'content': 'FAIL'}, os.path.join(path, 'fail.pdf'))
+    queue.submit({'content': 'x'}, os.path.join(path, 'x.pdf'))
+    with pytest.raises(ChildProcessError):
+        queue.close()
+    # The failure of one job does not affect the others
+    assert os.path.exists(os.path.join(path, 'x.pdf'))
+
+    batch_path = os.path.join(path, 'batch.pdf')
+    with LatexQueue(mode='batch', batch_path=batch_path) as queue:
+        for index in range(3):
+            queue.submit({'content': f'x_{index}'}, os.path.join(path, f'{index}.pdf'))
+
+    assert num_calls() == 3
+    content = open(batch_path).read()
+    assert all(f'x_{index}' in content for index in range(3))
+    assert content.count('\\shipout') == 3